@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from openai import OpenAI
+
+from .retry_policy import RATE_LIMIT, SERVER, CLIENT, AUTH
+
+# Limits of one Batch API input file
+MAX_BATCH_REQUESTS = 50000
+MAX_BATCH_BYTES = 190 * 1024 * 1024  # hard limit is 200 MB
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Batch statuses after which nothing changes any more
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchInputWriter:
+    """
+    Writes Batch API request lines into input_<tag>_<n>.jsonl files under `batch_dir`,
+    starting a new file whenever the request count or size limit would be exceeded.
+    The response-cache key of every request is kept in a sidecar <input>.keys.json,
+    so answers can be cached when the output is ingested.
+    """
+
+    def __init__(
+        self,
+        batch_dir: str,
+        tag: Optional[str] = None,
+        max_requests: int = MAX_BATCH_REQUESTS,
+        max_bytes: int = MAX_BATCH_BYTES,
+    ):
+        os.makedirs(batch_dir, exist_ok=True)
+        self.batch_dir = batch_dir
+        self.tag = tag or time.strftime("%Y%m%d_%H%M%S")
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.paths: List[str] = []
+        self.total = 0
+        self._f = None
+        self._count = 0
+        self._bytes = 0
+        self._keys: Dict[str, str] = {}
+
+    def add(self, custom_id: str, body: dict, cache_key: Optional[str] = None) -> None:
+        line = json.dumps(
+            {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+            ensure_ascii=False,
+        ).encode("utf-8") + b"\n"
+        if self._f is None or self._count >= self.max_requests or self._bytes + len(line) > self.max_bytes:
+            self._roll()
+        self._f.write(line)
+        self._count += 1
+        self._bytes += len(line)
+        self.total += 1
+        if cache_key is not None:
+            self._keys[custom_id] = cache_key
+
+    def close(self) -> List[str]:
+        """Finish the last file and return the paths of all written input files."""
+        self._close_current()
+        return self.paths
+
+    def _roll(self) -> None:
+        self._close_current()
+        path = os.path.join(self.batch_dir, f"input_{self.tag}_{len(self.paths) + 1}.jsonl")
+        self._f = open(path, "wb")
+        self.paths.append(path)
+        self._count = 0
+        self._bytes = 0
+
+    def _close_current(self) -> None:
+        if self._f is None:
+            return
+        self._f.close()
+        self._f = None
+        with open(cache_keys_path(self.paths[-1]), "w", encoding="utf-8") as f:
+            json.dump(self._keys, f)
+        self._keys = {}
+
+
+def cache_keys_path(input_path: str) -> str:
+    return os.path.splitext(input_path)[0] + ".keys.json"
+
+
+def load_cache_keys(batch_dir: str) -> Dict[str, str]:
+    """custom_id -> response-cache key of every input file written to `batch_dir`."""
+    keys: Dict[str, str] = {}
+    if not os.path.isdir(batch_dir):
+        return keys
+    for fn in sorted(os.listdir(batch_dir)):
+        if fn.endswith(".keys.json"):
+            try:
+                with open(os.path.join(batch_dir, fn), "r", encoding="utf-8") as f:
+                    keys.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logging.warning(f"Cannot read batch cache keys {fn}: {e}")
+    return keys
+
+
+class BatchState:
+    """
+    Submitted batches of a run, persisted in `path` so that an interrupted run polls
+    and ingests them instead of submitting the same requests again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.batches: List[dict] = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.batches = json.load(f).get("batches", [])
+
+    def add(self, batch_id: str, input_file: str) -> None:
+        self.batches.append({"id": batch_id, "input_file": input_file, "status": "submitted", "ingested": False})
+        self.save()
+
+    def outstanding(self) -> List[dict]:
+        return [b for b in self.batches if not b.get("ingested")]
+
+    def update(self, batch_id: str, **fields) -> None:
+        for b in self.batches:
+            if b["id"] == batch_id:
+                b.update(fields)
+        self.save()
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"batches": self.batches}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def submit_batch(client: OpenAI, input_path: str, metadata: Optional[Dict[str, str]] = None) -> str:
+    """Upload one input file and create a batch for it; returns the batch id."""
+    with open(input_path, "rb") as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    kwargs = {"metadata": metadata} if metadata else {}
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h",
+        **kwargs,
+    )
+    logging.info(f"Submitted batch {batch.id} for {input_path}")
+    return batch.id
+
+
+def wait_for_batch(
+    client: OpenAI,
+    batch_id: str,
+    poll_interval: float = 60.0,
+    should_stop: Optional[Callable[[], bool]] = None,
+):
+    """Poll a batch until it reaches a final status; returns None if should_stop() became true first."""
+    last_status = None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if batch.status != last_status:
+            logging.info(
+                f"Batch {batch_id}: {batch.status}"
+                + (f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else "")
+            )
+            last_status = batch.status
+        if batch.status in FINAL_STATUSES:
+            return batch
+        waited = 0.0
+        while waited < poll_interval:
+            if should_stop is not None and should_stop():
+                return None
+            time.sleep(min(1.0, poll_interval - waited))
+            waited += 1.0
+
+
+def download_batch_files(client: OpenAI, batch, batch_dir: str) -> List[str]:
+    """Download the output and error files of a finished batch; returns the local paths."""
+    paths = []
+    for kind, file_id in (("output", batch.output_file_id), ("errors", batch.error_file_id)):
+        if not file_id:
+            continue
+        path = os.path.join(batch_dir, f"{batch.id}_{kind}.jsonl")
+        client.files.content(file_id).write_to_file(path)
+        paths.append(path)
+    return paths
+
+
+def _status_kind(status_code: Optional[int]) -> str:
+    if status_code == 429:
+        return RATE_LIMIT
+    if status_code is None or status_code >= 500 or status_code in (408, 409):
+        return SERVER
+    if status_code in (401, 403, 404):
+        return AUTH
+    return CLIENT
+
+
+def iter_batch_output(path: str) -> Iterator[Tuple[str, Optional[dict], Optional[str]]]:
+    """
+    Yield (custom_id, chat completion body, None) for every successful line of a Batch
+    API output / error file, and (custom_id, None, error kind) for failed ones.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+                custom_id = rec["custom_id"]
+            except (ValueError, KeyError):
+                logging.warning(f"Skip unreadable line {line_no} of batch output {path}")
+                continue
+            response = rec.get("response") or {}
+            status_code = response.get("status_code")
+            if rec.get("error") or status_code != 200:
+                yield custom_id, None, _status_kind(status_code)
+                continue
+            yield custom_id, response.get("body") or {}, None
+
+
+def completion_text(body: dict) -> str:
+    try:
+        return body["choices"][0]["message"]["content"] or ""
+    except (KeyError, IndexError, TypeError):
+        return ""
@@ -0,0 +1,127 @@
+import os
+import fnmatch
+import logging
+from typing import Iterable, List, Optional
+
+# prepare_images.py writes its packed image store here by default
+DEFAULT_STORE_DIRNAME = "judge_image_store"
+
+default_CSV_files: List[str] = [
+    "Imagination_1.csv",
+    "Imagination_2.csv",
+    "Imagination_3.csv",
+    "Imagination_4.csv",
+    "Imagination_5.csv",
+    "Awareness_1.csv",
+    "Awareness_2.csv",
+    "Interpretation_1.csv",
+    "WiseEdit_Complex_2.csv",
+    "WiseEdit_Complex_3.csv",
+    "WiseEdit_Complex_4.csv",
+]
+
+ALL_METRICS = [
+    "detail_preserving",
+    "instruction_following",
+    "visual_quality",
+    "knowledge_fidelity",
+    "creative_fusion",
+]  # all metrics could be used to eval
+
+METRIC_SCORE_KEYS = {
+    "detail_preserving": "DP_score",
+    "instruction_following": "IF_score",
+    "visual_quality": "VQ_score",
+    "knowledge_fidelity": "KF_score",
+    "creative_fusion": "CF_score",
+}  # print out word
+
+CSV_METRICS = {
+    "Imagination_1.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "creative_fusion",
+    ],
+    "Imagination_2.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "creative_fusion",
+    ],
+    "Imagination_3.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "creative_fusion",
+    ],
+    "Imagination_4.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "creative_fusion",
+    ],
+    "Imagination_5.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "creative_fusion",
+    ],
+    "Awareness_1.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "knowledge_fidelity",
+    ],
+    "Awareness_2.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "knowledge_fidelity",
+    ],
+    "Interpretation_1.csv": [
+        "detail_preserving",
+        "instruction_following",
+        "visual_quality",
+        "knowledge_fidelity",
+    ],
+}   # different metrics to different task, no setting in this will use default metrics(all metrics)
+DEFAULT_METRICS = ALL_METRICS
+
+
+def score_journal_path(out_csv_path: str) -> str:
+    return os.path.splitext(out_csv_path)[0] + ".journal.jsonl"
+
+
+def walk_benchmark_csvs(dataset_dir: str, target_csv: Optional[Iterable[str]] = None) -> List[str]:
+    """Benchmark CSVs under `dataset_dir` named in `target_csv` (default: default_CSV_files), sorted."""
+    target_names = set(target_csv or default_CSV_files)
+    csv_files = []
+    for root, dirs, files in os.walk(dataset_dir):
+        # Do NOT descend into image folders or an existing store
+        dirs[:] = [d for d in dirs if d not in ("imgs", "img_ref", DEFAULT_STORE_DIRNAME)]
+        for fn in sorted(files):
+            if fn.lower().endswith(".csv") and fn in target_names:
+                csv_files.append(os.path.join(root, fn))
+    return sorted(csv_files)
+
+
+def resolve_model_tags(names: List[str], result_img_root: str) -> List[str]:
+    """
+    Model tags of --name, in order and without duplicates: literal tags are kept, glob
+    patterns (*, ?, [..]) are matched against the model folders of `result_img_root`.
+    """
+    tags: List[str] = []
+    for name in names:
+        if not any(c in name for c in "*?["):
+            tags.append(name)
+            continue
+        try:
+            folders = sorted(e.name for e in os.scandir(result_img_root) if e.is_dir())
+        except FileNotFoundError:
+            folders = []
+        matched = fnmatch.filter(folders, name)
+        if not matched:
+            logging.warning(f"--name {name} matches no model folder in {result_img_root}")
+        tags.extend(matched)
+    return list(dict.fromkeys(tags))
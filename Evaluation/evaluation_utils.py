@@ -1,16 +1,34 @@
 import os
 import json
-import base64
 import time
 import re
 import logging
-from typing import List, Optional, Dict, Tuple
-from PIL import Image
+import asyncio
+import contextlib
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, List, Optional, Dict, Tuple
 from .prompt_single import *
 from .prompt_multi import *
-import io
+from .prompt_combined import *
+from .prompt_repair import *
+from .image_cache import ImageCache
+from .image_profiles import (
+    IMAGE_ROLES, ImageProfile, ProfileTable, ProfileStats, encode_with_profile, image_mime, load_profiles,
+)
+from .image_store import PackedImageStore, open_image_store
+from .rate_limiter import RateLimiter, estimate_request_tokens, retry_after_seconds, default_state_file
+from .retry_policy import RetryPolicy, CircuitBreaker, JudgeUnavailableError, classify_error, PARSE, CLIENT
+from .response_cache import ResponseCache, request_fingerprint
+from .usage import UsageTracker, Budget, COMBINED_METRIC
+from .telemetry import RunTelemetry
+from .tracing import span, emit_since
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient, RateLimitError
+import httpx
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 logging.getLogger("openai").setLevel(logging.WARNING)
@@ -28,15 +46,365 @@ DEFAULT_MODEL_NAME = "gpt-4o"
 DEFAULT_API_KEY = os.environ.get("OPENAI_API_KEY")
 DEFAULT_BASE_URL = "https://api.openai.com/v1"
 
+# Shared by every row / language / CSV in the process, see configure_image_cache().
+IMAGE_CACHE = ImageCache()
+
+
+# Optional pacing of judge requests, see configure_rate_limiter().
+RATE_LIMITER: Optional[RateLimiter] = None
+MAX_COMPLETION_TOKENS = 1000
+
+
+def configure_rate_limiter(
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+    state_file: Optional[str] = None,
+    api_key: Optional[str] = DEFAULT_API_KEY,
+    base_url: Optional[str] = DEFAULT_BASE_URL,
+) -> Optional[RateLimiter]:
+    """
+    Enable the token-bucket limiter for all judge requests of this process. Unless a
+    state_file is given, the budget is shared through a temp file derived from
+    (api_key, base_url), i.e. with every other local process using the same key.
+    """
+    global RATE_LIMITER
+    if not rpm and not tpm:
+        RATE_LIMITER = None
+        return None
+    if state_file is None:
+        state_file = default_state_file(api_key, base_url)
+    RATE_LIMITER = RateLimiter(rpm=rpm, tpm=tpm, state_file=state_file)
+    logging.info(f"Rate limiter enabled: rpm={rpm}, tpm={tpm}, shared state={state_file}")
+    return RATE_LIMITER
+
+
+def _note_rate_limited(error: Exception) -> None:
+    # Pause every worker (and cooperating processes) for the server-provided Retry-After
+    if RATE_LIMITER is not None and isinstance(error, RateLimitError):
+        delay = retry_after_seconds(error)
+        if delay is not None:
+            RATE_LIMITER.penalize(delay)
+
+
+def _usage_total_tokens(resp) -> Optional[int]:
+    usage = getattr(resp, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+# Error-classified retries shared by all judge calls, see configure_retry_policy().
+RETRY_POLICY = RetryPolicy()
+CIRCUIT_BREAKER = CircuitBreaker()
+
+
+def configure_retry_policy(
+    base_delay: Optional[float] = None,
+    max_delay: Optional[float] = None,
+    breaker_threshold: Optional[int] = None,
+    breaker_cooldown: Optional[float] = None,
+    breaker_give_up_after: Optional[float] = None,
+) -> None:
+    global RETRY_POLICY, CIRCUIT_BREAKER
+    RETRY_POLICY = RetryPolicy(
+        base_delay=base_delay if base_delay is not None else RETRY_POLICY.base_delay,
+        max_delay=max_delay if max_delay is not None else RETRY_POLICY.max_delay,
+    )
+    CIRCUIT_BREAKER = CircuitBreaker(
+        failure_threshold=breaker_threshold if breaker_threshold is not None else CIRCUIT_BREAKER.failure_threshold,
+        cooldown=breaker_cooldown if breaker_cooldown is not None else CIRCUIT_BREAKER.base_cooldown,
+        give_up_after=breaker_give_up_after if breaker_give_up_after is not None else CIRCUIT_BREAKER.give_up_after,
+    )
+
+
+# Token usage and cost reported by every judge response, see Evaluation/usage.py.
+USAGE = UsageTracker()
+
+# Live call / latency / retry counters, exported by run_eval.py (--metrics_port, --progress_interval).
+TELEMETRY = RunTelemetry()
+
+# Order of the parts of a judge message, see configure_message_layout().
+MESSAGE_LAYOUTS = ("default", "cache")
+MESSAGE_LAYOUT = "default"
+
+
+def configure_message_layout(layout: str = "default") -> None:
+    """
+    "default": rubric + instruction, input images, edited image, hint, reference images.
+    "cache": everything that does not depend on the edited image first (rubric, input
+    images, reference images, instruction and hint), the edited image last, so requests
+    of the same metric and row share a long prefix for provider-side prompt caching.
+    """
+    global MESSAGE_LAYOUT
+    if layout not in MESSAGE_LAYOUTS:
+        raise ValueError(f"Unknown message layout: {layout}")
+    MESSAGE_LAYOUT = layout
+
+
+# Optional persistent cache of judge answers, see configure_response_cache().
+RESPONSE_CACHE: Optional[ResponseCache] = None
+
+
+def configure_response_cache(
+    path: Optional[str] = None,
+    max_mb: int = 1024,
+    refresh: bool = False,
+) -> Optional[ResponseCache]:
+    """
+    Enable the on-disk judge response cache at `path` (None disables it). With
+    refresh=True cached answers are ignored but overwritten by the new ones.
+    """
+    global RESPONSE_CACHE
+    if RESPONSE_CACHE is not None:
+        RESPONSE_CACHE.close()
+        RESPONSE_CACHE = None
+    if path:
+        RESPONSE_CACHE = ResponseCache(path, max_bytes=max_mb * 1024 * 1024, refresh=refresh)
+        logging.info(f"Judge response cache: {path} (max {max_mb} MB, refresh={refresh})")
+    return RESPONSE_CACHE
+
+
+# Output format requested from the judge, see configure_response_format().
+RESPONSE_FORMATS = ("text", "json_schema")
+RESPONSE_FORMAT = "text"
+# (base_url, model) of endpoints that rejected response_format=json_schema
+_SCHEMA_UNSUPPORTED: set = set()
+_SCHEMA_LOCK = threading.Lock()
+
+
+def configure_response_format(fmt: str = "text") -> None:
+    """
+    "text": the judge answers in free text, parsed by extract_score_and_reason_generic().
+    "json_schema": the answer is constrained to {"reason": str, "score": 1..10} (one such
+    object per metric for combined requests) by the endpoint's structured output, so it
+    always parses; endpoints that reject response_format fall back to "text".
+    """
+    global RESPONSE_FORMAT
+    if fmt not in RESPONSE_FORMATS:
+        raise ValueError(f"Unknown response format: {fmt}")
+    RESPONSE_FORMAT = fmt
+    with _SCHEMA_LOCK:
+        _SCHEMA_UNSUPPORTED.clear()
+
+
+def score_response_format(metrics: Optional[List[str]] = None) -> dict:
+    """json_schema response_format of one score, or of one score object per metric of a combined request."""
+    answer = {
+        "type": "object",
+        "properties": {
+            "reason": {"type": "string"},
+            "score": {"type": "integer", "enum": list(range(1, 11))},
+        },
+        "required": ["reason", "score"],
+        "additionalProperties": False,
+    }
+    if not metrics:
+        name, schema = "judge_score", answer
+    else:
+        name = "judge_scores"
+        schema = {
+            "type": "object",
+            "properties": {m: answer for m in metrics},
+            "required": list(metrics),
+            "additionalProperties": False,
+        }
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def requested_response_format(metrics: Optional[List[str]] = None) -> Optional[dict]:
+    """response_format configured for requests that cannot fall back per endpoint (Batch API files)."""
+    return score_response_format(metrics) if RESPONSE_FORMAT == "json_schema" else None
+
+
+def endpoint_url(client) -> str:
+    """Base URL of a judge client, as used in endpoint-specific state and cache keys."""
+    return str(getattr(client, "base_url", ""))
+
+
+def _endpoint_key(client, model_name: str) -> Tuple[str, str]:
+    return endpoint_url(client), model_name
+
+
+def _response_format(client, model_name: str, metrics: Optional[List[str]] = None) -> Optional[dict]:
+    """response_format to send to this endpoint; None asks for a free-text answer."""
+    if RESPONSE_FORMAT != "json_schema":
+        return None
+    with _SCHEMA_LOCK:
+        if _endpoint_key(client, model_name) in _SCHEMA_UNSUPPORTED:
+            return None
+    return score_response_format(metrics)
+
+
+def _schema_rejected(error: Exception, client, model_name: str) -> bool:
+    """Whether `error` is the endpoint refusing response_format; if so it gets free-text requests from now on."""
+    if getattr(error, "status_code", None) not in (400, 404, 422):
+        return False
+    text = str(error).lower()
+    if "response_format" not in text and "json_schema" not in text:
+        return False
+    key = _endpoint_key(client, model_name)
+    with _SCHEMA_LOCK:
+        first = key not in _SCHEMA_UNSUPPORTED
+        _SCHEMA_UNSUPPORTED.add(key)
+    if first:
+        logging.warning(
+            f"Judge endpoint {key[0]} ({model_name}) does not support json_schema output ({error}); "
+            f"falling back to free-text answers and the regex parser."
+        )
+    return True
+
+
+# Answer an unparsable judge answer with a text-only follow-up first, see configure_parse_repair().
+PARSE_REPAIR = True
+
+
+def configure_parse_repair(enabled: bool = True) -> None:
+    """
+    When a judge answer has no parsable score, send its text back once (without any
+    image) asking for the final score as strict JSON; the full request is only re-sent
+    if that repair fails too.
+    """
+    global PARSE_REPAIR
+    PARSE_REPAIR = enabled
+
+
+def _decoding_params(response_format: Optional[dict] = None) -> Dict:
+    # Everything besides model / messages sent with a judge request; part of the cache key.
+    params: Dict[str, Any] = {"max_tokens": MAX_COMPLETION_TOKENS}
+    if response_format is not None:
+        params["response_format"] = response_format
+    return params
+
+
+def answer_cache_key(
+    message: dict, model_name: str, response_format: Optional[dict] = None, endpoint: str = ""
+) -> Optional[str]:
+    """Key of a judge answer of `endpoint` (see endpoint_url()) in the response cache, None if caching is off."""
+    if RESPONSE_CACHE is None:
+        return None
+    return request_fingerprint(model_name, message, _decoding_params(response_format), endpoint)
+
+
+def lookup_cached_answer(
+    message: dict, model_name: str, response_format: Optional[dict] = None, endpoint: str = ""
+) -> Tuple[Optional[str], Optional[Tuple[Optional[int], Optional[str], Optional[str]]]]:
+    """Return (cache key or None if caching is off, cached (score, reason, raw text) or None)."""
+    key = answer_cache_key(message, model_name, response_format, endpoint)
+    if key is None:
+        return None, None
+    return key, RESPONSE_CACHE.get(key)
+
+
+def store_cached_answer(cache_key: Optional[str], score: Optional[int], reason: Optional[str], text: str) -> None:
+    if cache_key is not None and RESPONSE_CACHE is not None:
+        RESPONSE_CACHE.put(cache_key, score, reason, text)
+
+
+def judge_request_body(message: dict, model_name: str, response_format: Optional[dict] = None) -> dict:
+    """Chat Completions request body of one judge message, as sent online or in a Batch API file."""
+    return {"model": model_name, "messages": [message], **_decoding_params(response_format)}
+
+
+# Process-wide pool of long-lived clients keyed by (api_key, base_url), see get_client().
+CLIENT_POOL_SIZE = 64
+CLIENT_HTTP2 = True
+_CLIENTS: Dict[Tuple[Optional[str], Optional[str]], OpenAI] = {}
+_ASYNC_CLIENTS: Dict[Tuple[Optional[str], Optional[str], int], AsyncOpenAI] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed
+    return importlib.util.find_spec("h2") is not None
+
+
+def configure_client_pool(max_connections: Optional[int] = None, http2: Optional[bool] = None) -> None:
+    """
+    Set the connection-pool size / HTTP/2 usage of clients created by get_client().
+    Must be called before the first request; already created clients are kept as-is.
+    """
+    global CLIENT_POOL_SIZE, CLIENT_HTTP2
+    if max_connections is not None:
+        CLIENT_POOL_SIZE = max_connections
+    if http2 is not None:
+        CLIENT_HTTP2 = http2
+
 
 def init_client(
     api_key: Optional[str] = None,
     base_url: Optional[str] = None,
+    max_connections: Optional[int] = None,
+    http2: Optional[bool] = None,
+) -> OpenAI:
+    # max_retries=0: retries happen in call_gpt_with_retry, where 429s are visible to the rate limiter
+    if max_connections is None:
+        max_connections = CLIENT_POOL_SIZE
+    if http2 is None:
+        http2 = CLIENT_HTTP2
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        http2=http2 and http2_available(),
+    )
+    if base_url:
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+    else:
+        return OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+
+def get_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
 ) -> OpenAI:
+    """
+    Return the shared client for (api_key, base_url), creating it on first use so that
+    every metric call reuses the same keep-alive connection pool.
+    """
+    key = (api_key, base_url)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = init_client(api_key, base_url)
+            _CLIENTS[key] = client
+            logging.info(
+                f"Created shared OpenAI client for {base_url or DEFAULT_BASE_URL} "
+                f"(max_connections={CLIENT_POOL_SIZE}, http2={CLIENT_HTTP2 and http2_available()})"
+            )
+        return client
+
+
+def init_async_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    max_connections: Optional[int] = None,
+    http2: Optional[bool] = None,
+) -> AsyncOpenAI:
+    if max_connections is None:
+        max_connections = CLIENT_POOL_SIZE
+    if http2 is None:
+        http2 = CLIENT_HTTP2
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        http2=http2 and http2_available(),
+    )
     if base_url:
-        return OpenAI(api_key=api_key, base_url=base_url)
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
     else:
-        return OpenAI(api_key=api_key)
+        return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+
+def get_async_client(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+) -> AsyncOpenAI:
+    """
+    Async counterpart of get_client(). Async connections are bound to the event loop,
+    so the registry is additionally keyed by the running loop.
+    """
+    key = (api_key, base_url, id(asyncio.get_running_loop()))
+    with _CLIENTS_LOCK:
+        client = _ASYNC_CLIENTS.get(key)
+        if client is None:
+            client = init_async_client(api_key, base_url)
+            _ASYNC_CLIENTS[key] = client
+        return client
 
 
 def get_metric_prompt(metric: str, is_multi_input: bool = False) -> str:
@@ -65,18 +433,89 @@ def get_metric_prompt(metric: str, is_multi_input: bool = False) -> str:
     return ""
 
 
-def encode_image_to_base64(path: str) -> Optional[str]:
-    # resize to 512*512
-    try:
-        with Image.open(path) as img:
-            img = img.convert("RGB")
-            img.thumbnail((512, 512))
-            # logging.info(f"Thumbnail created for {os.path.basename(path)} with size {img.size}")
+def configure_image_cache(max_mb: Optional[int] = None, spill_dir: Optional[str] = None) -> None:
+    max_bytes = max_mb * 1024 * 1024 if max_mb is not None else None
+    IMAGE_CACHE.configure(max_bytes=max_bytes, spill_dir=spill_dir)
 
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=90)
-            return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
+# Optional process pool running the CPU-bound decode / resize / JPEG encode outside the GIL
+IMAGE_POOL: Optional[ProcessPoolExecutor] = None
+IMAGE_WORKERS = 0
+
+
+def configure_image_workers(workers: int = 0) -> None:
+    """Encode images in `workers` processes; 0 encodes in the calling thread."""
+    global IMAGE_POOL, IMAGE_WORKERS
+    if IMAGE_POOL is not None:
+        IMAGE_POOL.shutdown(wait=True, cancel_futures=True)
+        IMAGE_POOL = None
+    IMAGE_WORKERS = max(0, workers)
+    if IMAGE_WORKERS:
+        # spawn: forking a process that already runs HTTP / telemetry threads is unsafe
+        IMAGE_POOL = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        logging.info(f"Encoding judge images in {IMAGE_WORKERS} worker processes")
+
+
+def _encode_off_thread(data: bytes, profile: ImageProfile) -> str:
+    pool = IMAGE_POOL
+    encoded = None
+    if pool is not None:
+        try:
+            encoded = pool.submit(encode_with_profile, data, profile).result()
+        except BrokenProcessPool:
+            logging.warning("Image worker pool is broken, encoding in the calling thread")
+    img_b64, size = encoded or encode_with_profile(data, profile)
+    PROFILE_STATS.note_size(img_b64, size)
+    return img_b64
+
+
+# Preprocessing profile of every (metric, image role); "default" is the 512px JPEG-90 thumbnail
+IMAGE_PROFILES = ProfileTable()
+PROFILE_STATS = ProfileStats()
+
+
+def configure_image_profiles(rules: Optional[List[str]] = None, profile_file: Optional[str] = None) -> None:
+    """Select image profiles with rules like "low", "ref=low", "visual_quality.edited=high" (see ProfileTable)."""
+    IMAGE_PROFILES.configure(load_profiles(profile_file), rules)
+    if rules:
+        logging.info(f"Image profiles: {'; '.join(IMAGE_PROFILES.describe())}")
+
+
+# Benchmark input / ref images preprocessed by prepare_images.py, read from one memory-mapped pack
+IMAGE_STORE: Optional[PackedImageStore] = None
+
+
+def configure_image_store(store_dir: Optional[str], dataset_root: str) -> Optional[PackedImageStore]:
+    global IMAGE_STORE
+    if IMAGE_STORE is not None:
+        IMAGE_STORE.close()
+    IMAGE_STORE = open_image_store(store_dir, dataset_root)
+    if IMAGE_STORE is not None:
+        logging.info(f"Reading prepared benchmark images from {store_dir} ({len(IMAGE_STORE.entries)} payloads)")
+    return IMAGE_STORE
+
+
+def encode_image_to_base64(
+    path: str,
+    max_size: int = 512,
+    quality: int = 90,
+    profile: Optional[ImageProfile] = None,
+) -> Optional[str]:
+    # resize to 512*512 (or as the profile says), each distinct (file content, profile) is encoded once per process
+    if profile is None:
+        profile = ImageProfile(max_size=max_size, quality=quality)
+    if IMAGE_STORE is not None:
+        stored = IMAGE_STORE.get(path, profile.cache_params())
+        if stored is not None:
+            img_b64, size = stored
+            PROFILE_STATS.note_size(img_b64, size)
+            return img_b64
+    try:
+        return IMAGE_CACHE.get_or_encode(
+            path,
+            profile.cache_params(),
+            lambda data: _encode_off_thread(data, profile),
+        )
     except Exception as e:
         logging.error(f"Failed to encode image {path}: {e}")
         return None
@@ -134,6 +573,21 @@ def extract_score_and_reason_generic(
     return None, None
 
 
+def extract_structured_score(response: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Parse an answer constrained by score_response_format(): {"reason": "...", "score": 8}.
+    Never falls back to the free-text patterns, so a stray digit is not taken as the score.
+    """
+    try:
+        data = json.loads(response)
+    except ValueError:
+        score, reason = extract_json_field(response)
+        return _valid_score(score), reason
+    if not isinstance(data, dict):
+        return None, None
+    return _valid_score(data.get("score")), data.get("reason")
+
+
 def build_message_for_metric(
     metric: str,
     instruction: str,
@@ -159,66 +613,402 @@ def build_message_for_metric(
         content = [
             {"type": "text", "text": base_prompt},
             {"type": "text", "text": "Image:"},
-            {
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{edited_image_b64}"}
-            },
+            _image_part(edited_image_b64, IMAGE_PROFILES.resolve(metric, "edited")),
         ]
         return {"role": "user", "content": content}
 
-    content = []
-    full_text = (
-            base_prompt + "\n\n"
-            f"Editing instruction: {instruction}"
+    use_hint_and_ref = metric in ("instruction_following", "knowledge_fidelity")
+    hint_text = None
+    if use_hint_and_ref and hint:
+        hint_text = (
+            "Hint (important for scoring): "
+            "The following hint describes the correct expected result of the editing task. "
+            "Use this as a direct reference for judging how well the edited image meets the intended goal.\n"
+            f"{hint}"
+        )
+    content = _assemble_content(
+        base_prompt,
+        instruction,
+        input_images_b64,
+        is_multi_input,
+        edited_image_b64,
+        hint_text,
+        ref_images_b64 if use_hint_and_ref else None,
+        metric,
     )
-    content.append({"type": "text", "text": full_text})
+    message = {
+        "role": "user",
+        "content": content,
+    }
+    return message
 
+
+def _image_part(img_b64: str, profile: Optional[ImageProfile] = None) -> dict:
+    image_url = {"url": f"data:{image_mime(img_b64)};base64,{img_b64}"}
+    if profile is not None:
+        PROFILE_STATS.record(profile, img_b64)
+        if profile.detail:
+            image_url["detail"] = profile.detail
+    return {
+        "type": "image_url",
+        "image_url": image_url
+    }
+
+
+def _assemble_content(
+    prompt_text: str,
+    instruction: str,
+    input_images_b64: List[str],
+    is_multi_input: bool,
+    edited_image_b64: str,
+    hint_text: Optional[str],
+    ref_images_b64: Optional[List[str]],
+    metric: Optional[str] = None,
+) -> List[dict]:
+    """
+    Order the parts of a judge message according to MESSAGE_LAYOUT; image parts carry
+    the detail level of the metric's image profiles (metric None: a combined message).
+    """
+    input_profile = IMAGE_PROFILES.resolve(metric, "input")
+    inputs = []
     if input_images_b64:
         if is_multi_input:
             for idx, img_b64 in enumerate(input_images_b64, start=1):
-                content.append({"type": "text", "text": f"Input image #{idx}:"})
-                content.append({
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}
-                })
+                inputs.append({"type": "text", "text": f"Input image #{idx}:"})
+                inputs.append(_image_part(img_b64, input_profile))
         else:
-            content.append({"type": "text", "text": "Input image:"})
-            content.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{input_images_b64[0]}"}
-            })
-
-    content.append({"type": "text", "text": "Edited image:"})
-    content.append({
-        "type": "image_url",
-        "image_url": {"url": f"data:image/jpeg;base64,{edited_image_b64}"}
-    })
+            inputs.append({"type": "text", "text": "Input image:"})
+            inputs.append(_image_part(input_images_b64[0], input_profile))
 
-    use_hint_and_ref = metric in ("instruction_following", "knowledge_fidelity")
+    edited = [{"type": "text", "text": "Edited image:"}, _image_part(edited_image_b64, IMAGE_PROFILES.resolve(metric, "edited"))]
+
+    ref_profile = IMAGE_PROFILES.resolve(metric, "ref")
+    refs = []
+    for ref_b64 in ref_images_b64 or []:
+        refs.append({"type": "text", "text": "Reference image:"})
+        refs.append(_image_part(ref_b64, ref_profile))
+
+    hint = [{"type": "text", "text": hint_text}] if hint_text else []
+
+    if MESSAGE_LAYOUT == "cache":
+        # the edited image is the only part that differs between models and CN / EN
+        text = f"Editing instruction: {instruction}"
+        if hint_text:
+            text += "\n\n" + hint_text
+        return [{"type": "text", "text": prompt_text}] + inputs + refs + [{"type": "text", "text": text}] + edited
+
+    full_text = (
+            prompt_text + "\n\n"
+            f"Editing instruction: {instruction}"
+    )
+    return [{"type": "text", "text": full_text}] + inputs + edited + hint + refs
+
+
+def build_combined_message(
+    metrics: List[str],
+    instruction: str,
+    input_images_b64: List[str],
+    is_multi_input: bool,
+    edited_image_b64: str,
+    hint: Optional[str] = None,
+    ref_images_b64: Optional[List[str]] = None,
+) -> dict:
+    """
+    One judge message asking for all `metrics` at once: every metric's rubric under a
+    shared header, the images sent a single time, and a JSON object of per-metric scores
+    as the answer (see extract_combined_scores()).
+    """
+    text = prompt_combined_header
+    for metric in metrics:
+        text += prompt_combined_criterion.format(metric=metric, rubric=get_metric_prompt(metric, is_multi_input).strip())
+    example = json.dumps({m: {"score": 8, "reason": "..."} for m in metrics})
+    text += prompt_combined_output.format(example=example, metrics=", ".join(metrics))
+
+    use_hint_and_ref = any(m in ("instruction_following", "knowledge_fidelity") for m in metrics)
+    hint_text = None
     if use_hint_and_ref and hint:
-        content.append({
-            "type": "text",
-            "text": (
-                "Hint (important for scoring): "
-                "The following hint describes the correct expected result of the editing task. "
-                "Use this as a direct reference for judging how well the edited image meets the intended goal.\n"
-                f"{hint}"
-            ),
-        })
-
-    if use_hint_and_ref and ref_images_b64:
-        for idx, ref_b64 in enumerate(ref_images_b64, start=1):
-            content.append({"type": "text", "text": f"Reference image:"})
-            content.append({
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{ref_b64}"}
-            })
+        hint_text = (
+            "Hint (important for scoring instruction_following / knowledge_fidelity): "
+            "The following hint describes the correct expected result of the editing task. "
+            "Use this as a direct reference for judging how well the edited image meets the intended goal.\n"
+            f"{hint}"
+        )
+    content = _assemble_content(
+        text,
+        instruction,
+        input_images_b64,
+        is_multi_input,
+        edited_image_b64,
+        hint_text,
+        ref_images_b64 if use_hint_and_ref else None,
+    )
+    return {"role": "user", "content": content}
+
+
+def build_repair_message(answer: str, metrics: Optional[List[str]] = None) -> dict:
+    """Text-only follow-up asking for the final score(s) of an unparsable judge answer as strict JSON."""
+    if metrics:
+        example = json.dumps({m: {"score": 8, "reason": "..."} for m in metrics})
+        output = prompt_repair_combined.format(example=example, metrics=", ".join(metrics))
+    else:
+        output = prompt_repair_single
+    return {"role": "user", "content": [{"type": "text", "text": prompt_repair.format(answer=answer.strip(), output=output)}]}
+
+
+def _valid_score(value) -> Optional[int]:
+    try:
+        score = int(value)
+    except (TypeError, ValueError):
+        return None
+    return score if 1 <= score <= 10 else None
+
+
+def extract_combined_scores(response: str, metrics: List[str]) -> Dict[str, Tuple[int, Optional[str]]]:
+    """
+    Parse the answer to build_combined_message(): {"<metric>": {"score": 8, "reason": "..."}, ...}.
+    Returns metric -> (score, reason) for every metric with a valid 1–10 score; missing or
+    invalid metrics are left out, so the caller can judge them separately.
+    """
+    data = None
+    start, end = response.find("{"), response.rfind("}")
+    if start != -1 and end > start:
+        try:
+            data = json.loads(response[start:end + 1])
+        except Exception:
+            data = None
+
+    found: Dict[str, Tuple[int, Optional[str]]] = {}
+    for metric in metrics:
+        if isinstance(data, dict) and metric in data:
+            entry = data[metric]
+            if isinstance(entry, dict):
+                score, reason = _valid_score(entry.get("score")), entry.get("reason")
+            else:
+                score, reason = _valid_score(entry), None
+        else:
+            # broken outer JSON: look for this metric's own {"score": ...} object
+            m = re.search(rf"['\"]{metric}['\"]\s*:\s*(\{{[^{{}}]*\}})", response, re.DOTALL)
+            score, reason = extract_json_field(m.group(1)) if m else (None, None)
+            score = _valid_score(score)
+        if score is not None:
+            found[metric] = (score, reason)
+    return found
+
+
+def _handle_attempt_error(error: Exception, metric: str, attempt: int, max_retries: int) -> Tuple[str, Optional[float]]:
+    """
+    Classify a failed attempt, update the rate limiter / circuit breaker and return
+    (error kind, seconds to sleep before the next attempt or None to stop retrying).
+    """
+    kind = classify_error(error)
+    logging.warning(
+        f"[{metric}] GPT call failed ({kind}) on attempt {attempt}/{max_retries}: {error}"
+    )
+    TELEMETRY.count_retry(kind)
+    _note_rate_limited(error)
+    CIRCUIT_BREAKER.record_failure(kind)
+    if attempt >= max_retries or not RETRY_POLICY.is_retriable(kind):
+        return kind, None
+    return kind, RETRY_POLICY.delay(attempt, kind, retry_after_seconds(error))
 
-    message = {
-        "role": "user",
-        "content": content,
-    }
-    return message
+
+def _handle_response(
+    resp,
+    est_tokens: int,
+    metric: str,
+    attempt: int,
+    max_retries: int,
+    model_name: str = "",
+    cache_key: Optional[str] = None,
+    parse: Callable[[str], Tuple[Optional[Any], Optional[str]]] = extract_score_and_reason_generic,
+    answer_format: str = "text",
+    usage_metric: Optional[str] = None,
+) -> Tuple[Optional[Any], Optional[str], Optional[float]]:
+    """
+    Return (score, reason, seconds to sleep before retrying a parse failure or None to stop).
+    `answer_format` is the response format the answer was requested in ("text" / "json_schema").
+    """
+    CIRCUIT_BREAKER.record_success()
+    USAGE.record(usage_metric or metric, getattr(resp, "usage", None), model=model_name)
+    if RATE_LIMITER is not None:
+        RATE_LIMITER.settle(est_tokens, _usage_total_tokens(resp))
+    text_resp = _answer_text(resp)
+    # print(text_resp) # test
+    with span("parse"):
+        score, reason = parse(text_resp)
+    TELEMETRY.count_parse_result(answer_format, score is not None)
+    if score is not None:
+        store_cached_answer(cache_key, score if isinstance(score, int) else None, reason, text_resp)
+        return score, reason, None
+    logging.warning(
+        f"[{metric}] Parsed score is None on attempt {attempt}/{max_retries} ({answer_format} answer)."
+    )
+    if attempt >= max_retries:
+        return None, None, None
+    return None, None, RETRY_POLICY.delay(attempt, PARSE)
+
+
+def _answer_text(resp) -> str:
+    return resp.choices[0].message.content or ""
+
+
+def _handle_repair(
+    resp,
+    est_tokens: int,
+    metric: str,
+    model_name: str,
+    cache_key: Optional[str],
+    parse: Callable[[str], Tuple[Optional[Any], Optional[str]]],
+    usage_metric: Optional[str] = None,
+) -> Tuple[Optional[Any], Optional[str]]:
+    """Parse the answer to build_repair_message(); a parsed score is cached as the answer of the original request."""
+    USAGE.record(usage_metric or metric, getattr(resp, "usage", None), model=model_name)
+    if RATE_LIMITER is not None:
+        RATE_LIMITER.settle(est_tokens, _usage_total_tokens(resp))
+    text = _answer_text(resp)
+    with span("parse"):
+        score, reason = parse(text)
+    TELEMETRY.count_repair(score is not None)
+    if score is None:
+        logging.warning(f"[{metric}] Repair answer has no parsable score either, re-sending the full request.")
+        return None, None
+    store_cached_answer(cache_key, score if isinstance(score, int) else None, reason, text)
+    return score, reason
+
+
+def _repair_failed(error: Exception, metric: str) -> Tuple[None, None]:
+    logging.warning(f"[{metric}] Repair request failed ({classify_error(error)}): {error}")
+    _note_rate_limited(error)
+    TELEMETRY.count_repair(False)
+    return None, None
+
+
+def _repair_answer(
+    client: OpenAI,
+    answer: str,
+    metric: str,
+    model_name: str,
+    cache_key: Optional[str],
+    schema_metrics: Optional[List[str]],
+    parse: Callable[[str], Tuple[Optional[Any], Optional[str]]],
+    structured_parse: Callable[[str], Tuple[Optional[Any], Optional[str]]],
+    usage_metric: Optional[str] = None,
+) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    Ask for the score of an unparsable `answer` with a text-only follow-up instead of
+    re-sending the images. Returns (score, reason), score None if the repair failed too.
+    """
+    message = build_repair_message(answer, schema_metrics)
+    est_tokens = estimate_request_tokens(message, max_tokens=MAX_COMPLETION_TOKENS)
+    if RATE_LIMITER is not None:
+        RATE_LIMITER.acquire(est_tokens)
+    try:
+        with span("repair"):
+            resp, used_format = _create_completion(
+                client, message, model_name, _response_format(client, model_name, schema_metrics)
+            )
+    except Exception as e:
+        return _repair_failed(e, metric)
+    return _handle_repair(
+        resp, est_tokens, metric, model_name, cache_key, structured_parse if used_format else parse, usage_metric
+    )
+
+
+async def _repair_answer_async(
+    client: AsyncOpenAI,
+    answer: str,
+    metric: str,
+    model_name: str,
+    cache_key: Optional[str],
+    schema_metrics: Optional[List[str]],
+    parse: Callable[[str], Tuple[Optional[Any], Optional[str]]],
+    structured_parse: Callable[[str], Tuple[Optional[Any], Optional[str]]],
+    semaphore: Optional[asyncio.Semaphore] = None,
+    usage_metric: Optional[str] = None,
+) -> Tuple[Optional[Any], Optional[str]]:
+    """Async version of _repair_answer()."""
+    message = build_repair_message(answer, schema_metrics)
+    est_tokens = estimate_request_tokens(message, max_tokens=MAX_COMPLETION_TOKENS)
+    if RATE_LIMITER is not None:
+        await RATE_LIMITER.acquire_async(est_tokens)
+    try:
+        async with (semaphore or contextlib.nullcontext()):
+            with span("repair"):
+                resp, used_format = await _create_completion_async(
+                    client, message, model_name, _response_format(client, model_name, schema_metrics)
+                )
+    except Exception as e:
+        return await _off_loop(_repair_failed, e, metric)
+    return await _off_loop(
+        _handle_repair, resp, est_tokens, metric, model_name, cache_key, structured_parse if used_format else parse,
+        usage_metric,
+    )
+
+
+async def _off_loop(func: Callable[..., Any], *args) -> Any:
+    """
+    Run `func(*args)` in a worker thread if it may write the response cache or the shared
+    rate-limiter file (flock + rewrite), which would stall every coroutine of the loop.
+    """
+    if RESPONSE_CACHE is not None or (RATE_LIMITER is not None and RATE_LIMITER.state_file):
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+def _give_up(
+    metric: str,
+    model_name: str,
+    max_retries: int,
+    last_kind: str,
+    last_error: Optional[Exception],
+    parse_fallback: Optional[Any] = 0,
+) -> Tuple[Optional[Any], Optional[str]]:
+    if last_kind not in (PARSE, CLIENT):
+        # the endpoint never gave a usable answer: leave the score empty for resume instead of writing 0
+        raise JudgeUnavailableError(
+            f"[{metric}] judge unavailable after {max_retries} attempts ({last_kind}): {last_error}", last_kind
+        )
+    if last_kind == CLIENT:
+        # the request itself was rejected (e.g. content policy, too large): resending it on resume fails the same way
+        logging.error(f"[{metric}] Judge request rejected: {last_error}")
+    if parse_fallback is None:
+        logging.warning(f"[{metric}] No parsable answer after {max_retries} attempts.")
+        return None, None
+    TELEMETRY.count_zero_fallback()
+    logging.error(f"important error {model_name}: [{metric}] Failed after {max_retries} attempts, using score={parse_fallback}.")
+    return parse_fallback, None
+
+
+def _create_completion(client: OpenAI, message: dict, model_name: str, response_format: Optional[dict]):
+    """Send one judge request; returns (response, response_format actually used)."""
+    try:
+        resp = client.chat.completions.create(
+            model=model_name,
+            messages=[message],
+            stream=False,
+            **_decoding_params(response_format),
+        )
+    except Exception as e:
+        if response_format is None or not _schema_rejected(e, client, model_name):
+            raise
+        return _create_completion(client, message, model_name, None)
+    return resp, response_format
+
+
+async def _create_completion_async(client: AsyncOpenAI, message: dict, model_name: str, response_format: Optional[dict]):
+    """Async version of _create_completion()."""
+    try:
+        resp = await client.chat.completions.create(
+            model=model_name,
+            messages=[message],
+            stream=False,
+            **_decoding_params(response_format),
+        )
+    except Exception as e:
+        if response_format is None or not _schema_rejected(e, client, model_name):
+            raise
+        return await _create_completion_async(client, message, model_name, None)
+    return resp, response_format
 
 
 def call_gpt_with_retry(
@@ -227,36 +1017,116 @@ def call_gpt_with_retry(
     max_retries: int = 3,
     model_name: str = DEFAULT_MODEL_NAME,
     api_key: str = DEFAULT_API_KEY,
-    base_url: str = DEFAULT_BASE_URL
-) -> Tuple[int, Optional[str]]:
-    client = init_client(api_key, base_url)
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[OpenAI] = None,
+    parse: Callable[[str], Tuple[Optional[Any], Optional[str]]] = extract_score_and_reason_generic,
+    parse_fallback: Optional[Any] = 0,
+    schema_metrics: Optional[List[str]] = None,
+    structured_parse: Callable[[str], Tuple[Optional[Any], Optional[str]]] = extract_structured_score,
+    usage_metric: Optional[str] = None,
+) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    Send one judge request and parse its score, retrying with backoff on failures.
+    Returns (score, reason); score is `parse_fallback` (0) if the judge kept answering
+    without a parsable score. Raises JudgeUnavailableError if the endpoint itself kept failing.
+    `parse` turns a free-text answer into (score, reason), score None meaning unparsable;
+    with --response_format json_schema the answer follows score_response_format(schema_metrics)
+    and is read by `structured_parse` instead. `metric` labels the log messages; usage and
+    telemetry are recorded under `usage_metric` if given (e.g. COMBINED_METRIC).
+    """
+    if client is None:
+        client = get_client(api_key, base_url)
+    response_format = _response_format(client, model_name, schema_metrics)
+    cache_key, cached = lookup_cached_answer(message, model_name, response_format, endpoint_url(client))
+    if cached is not None:
+        score, reason = (structured_parse if response_format else parse)(cached[2] or "")
+        if score is not None:
+            return score, reason
+    est_tokens = estimate_request_tokens(message, max_tokens=MAX_COMPLETION_TOKENS)
+    last_kind, last_error = PARSE, None
 
     for attempt in range(1, max_retries + 1):
+        throttle_started = time.monotonic()
+        CIRCUIT_BREAKER.before_call()
+        if RATE_LIMITER is not None:
+            RATE_LIMITER.acquire(est_tokens)
+        emit_since("throttle", throttle_started, attempt=attempt)
+        started = time.monotonic()
         try:
-            resp = client.chat.completions.create(
-                model=model_name,
-                messages=[message],
-                max_tokens=1000,
-                stream=False,
+            resp, used_format = _create_completion(client, message, model_name, _response_format(client, model_name, schema_metrics))
+        except Exception as e:
+            last_error = e
+            last_kind, delay = _handle_attempt_error(e, metric, attempt, max_retries)
+            emit_since("http", started, attempt=attempt, outcome=last_kind)
+            if delay is None:
+                break
+            with span("backoff", attempt=attempt):
+                time.sleep(delay)
+            continue
+
+        TELEMETRY.observe_call(usage_metric or metric, time.monotonic() - started)
+        emit_since("http", started, attempt=attempt, outcome="ok")
+        last_kind, last_error = PARSE, None
+        if (used_format is None) != (response_format is None):
+            # the endpoint turned out not to support json_schema: a free-text answer, cached as such
+            response_format, cache_key = used_format, answer_cache_key(message, model_name, used_format, endpoint_url(client))
+        score, reason, delay = _handle_response(
+            resp, est_tokens, metric, attempt, max_retries, model_name, cache_key,
+            structured_parse if response_format else parse, "json_schema" if response_format else "text", usage_metric,
+        )
+        if score is not None:
+            return score, reason
+        if PARSE_REPAIR and _answer_text(resp).strip():
+            score, reason = _repair_answer(
+                client, _answer_text(resp), metric, model_name, cache_key, schema_metrics, parse, structured_parse,
+                usage_metric,
             )
-            text_resp = resp.choices[0].message.content
-            # print(text_resp) # test
-            score, reason = extract_score_and_reason_generic(text_resp)
             if score is not None:
                 return score, reason
-            logging.warning(
-                f"[{metric}] Parsed score is None on attempt {attempt}/{max_retries}, will retry."
-            )
+        if delay is None:
+            break
+        TELEMETRY.count_parse_resend()
+        with span("backoff", attempt=attempt):
+            time.sleep(delay)
 
-        except Exception as e:
-            logging.warning(
-                f"[{metric}] GPT call failed on attempt {attempt}/{max_retries}: {e}"
-            )
+    return _give_up(metric, model_name, max_retries, last_kind, last_error, parse_fallback)
 
-        time.sleep(5)
 
-    logging.error(f"important error {model_name}: [{metric}] Failed after {max_retries} attempts, using score=0.")
-    return 0, None
+def encode_example_images(
+    input_image_paths: List[str],
+    edited_image_path: str,
+    ref_image_paths: Optional[List[str]] = None,
+    metric: Optional[str] = None,
+) -> Tuple[List[str], Optional[str], List[str]]:
+    """
+    Encode (input images, edited image, ref images) with the image profiles of `metric`
+    (None: of a combined message). Bad input / ref images are skipped; the edited image
+    is None if it cannot be encoded.
+    """
+    with span("encode"):
+        input_images_b64: List[str] = []
+        for p in input_image_paths:
+            b64 = encode_image_to_base64(p, profile=IMAGE_PROFILES.resolve(metric, "input"))
+            if b64:
+                input_images_b64.append(b64)
+            else:
+                logging.warning(f"Skip bad input image: {p}")
+
+        edited_b64 = encode_image_to_base64(edited_image_path, profile=IMAGE_PROFILES.resolve(metric, "edited"))
+        if not edited_b64:
+            logging.error(f"Cannot encode edited image: {edited_image_path}. All metrics set to 0.")
+            return input_images_b64, None, []
+
+        ref_images_b64: List[str] = []
+        if ref_image_paths:
+            for p in ref_image_paths:
+                b64 = encode_image_to_base64(p, profile=IMAGE_PROFILES.resolve(metric, "ref"))
+                if b64:
+                    ref_images_b64.append(b64)
+                else:
+                    logging.warning(f"Skip bad ref image: {p}")
+
+        return input_images_b64, edited_b64, ref_images_b64
 
 
 def evaluate_example_with_gpt(
@@ -270,7 +1140,9 @@ def evaluate_example_with_gpt(
     max_retries: int = 5,
     model_name: str = DEFAULT_MODEL_NAME,
     api_key: str = DEFAULT_API_KEY,
-    base_url: str = DEFAULT_BASE_URL
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[OpenAI] = None,
+    combined: bool = False,
 ) -> Dict[str, Optional[int]]:
     """
     Evaluate a single example with GPT and return scores (1–10) for the requested metrics.
@@ -287,46 +1159,338 @@ def evaluate_example_with_gpt(
         model_name: Model name for GPT evaluation.
         api_key: API key for the OpenAI client.
         base_url: Optional custom API base URL.
+        client: Optional shared client; defaults to get_client(api_key, base_url).
+        combined: Ask for all metrics in one request (see evaluate_metrics_combined_with_gpt()).
 
     Returns:
         A dict mapping each metric in ALL_METRICS to an int or None:
           - In metrics and succeeded: 1–10
-          - In metrics but failed after retries: 0
+          - In metrics but no parsable score after retries: 0
+          - In metrics but the endpoint kept failing: None (left for resume)
           - Not in metrics: None
     """
 
     scores: Dict[str, Optional[int]] = {m: None for m in ALL_METRICS}
+    if client is None:
+        client = get_client(api_key, base_url)
 
-    input_images_b64: List[str] = []
-    for p in input_image_paths:
-        b64 = encode_image_to_base64(p)
-        if b64:
-            input_images_b64.append(b64)
-        else:
-            logging.warning(f"Skip bad input image: {p}")
+    if combined:
+        valid_metrics = [m for m in metrics if m in ALL_METRICS]
+        try:
+            scores.update(evaluate_metrics_combined_with_gpt(
+                valid_metrics, input_image_paths, is_multi_input, edited_image_path, instruction,
+                hint=hint, ref_image_paths=ref_image_paths, max_retries=max_retries,
+                model_name=model_name, api_key=api_key, base_url=base_url, client=client,
+            ))
+        except JudgeUnavailableError as e:
+            logging.error(f"{e}. Scores left empty for resume.")
+        return scores
+
+    for metric in metrics:
+        if metric not in ALL_METRICS:
+            logging.warning(f"Unknown metric '{metric}', skip.")
+            continue
+
+        # images come from IMAGE_CACHE, re-encoded only if the metric has its own image profile
+        message = build_metric_message(
+            metric, input_image_paths, is_multi_input, edited_image_path, instruction, hint, ref_image_paths
+        )
+        if message is None:
+            scores[metric] = 0
+            continue
+        try:
+            score, _reason = call_gpt_with_retry(message, metric, max_retries=max_retries,model_name=model_name,api_key=api_key,base_url=base_url,client=client)
+        except JudgeUnavailableError as e:
+            logging.error(f"{e}. Score left empty for resume.")
+            score = None
+        scores[metric] = score
+
+    return scores
 
-    edited_b64 = encode_image_to_base64(edited_image_path)
+
+def build_metric_message(
+    metric: str,
+    input_image_paths: List[str],
+    is_multi_input: bool,
+    edited_image_path: str,
+    instruction: str,
+    hint: Optional[str] = None,
+    ref_image_paths: Optional[List[str]] = None,
+) -> Optional[dict]:
+    """Encode the images of an example and build the judge message of one metric; None if the edited image is unusable."""
+    input_images_b64, edited_b64, ref_images_b64 = encode_example_images(
+        input_image_paths, edited_image_path, ref_image_paths, metric
+    )
     if not edited_b64:
-        logging.error(f"Cannot encode edited image: {edited_image_path}. All metrics set to 0.")
-        for m in metrics:
-            if m in ALL_METRICS:
-                scores[m] = 0
-        return scores
+        return None
+    return build_message_for_metric(
+        metric=metric,
+        instruction=instruction,
+        input_images_b64=input_images_b64,
+        is_multi_input=is_multi_input,
+        edited_image_b64=edited_b64,
+        hint=hint,
+        ref_images_b64=ref_images_b64,
+    )
 
-    ref_images_b64: List[str] = []
-    if ref_image_paths:
-        for p in ref_image_paths:
-            b64 = encode_image_to_base64(p)
-            if b64:
-                ref_images_b64.append(b64)
-            else:
-                logging.warning(f"Skip bad ref image: {p}")
 
+def evaluate_metric_with_gpt(
+    metric: str,
+    input_image_paths: List[str],
+    is_multi_input: bool,
+    edited_image_path: str,
+    instruction: str,
+    hint: Optional[str] = None,
+    ref_image_paths: Optional[List[str]] = None,
+    max_retries: int = 5,
+    model_name: str = DEFAULT_MODEL_NAME,
+    api_key: str = DEFAULT_API_KEY,
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[OpenAI] = None,
+) -> int:
+    """
+    Score a single metric of a single example; the unit of work of the global task scheduler.
+    Images come from IMAGE_CACHE, so judging the other metrics of the same example does not re-encode them.
+    Returns 0 if the edited image cannot be encoded or the judge never gives a parsable score;
+    raises JudgeUnavailableError if the endpoint keeps failing.
+    """
+    message = build_metric_message(
+        metric, input_image_paths, is_multi_input, edited_image_path, instruction, hint, ref_image_paths
+    )
+    if message is None:
+        return 0
+    score, _reason = call_gpt_with_retry(
+        message, metric, max_retries=max_retries, model_name=model_name,
+        api_key=api_key, base_url=base_url, client=client,
+    )
+    return score
+
+
+def _combined_parser(metrics: List[str]) -> Callable[[str], Tuple[Optional[Dict[str, Tuple[int, Optional[str]]]], Optional[str]]]:
+    # unparsable only if no metric at all could be read; partial answers are completed per metric
+    def parse(text: str):
+        found = extract_combined_scores(text, metrics)
+        return (found or None), None
+    return parse
+
+
+def _missing_combined_metrics(metrics: List[str], found: Optional[Dict[str, Tuple[int, Optional[str]]]]) -> List[str]:
+    missing = [m for m in metrics if not found or m not in found]
+    if missing:
+        logging.warning(f"[{'+'.join(metrics)}] Combined answer lacks {missing}, judging them one by one.")
+    return missing
+
+
+def _budget_exhausted(budget: Optional[Budget], metric: str) -> bool:
+    # a per-metric fallback is a new judge request, scheduled only while the budget lasts
+    if budget is None or not budget.exhausted():
+        return False
+    logging.warning(f"[{metric}] Budget reached, fallback request skipped; score left empty for resume.")
+    return True
+
+
+def evaluate_metrics_combined_with_gpt(
+    metrics: List[str],
+    input_image_paths: List[str],
+    is_multi_input: bool,
+    edited_image_path: str,
+    instruction: str,
+    hint: Optional[str] = None,
+    ref_image_paths: Optional[List[str]] = None,
+    max_retries: int = 5,
+    model_name: str = DEFAULT_MODEL_NAME,
+    api_key: str = DEFAULT_API_KEY,
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[OpenAI] = None,
+    budget: Optional[Budget] = None,
+) -> Dict[str, Optional[int]]:
+    """
+    Score several metrics of one example with a single judge request (combined rubric,
+    JSON object of per-metric scores); the images are sent once instead of once per metric.
+    Metrics missing from the answer fall back to the usual per-metric request, unless
+    `budget` is exhausted by then (those scores are left empty for resume). Returns
+    metric -> score with the conventions of evaluate_metric_with_gpt(); raises
+    JudgeUnavailableError if the endpoint keeps failing.
+    """
+    input_images_b64, edited_b64, ref_images_b64 = encode_example_images(
+        input_image_paths, edited_image_path, ref_image_paths
+    )
+    if not edited_b64:
+        return {m: 0 for m in metrics}
+
+    message = build_combined_message(
+        metrics, instruction, input_images_b64, is_multi_input, edited_b64, hint, ref_images_b64
+    )
+    # a malformed combined answer is cheaper to complete per metric than to ask again in full
+    found, _reason = call_gpt_with_retry(
+        message, "+".join(metrics), max_retries=min(max_retries, 2), model_name=model_name,
+        api_key=api_key, base_url=base_url, client=client,
+        parse=_combined_parser(metrics), parse_fallback=None,
+        schema_metrics=metrics, structured_parse=_combined_parser(metrics), usage_metric=COMBINED_METRIC,
+    )
+    scores: Dict[str, Optional[int]] = {m: score for m, (score, _r) in (found or {}).items()}
+
+    for metric in _missing_combined_metrics(metrics, found):
+        if _budget_exhausted(budget, metric):
+            scores[metric] = None
+            continue
+        message = build_metric_message(
+            metric, input_image_paths, is_multi_input, edited_image_path, instruction, hint, ref_image_paths
+        )
+        if message is None:
+            scores[metric] = 0
+            continue
+        try:
+            scores[metric], _reason = call_gpt_with_retry(
+                message, metric, max_retries=max_retries, model_name=model_name,
+                api_key=api_key, base_url=base_url, client=client,
+            )
+        except JudgeUnavailableError as e:
+            logging.error(f"{e}. Score left empty for resume.")
+            scores[metric] = None
+    return scores
+
+
+async def call_gpt_with_retry_async(
+    message: dict,
+    metric: str,
+    max_retries: int = 3,
+    model_name: str = DEFAULT_MODEL_NAME,
+    api_key: str = DEFAULT_API_KEY,
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[AsyncOpenAI] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    parse: Callable[[str], Tuple[Optional[Any], Optional[str]]] = extract_score_and_reason_generic,
+    parse_fallback: Optional[Any] = 0,
+    schema_metrics: Optional[List[str]] = None,
+    structured_parse: Callable[[str], Tuple[Optional[Any], Optional[str]]] = extract_structured_score,
+    usage_metric: Optional[str] = None,
+) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    Async version of call_gpt_with_retry(). If a semaphore is given, it bounds the
+    number of in-flight requests; it is released while sleeping between attempts.
+    """
+    if client is None:
+        client = get_async_client(api_key, base_url)
+    response_format = _response_format(client, model_name, schema_metrics)
+    if RESPONSE_CACHE is not None:
+        cache_key, cached = await asyncio.to_thread(
+            lookup_cached_answer, message, model_name, response_format, endpoint_url(client)
+        )
+    else:
+        cache_key, cached = None, None
+    if cached is not None:
+        score, reason = (structured_parse if response_format else parse)(cached[2] or "")
+        if score is not None:
+            return score, reason
+    est_tokens = estimate_request_tokens(message, max_tokens=MAX_COMPLETION_TOKENS)
+    last_kind, last_error = PARSE, None
+
+    for attempt in range(1, max_retries + 1):
+        # wait for the breaker and rate budget before taking an in-flight slot
+        throttle_started = time.monotonic()
+        await CIRCUIT_BREAKER.before_call_async()
+        if RATE_LIMITER is not None:
+            await RATE_LIMITER.acquire_async(est_tokens)
+        emit_since("throttle", throttle_started, attempt=attempt)
+        try:
+            async with (semaphore or contextlib.nullcontext()):
+                started = time.monotonic()
+                resp, used_format = await _create_completion_async(
+                    client, message, model_name, _response_format(client, model_name, schema_metrics)
+                )
+        except Exception as e:
+            last_error = e
+            last_kind, delay = await _off_loop(_handle_attempt_error, e, metric, attempt, max_retries)
+            emit_since("http", started, attempt=attempt, outcome=last_kind)
+            if delay is None:
+                break
+            with span("backoff", attempt=attempt):
+                await asyncio.sleep(delay)
+            continue
+
+        TELEMETRY.observe_call(usage_metric or metric, time.monotonic() - started)
+        emit_since("http", started, attempt=attempt, outcome="ok")
+        last_kind, last_error = PARSE, None
+        if (used_format is None) != (response_format is None):
+            response_format, cache_key = used_format, answer_cache_key(message, model_name, used_format, endpoint_url(client))
+        score, reason, delay = await _off_loop(
+            _handle_response, resp, est_tokens, metric, attempt, max_retries, model_name, cache_key,
+            structured_parse if response_format else parse, "json_schema" if response_format else "text", usage_metric,
+        )
+        if score is not None:
+            return score, reason
+        if PARSE_REPAIR and _answer_text(resp).strip():
+            score, reason = await _repair_answer_async(
+                client, _answer_text(resp), metric, model_name, cache_key, schema_metrics, parse, structured_parse,
+                semaphore, usage_metric,
+            )
+            if score is not None:
+                return score, reason
+        if delay is None:
+            break
+        TELEMETRY.count_parse_resend()
+        with span("backoff", attempt=attempt):
+            await asyncio.sleep(delay)
+
+    return _give_up(metric, model_name, max_retries, last_kind, last_error, parse_fallback)
+
+
+async def evaluate_example_with_gpt_async(
+    input_image_paths: List[str],
+    is_multi_input: bool,
+    edited_image_path: str,
+    instruction: str,
+    metrics: List[str],
+    hint: Optional[str] = None,
+    ref_image_paths: Optional[List[str]] = None,
+    max_retries: int = 5,
+    model_name: str = DEFAULT_MODEL_NAME,
+    api_key: str = DEFAULT_API_KEY,
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[AsyncOpenAI] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    combined: bool = False,
+) -> Dict[str, Optional[int]]:
+    """
+    Async version of evaluate_example_with_gpt(). Image encoding runs in a worker thread
+    so it never blocks the event loop, and all metrics of the example are requested concurrently.
+    """
+    scores: Dict[str, Optional[int]] = {m: None for m in ALL_METRICS}
+    if client is None:
+        client = get_async_client(api_key, base_url)
+
+    if combined:
+        valid_metrics = [m for m in metrics if m in ALL_METRICS]
+        try:
+            scores.update(await evaluate_metrics_combined_with_gpt_async(
+                valid_metrics, input_image_paths, is_multi_input, edited_image_path, instruction,
+                hint=hint, ref_image_paths=ref_image_paths, max_retries=max_retries,
+                model_name=model_name, api_key=api_key, base_url=base_url, client=client,
+                semaphore=semaphore,
+            ))
+        except JudgeUnavailableError as e:
+            logging.error(f"{e}. Scores left empty for resume.")
+        return scores
+
+    # metrics sharing their image profiles share one encoding
+    encoded: Dict[Tuple[str, ...], Tuple[List[str], Optional[str], List[str]]] = {}
+    valid_metrics: List[str] = []
+    coros = []
     for metric in metrics:
         if metric not in ALL_METRICS:
             logging.warning(f"Unknown metric '{metric}', skip.")
             continue
 
+        profile_key = tuple(IMAGE_PROFILES.resolve(metric, role).name for role in IMAGE_ROLES)
+        if profile_key not in encoded:
+            encoded[profile_key] = await asyncio.to_thread(
+                encode_example_images, input_image_paths, edited_image_path, ref_image_paths, metric
+            )
+        input_images_b64, edited_b64, ref_images_b64 = encoded[profile_key]
+        if not edited_b64:
+            scores[metric] = 0
+            continue
         message = build_message_for_metric(
             metric=metric,
             instruction=instruction,
@@ -336,7 +1500,112 @@ def evaluate_example_with_gpt(
             hint=hint,
             ref_images_b64=ref_images_b64,
         )
-        score, _reason = call_gpt_with_retry(message, metric, max_retries=max_retries,model_name=model_name,api_key=api_key,base_url=base_url)
-        scores[metric] = score
+        valid_metrics.append(metric)
+        coros.append(call_gpt_with_retry_async(
+            message, metric, max_retries=max_retries, model_name=model_name,
+            api_key=api_key, base_url=base_url, client=client, semaphore=semaphore,
+        ))
+
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for metric, result in zip(valid_metrics, results):
+        if isinstance(result, JudgeUnavailableError):
+            logging.error(f"{result}. Score left empty for resume.")
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        scores[metric] = result[0]
+
+    return scores
+
+
+async def evaluate_metric_with_gpt_async(
+    metric: str,
+    input_image_paths: List[str],
+    is_multi_input: bool,
+    edited_image_path: str,
+    instruction: str,
+    hint: Optional[str] = None,
+    ref_image_paths: Optional[List[str]] = None,
+    max_retries: int = 5,
+    model_name: str = DEFAULT_MODEL_NAME,
+    api_key: str = DEFAULT_API_KEY,
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[AsyncOpenAI] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> int:
+    """Async version of evaluate_metric_with_gpt(); image encoding runs in a worker thread."""
+    message = await asyncio.to_thread(
+        build_metric_message,
+        metric, input_image_paths, is_multi_input, edited_image_path, instruction, hint, ref_image_paths,
+    )
+    if message is None:
+        return 0
+    score, _reason = await call_gpt_with_retry_async(
+        message, metric, max_retries=max_retries, model_name=model_name,
+        api_key=api_key, base_url=base_url, client=client, semaphore=semaphore,
+    )
+    return score
+
 
+async def evaluate_metrics_combined_with_gpt_async(
+    metrics: List[str],
+    input_image_paths: List[str],
+    is_multi_input: bool,
+    edited_image_path: str,
+    instruction: str,
+    hint: Optional[str] = None,
+    ref_image_paths: Optional[List[str]] = None,
+    max_retries: int = 5,
+    model_name: str = DEFAULT_MODEL_NAME,
+    api_key: str = DEFAULT_API_KEY,
+    base_url: str = DEFAULT_BASE_URL,
+    client: Optional[AsyncOpenAI] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    budget: Optional[Budget] = None,
+) -> Dict[str, Optional[int]]:
+    """Async version of evaluate_metrics_combined_with_gpt(); missing metrics are requested concurrently."""
+    input_images_b64, edited_b64, ref_images_b64 = await asyncio.to_thread(
+        encode_example_images, input_image_paths, edited_image_path, ref_image_paths
+    )
+    if not edited_b64:
+        return {m: 0 for m in metrics}
+
+    message = build_combined_message(
+        metrics, instruction, input_images_b64, is_multi_input, edited_b64, hint, ref_images_b64
+    )
+    found, _reason = await call_gpt_with_retry_async(
+        message, "+".join(metrics), max_retries=min(max_retries, 2), model_name=model_name,
+        api_key=api_key, base_url=base_url, client=client, semaphore=semaphore,
+        parse=_combined_parser(metrics), parse_fallback=None,
+        schema_metrics=metrics, structured_parse=_combined_parser(metrics), usage_metric=COMBINED_METRIC,
+    )
+    scores: Dict[str, Optional[int]] = {m: score for m, (score, _r) in (found or {}).items()}
+
+    missing = []
+    coros = []
+    for metric in _missing_combined_metrics(metrics, found):
+        if _budget_exhausted(budget, metric):
+            scores[metric] = None
+            continue
+        message = await asyncio.to_thread(
+            build_metric_message,
+            metric, input_image_paths, is_multi_input, edited_image_path, instruction, hint, ref_image_paths,
+        )
+        if message is None:
+            scores[metric] = 0
+            continue
+        missing.append(metric)
+        coros.append(call_gpt_with_retry_async(
+            message, metric, max_retries=max_retries, model_name=model_name,
+            api_key=api_key, base_url=base_url, client=client, semaphore=semaphore,
+        ))
+    results = await asyncio.gather(*coros, return_exceptions=True)
+    for metric, result in zip(missing, results):
+        if isinstance(result, JudgeUnavailableError):
+            logging.error(f"{result}. Score left empty for resume.")
+            scores[metric] = None
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        scores[metric] = result[0]
     return scores
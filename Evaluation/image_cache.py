@@ -0,0 +1,188 @@
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# file digests kept beyond one per cached payload, so evicted (spilled) images are not hashed again at once
+MIN_DIGESTS = 10000
+
+
+class ImageCache:
+    """
+    Content-addressed cache for encoded judge images.
+
+    Entries are keyed on the sha1 of the source file bytes plus the preprocessing
+    parameters, so the same image reached through different paths (or re-evaluated
+    for CN / EN / another model) is decoded and re-encoded only once per process.
+    Memory is bounded by an LRU over the encoded payload size; evicted entries can
+    optionally be spilled to disk and are looked up there before re-encoding. The
+    (path, mtime, size) -> digest map is an LRU as well, bounded by the number of cached
+    payloads (at least MIN_DIGESTS).
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, spill_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[str, threading.Event] = {}
+        # (path, mtime_ns, size) -> sha1 of the file, so a path is only hashed once
+        self._digest_by_stat: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_bytes: Optional[int] = None, spill_dir: Optional[str] = None) -> None:
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if spill_dir:
+                os.makedirs(spill_dir, exist_ok=True)
+                self.spill_dir = spill_dir
+            evicted = self._evict_locked()
+        self._spill(evicted)
+
+    def file_digest(self, path: str) -> Tuple[str, Optional[bytes]]:
+        """
+        Return (sha1 hex, file bytes). The bytes are None if the digest was already
+        known for this (path, mtime, size) and the file did not need to be read.
+        """
+        st = os.stat(path)
+        stat_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            digest = self._digest_by_stat.get(stat_key)
+            if digest is not None:
+                self._digest_by_stat.move_to_end(stat_key)
+        if digest is not None:
+            return digest, None
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            self._digest_by_stat[stat_key] = digest
+            self._trim_digests_locked()
+        return digest, data
+
+    def get_or_encode(
+        self,
+        path: str,
+        params: Tuple,
+        encode_fn: Callable[[bytes], Optional[str]],
+    ) -> Optional[str]:
+        """
+        Return the cached payload for (content of path, params), calling
+        encode_fn(file_bytes) on a miss. Concurrent callers for the same key wait
+        for the first one instead of encoding again. Failed encodes (None) are not cached.
+        """
+        digest, data = self.file_digest(path)
+        key = digest + ":" + ",".join(str(p) for p in params)
+
+        while True:
+            with self._lock:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                event = self._inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._inflight[key] = event
+                    break
+            event.wait()
+
+        try:
+            value = self._read_spill(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                value = encode_fn(data)
+                with self._lock:
+                    self.misses += 1
+
+            if value is not None:
+                with self._lock:
+                    self._entries[key] = value
+                    self._size += len(value)
+                    evicted = self._evict_locked()
+                self._spill(evicted)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "digests": len(self._digest_by_stat),
+            }
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, key.replace(":", "_").replace(",", "-") + ".b64")
+
+    def _read_spill(self, key: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        p = self._spill_path(key)
+        if not os.path.exists(p):
+            return None
+        try:
+            with open(p, "r", encoding="ascii") as f:
+                return f.read()
+        except Exception as e:
+            logging.warning(f"Failed to read spilled image cache entry {p}: {e}")
+            return None
+
+    def _write_spill(self, key: str, value: str) -> None:
+        p = self._spill_path(key)
+        if os.path.exists(p):
+            return
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="ascii") as f:
+                f.write(value)
+            os.replace(tmp, p)
+        except Exception as e:
+            logging.warning(f"Failed to spill image cache entry to {p}: {e}")
+
+    def _evict_locked(self) -> List[Tuple[str, str]]:
+        evicted: List[Tuple[str, str]] = []
+        while self._size > self.max_bytes and self._entries:
+            key, value = self._entries.popitem(last=False)
+            self._size -= len(value)
+            self.evictions += 1
+            evicted.append((key, value))
+        if evicted:
+            self._trim_digests_locked()
+        return evicted
+
+    def _trim_digests_locked(self) -> None:
+        limit = max(MIN_DIGESTS, len(self._entries))
+        while len(self._digest_by_stat) > limit:
+            self._digest_by_stat.popitem(last=False)
+
+    def _spill(self, evicted: List[Tuple[str, str]]) -> None:
+        if not self.spill_dir:
+            return
+        for key, value in evicted:
+            self._write_spill(key, value)
@@ -0,0 +1,199 @@
+import io
+import json
+import math
+import base64
+import threading
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+IMAGE_ROLES = ("input", "edited", "ref")
+IMAGE_FORMATS = ("JPEG", "WEBP")
+DETAIL_LEVELS = ("low", "high", "auto")
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    """
+    How a judge image is preprocessed: longest side `max_size`, re-encoded as `format`
+    at `quality`, sent with the image_url `detail` level (None: not set). `draft` lets
+    the JPEG decoder downscale while decoding; `passthrough` sends the source bytes
+    untouched when they already are a JPEG / PNG / WebP no larger than max_size.
+    """
+    name: str = "default"
+    max_size: int = 512
+    format: str = "JPEG"
+    quality: int = 90
+    detail: Optional[str] = None
+    draft: bool = False
+    passthrough: bool = False
+
+    def cache_params(self) -> Tuple:
+        # the default profile keeps the cache key of the fixed 512px / JPEG 90 encoding
+        params: Tuple = (self.max_size, self.format, self.quality)
+        if self.draft or self.passthrough:
+            params += ("draft" if self.draft else "", "pass" if self.passthrough else "")
+        return params
+
+
+BUILTIN_PROFILES: Dict[str, ImageProfile] = {
+    "default": ImageProfile("default"),
+    "fast": ImageProfile("fast", draft=True, passthrough=True),
+    "low": ImageProfile("low", quality=85, detail="low", draft=True),
+    "webp": ImageProfile("webp", format="WEBP", quality=85, draft=True),
+    "high": ImageProfile("high", max_size=1024, quality=92, detail="high"),
+}
+
+
+def load_profiles(path: Optional[str] = None) -> Dict[str, ImageProfile]:
+    """
+    The built-in profiles, plus / overridden by the ones of a JSON file
+    {"name": {"max_size": 768, "format": "WEBP", ...}}; unset fields come from "default".
+    """
+    profiles = dict(BUILTIN_PROFILES)
+    if not path:
+        return profiles
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    for name, fields in data.items():
+        base = profiles.get(name, BUILTIN_PROFILES["default"])
+        profile = replace(base, name=name, **fields)
+        _validate(profile)
+        profiles[name] = profile
+    return profiles
+
+
+def _validate(profile: ImageProfile) -> None:
+    if profile.format not in IMAGE_FORMATS:
+        raise ValueError(f"Image profile '{profile.name}': format must be one of {IMAGE_FORMATS}")
+    if profile.detail is not None and profile.detail not in DETAIL_LEVELS:
+        raise ValueError(f"Image profile '{profile.name}': detail must be one of {DETAIL_LEVELS}")
+    if profile.max_size <= 0 or not 1 <= profile.quality <= 100:
+        raise ValueError(f"Image profile '{profile.name}': invalid max_size / quality")
+
+
+class ProfileTable:
+    """
+    Profile of every (metric, image role). Rules are "NAME" (everything), "ROLE=NAME",
+    "METRIC=NAME" or "METRIC.ROLE=NAME"; the most specific matching rule wins.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, ImageProfile]] = None, rules: Optional[List[str]] = None):
+        self.configure(profiles, rules)
+
+    def configure(self, profiles: Optional[Dict[str, ImageProfile]] = None, rules: Optional[List[str]] = None) -> None:
+        """Replace the known profiles and all rules."""
+        self.profiles = profiles or dict(BUILTIN_PROFILES)
+        self.rules: Dict[Tuple[Optional[str], Optional[str]], ImageProfile] = {}
+        for rule in rules or []:
+            self.add_rule(rule)
+
+    def add_rule(self, rule: str) -> None:
+        target, sep, name = rule.partition("=")
+        if not sep:
+            target, name = "", target
+        name = name.strip()
+        if name not in self.profiles:
+            raise ValueError(f"Unknown image profile '{name}' in '{rule}' (known: {', '.join(sorted(self.profiles))})")
+        metric, role = None, None
+        for part in filter(None, target.strip().split(".")):
+            if part in IMAGE_ROLES:
+                role = part
+            else:
+                metric = part
+        self.rules[(metric, role)] = self.profiles[name]
+
+    def resolve(self, metric: Optional[str], role: str) -> ImageProfile:
+        for key in ((metric, role), (metric, None), (None, role), (None, None)):
+            profile = self.rules.get(key)
+            if profile is not None:
+                return profile
+        return self.profiles["default"]
+
+    def describe(self) -> List[str]:
+        lines = [f"{m or '*'}.{r or '*'} -> {p.name}" for (m, r), p in self.rules.items()]
+        return sorted(lines) or ["*.* -> default"]
+
+
+def encode_with_profile(data: bytes, profile: ImageProfile) -> Tuple[str, Tuple[int, int]]:
+    """Preprocess the bytes of one source image according to `profile`; returns (base64 payload, its pixel size)."""
+    with Image.open(io.BytesIO(data)) as img:
+        if (
+            profile.passthrough
+            and img.format in ("JPEG", "PNG", "WEBP")
+            and max(img.size) <= profile.max_size
+        ):
+            return base64.b64encode(data).decode("utf-8"), img.size
+        if profile.draft and img.format == "JPEG":
+            # decode at the smallest 1/2, 1/4, 1/8 scale still >= max_size
+            img.draft("RGB", (profile.max_size, profile.max_size))
+        img = img.convert("RGB")
+        img.thumbnail((profile.max_size, profile.max_size))
+
+        buffer = io.BytesIO()
+        img.save(buffer, format=profile.format, quality=profile.quality)
+        return base64.b64encode(buffer.getvalue()).decode("utf-8"), img.size
+
+
+def image_mime(img_b64: str) -> str:
+    # base64 of the PNG / RIFF magic bytes; everything else is sent as JPEG as before
+    if img_b64.startswith("iVBORw0KGgo"):
+        return "image/png"
+    if img_b64.startswith("UklGR"):
+        return "image/webp"
+    return "image/jpeg"
+
+
+def estimate_image_tokens(width: int, height: int, detail: Optional[str]) -> int:
+    """Image input tokens of GPT-4o-class models: 85 at detail=low, else 85 + 170 per 512px tile."""
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class ProfileStats:
+    """
+    Images, payload bytes and estimated image tokens placed into judge messages, per profile.
+    Pixel sizes come from where a payload is produced (note_size()), so building a message
+    never decodes an image; a payload of unknown size counts as max_size x max_size.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries: Dict[str, List[int]] = {}  # name -> [images, payload bytes, tokens]
+        self._sizes: Dict[int, Tuple[int, int]] = {}
+
+    def note_size(self, img_b64: str, size: Tuple[int, int]) -> None:
+        with self._lock:
+            if len(self._sizes) > 100000:
+                self._sizes.clear()
+            self._sizes[hash(img_b64)] = size
+
+    def record(self, profile: ImageProfile, img_b64: str) -> int:
+        """Count one image sent with `profile`; returns its estimated tokens."""
+        size = self._sizes.get(hash(img_b64)) or (profile.max_size, profile.max_size)
+        tokens = estimate_image_tokens(size[0], size[1], profile.detail)
+        with self._lock:
+            e = self.entries.setdefault(profile.name, [0, 0, 0])
+            e[0] += 1
+            e[1] += len(img_b64)
+            e[2] += tokens
+        return tokens
+
+    def report_lines(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.entries.items())
+        lines = []
+        for name, (images, nbytes, tokens) in items:
+            lines.append(
+                f"{name:<12} images={images:<7} payload={nbytes / 1e6:.1f}MB "
+                f"({nbytes / max(images, 1) / 1e3:.1f}KB/image) est_tokens={tokens} "
+                f"({tokens / max(images, 1):.0f}/image)"
+            )
+        return lines
+
@@ -0,0 +1,155 @@
+import os
+import json
+import mmap
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .image_profiles import ImageProfile, encode_with_profile
+
+STORE_PACK = "images.pack"
+STORE_INDEX = "images.index.json"
+STORE_VERSION = 3
+
+
+def store_key(rel_path: str, params: Tuple) -> str:
+    return rel_path.replace(os.sep, "/") + "|" + ",".join(str(p) for p in params)
+
+
+def source_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """(size, mtime in ns) of a source image, None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def encode_file(path: str, profile: ImageProfile) -> Tuple[str, Tuple[int, int], Tuple[int, int]]:
+    """
+    Read and preprocess one image into (payload, pixel size, source stamp); runs in the
+    worker processes of prepare_images.py. The stamp is taken before reading, so a file
+    changed meanwhile looks stale to the reader.
+    """
+    stamp = source_stamp(path)
+    with open(path, "rb") as f:
+        payload, size = encode_with_profile(f.read(), profile)
+    return payload, size, stamp
+
+
+class PackedImageStoreWriter:
+    """
+    Appends base64 judge payloads to `store_dir`/images.pack and writes the index
+    images.index.json on close(), one [offset, length, width, height, source size, source
+    mtime_ns] entry per payload. Keys are the dataset-relative image path plus the cache
+    parameters of the image profile.
+    """
+
+    def __init__(self, store_dir: str):
+        os.makedirs(store_dir, exist_ok=True)
+        self.store_dir = store_dir
+        self.entries: Dict[str, List[int]] = {}
+        self._tmp_pack = os.path.join(store_dir, STORE_PACK + ".tmp")
+        self._f = open(self._tmp_pack, "wb")
+        self._offset = 0
+
+    def add(self, rel_path: str, params: Tuple, payload: str, size: Tuple[int, int], stamp: Tuple[int, int]) -> None:
+        data = payload.encode("ascii")
+        self._f.write(data)
+        self.entries[store_key(rel_path, params)] = [self._offset, len(data), size[0], size[1], stamp[0], stamp[1]]
+        self._offset += len(data)
+
+    def close(self) -> str:
+        """Publish the pack and its index; returns the index path."""
+        self._f.close()
+        os.replace(self._tmp_pack, os.path.join(self.store_dir, STORE_PACK))
+        index_path = os.path.join(self.store_dir, STORE_INDEX)
+        tmp_index = index_path + ".tmp"
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"version": STORE_VERSION, "bytes": self._offset, "entries": self.entries}, f)
+        os.replace(tmp_index, index_path)
+        return index_path
+
+
+class PackedImageStore:
+    """
+    Read-only view of a store written by prepare_images.py. The pack is memory-mapped
+    once, so a lookup is a dict probe plus one copy of the payload out of the mapping
+    into the str the judge message is built from: no per-image open, read or decode on
+    the (network) filesystem holding the dataset.
+
+    Each source image is stat()ed once per process, on its first lookup; if its size or
+    mtime differ from those recorded by prepare_images.py (the image was regenerated), its
+    payloads are stale and the image is read from the dataset instead.
+    """
+
+    def __init__(self, store_dir: str, dataset_root: str):
+        self.store_dir = store_dir
+        self.dataset_root = os.path.abspath(dataset_root)
+        with open(os.path.join(store_dir, STORE_INDEX), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported image store version {index.get('version')} in {store_dir}")
+        self.entries: Dict[str, List[int]] = index.get("entries", {})
+        self._file = open(os.path.join(store_dir, STORE_PACK), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._lock = threading.Lock()
+        self._fresh: Dict[str, bool] = {}  # rel_path -> source unchanged since the store was prepared
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _is_fresh(self, rel_path: str, entry: List[int]) -> bool:
+        fresh = self._fresh.get(rel_path)
+        if fresh is None:
+            stamp = source_stamp(os.path.join(self.dataset_root, rel_path))
+            fresh = stamp is not None and list(stamp) == entry[4:6]
+            with self._lock:
+                if not fresh and self.stale == 0:
+                    logging.warning(
+                        f"Image store {self.store_dir} is older than {rel_path}; changed images are read from the "
+                        f"dataset, rerun prepare_images.py to refresh the store."
+                    )
+                self._fresh[rel_path] = fresh
+        return fresh
+
+    def get(self, path: str, params: Tuple) -> Optional[Tuple[str, Tuple[int, int]]]:
+        """(payload, pixel size) of an image of the dataset, or None if it is not in the store."""
+        rel_path = os.path.relpath(os.path.abspath(path), self.dataset_root)
+        if rel_path.startswith(os.pardir) or self._mm is None:
+            # e.g. edited images, which live outside the dataset
+            return None
+        entry = self.entries.get(store_key(rel_path, params))
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        if not self._is_fresh(rel_path, entry):
+            with self._lock:
+                self.stale += 1
+            return None
+        offset, length, width, height = entry[:4]
+        with self._lock:
+            self.hits += 1
+        return str(memoryview(self._mm)[offset:offset + length], "ascii"), (width, height)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "stale": self.stale}
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+def open_image_store(store_dir: Optional[str], dataset_root: str) -> Optional[PackedImageStore]:
+    """Open the store in `store_dir`, or None (with a warning) if there is none or it is unreadable."""
+    if not store_dir or not os.path.exists(os.path.join(store_dir, STORE_INDEX)):
+        return None
+    try:
+        return PackedImageStore(store_dir, dataset_root)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Cannot open image store {store_dir}, images are read from the dataset: {e}")
+        return None
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+# idx -> lang -> metric -> score
+JournalScores = Dict[str, Dict[str, Dict[str, int]]]
+
+
+class ScoreJournal:
+    """
+    Append-only JSONL journal of finished judge results of one subset, one line per
+    (idx, lang, metric). Lines are flushed on every append and fsync'ed in batches
+    (every `fsync_every` records or `fsync_interval` seconds), so a crash loses at most
+    one batch of paid-for judge calls. replay() reads it back on resume; a torn last
+    line from a crash is ignored.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 50, fsync_interval: float = 2.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._f = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def replay(path: str) -> JournalScores:
+        scores: JournalScores = {}
+        if not os.path.exists(path):
+            return scores
+        bad = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                    score = int(rec["score"])
+                    scores.setdefault(str(rec["idx"]), {}).setdefault(rec["lang"], {})[rec["metric"]] = score
+                except Exception:
+                    bad += 1
+        if bad:
+            logging.warning(f"Ignored {bad} unreadable line(s) in journal {path}")
+        return scores
+
+    def append(self, idx: str, lang: str, metric: str, score: Optional[int]) -> None:
+        if score is None:
+            # not a result (endpoint unavailable), the task will simply run again on resume
+            return
+        line = json.dumps({"idx": idx, "lang": lang, "metric": metric, "score": score}, ensure_ascii=False)
+        with self._lock:
+            if self._f is None:
+                self._f = open(self.path, "a", encoding="utf-8")
+            self._f.write(line + "\n")
+            self._f.flush()
+            self._unsynced += 1
+            if (
+                self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync_locked()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync_locked()
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+    def remove(self) -> None:
+        """Delete the journal once its content has been written to the score CSV."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _sync_locked(self) -> None:
+        if self._f is not None and self._unsynced:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
@@ -0,0 +1,186 @@
+import os
+import csv
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from .scheduler import LANGS
+
+# Extensions of result images, in the order find_edited_image() tries them
+RESULT_IMAGE_EXTS = [".png", ".jpg", ".jpeg", ".webp"]
+
+PREFLIGHT_FIELDS = [
+    "subset", "lang", "expected", "found", "missing", "corrupt", "unexpected",
+    "missing_idx", "corrupt_idx", "unexpected_files",
+]
+
+
+class ResultManifest:
+    """
+    idx -> result image path of every <subset>/<lang> folder of one model, built with a
+    single scandir per folder so that looking up an edited image costs no filesystem call.
+    """
+
+    def __init__(self, result_img_root: str):
+        self.root = result_img_root
+        self.images: Dict[Tuple[str, str], Dict[str, str]] = {}
+        # files in a result folder that can never be picked as a result image
+        self.ignored: Dict[Tuple[str, str], List[str]] = {}
+
+    def scan_subset(self, subset: str) -> None:
+        for lang in LANGS:
+            folder = os.path.join(self.root, subset, lang)
+            by_idx: Dict[str, str] = {}
+            ignored: List[str] = []
+            try:
+                entries = sorted(os.scandir(folder), key=lambda e: e.name)
+            except FileNotFoundError:
+                entries = []
+            for entry in entries:
+                if not entry.is_file():
+                    ignored.append(entry.name + "/")
+                    continue
+                stem, ext = os.path.splitext(entry.name)
+                if ext not in RESULT_IMAGE_EXTS:
+                    ignored.append(entry.name)
+                    continue
+                current = by_idx.get(stem)
+                if current is None or RESULT_IMAGE_EXTS.index(ext) < RESULT_IMAGE_EXTS.index(os.path.splitext(current)[1]):
+                    if current is not None:
+                        ignored.append(os.path.basename(current))
+                    by_idx[stem] = entry.path
+                else:
+                    ignored.append(entry.name)
+            self.images[(subset, lang)] = by_idx
+            self.ignored[(subset, lang)] = ignored
+
+    def covers(self, result_img_root: Optional[str], subset: str) -> bool:
+        return result_img_root == self.root and (subset, LANGS[0]) in self.images
+
+    def lookup(self, subset: str, lang: str, idx: str) -> Optional[str]:
+        return self.images.get((subset, lang), {}).get(idx)
+
+
+def verify_image(path: str) -> Optional[str]:
+    """None if `path` has a readable image header, else the reason it is unusable."""
+    try:
+        if os.path.getsize(path) == 0:
+            return "empty file"
+        with Image.open(path) as img:
+            width, height = img.size
+        if width <= 0 or height <= 0:
+            return "zero-sized image"
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def same_content(path_a: str, path_b: str) -> bool:
+    """Whether two files are byte-identical; files of different sizes are never read."""
+    try:
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+        return os.path.samefile(path_a, path_b) or file_digest(path_a) == file_digest(path_b)
+    except OSError:
+        return False
+
+
+@dataclass
+class SubsetPreflight:
+    subset: str
+    lang: str
+    expected: int = 0
+    found: int = 0
+    missing: List[str] = field(default_factory=list)
+    corrupt: Dict[str, str] = field(default_factory=dict)  # idx -> reason
+    unexpected: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.corrupt
+
+
+def run_preflight(
+    manifest: ResultManifest,
+    expected_idx: Dict[str, List[str]],
+    workers: int = 16,
+) -> List[SubsetPreflight]:
+    """
+    Compare the manifest with the idx each subset expects and check the header of every
+    expected image in parallel: missing, corrupt and unexpected files per subset and language.
+    """
+    results: List[SubsetPreflight] = []
+    to_verify: List[Tuple[SubsetPreflight, str, str]] = []
+    for subset, idx_list in expected_idx.items():
+        wanted = set(idx_list)
+        for lang in LANGS:
+            res = SubsetPreflight(subset, lang, expected=len(idx_list))
+            images = manifest.images.get((subset, lang), {})
+            for idx in idx_list:
+                path = images.get(idx)
+                if path is None:
+                    res.missing.append(idx)
+                else:
+                    to_verify.append((res, idx, path))
+            res.unexpected = sorted(os.path.basename(p) for i, p in images.items() if i not in wanted)
+            res.unexpected += manifest.ignored.get((subset, lang), [])
+            results.append(res)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for (res, idx, _path), error in zip(to_verify, pool.map(lambda item: verify_image(item[2]), to_verify)):
+            if error is None:
+                res.found += 1
+            else:
+                res.corrupt[idx] = error
+    return results
+
+
+def _sample(items: List[str], limit: int = 20) -> str:
+    return " ".join(items[:limit]) + (f" ... (+{len(items) - limit})" if len(items) > limit else "")
+
+
+def preflight_lines(results: List[SubsetPreflight]) -> List[str]:
+    lines = []
+    for r in results:
+        line = (
+            f"[{r.subset}] {r.lang.upper()}: {r.found}/{r.expected} ok, "
+            f"{len(r.missing)} missing, {len(r.corrupt)} corrupt, {len(r.unexpected)} unexpected"
+        )
+        if r.missing:
+            line += f"; missing idx: {_sample(r.missing)}"
+        if r.corrupt:
+            line += f"; corrupt: {_sample([f'{i} ({e})' for i, e in r.corrupt.items()], 5)}"
+        lines.append(line)
+    return lines
+
+
+def write_preflight_report(results: List[SubsetPreflight], path: str) -> None:
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PREFLIGHT_FIELDS)
+        writer.writeheader()
+        for r in results:
+            writer.writerow({
+                "subset": r.subset,
+                "lang": r.lang,
+                "expected": r.expected,
+                "found": r.found,
+                "missing": len(r.missing),
+                "corrupt": len(r.corrupt),
+                "unexpected": len(r.unexpected),
+                "missing_idx": " ".join(r.missing),
+                "corrupt_idx": " ".join(r.corrupt),
+                "unexpected_files": " ".join(r.unexpected),
+            })
+    logging.info(f"Preflight report written to {path}")
@@ -0,0 +1,258 @@
+import os
+import csv
+import glob
+import logging
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from .evaluation_utils import (
+    build_message_for_metric,
+    build_combined_message,
+    IMAGE_PROFILES,
+    MAX_COMPLETION_TOKENS,
+    USAGE,
+)
+from .image_profiles import ImageProfile, estimate_image_tokens
+from .rate_limiter import estimate_text_tokens, estimate_request_tokens
+from .scheduler import JudgeTask
+from .usage import COMBINED_METRIC
+
+# completion tokens of one metric's {"score": .., "reason": ".."} answer when no cost report has any
+DEFAULT_COMPLETION_TOKENS = 150
+
+PLAN_FIELDS = [
+    "subset", "lang", "metric", "calls", "text_tokens", "image_tokens",
+    "completion_tokens", "cost_usd",
+]
+
+# (subset, metric, lang)
+PlanKey = Tuple[str, str, str]
+
+
+@dataclass
+class PlanTotals:
+    calls: int = 0
+    text_tokens: int = 0
+    image_tokens: int = 0
+    completion_tokens: int = 0
+    # what the rate limiter reserves against --tpm: prompt estimate + max_tokens per call
+    limiter_tokens: int = 0
+    cost: float = 0.0
+
+    def merge(self, other: "PlanTotals") -> None:
+        self.calls += other.calls
+        self.text_tokens += other.text_tokens
+        self.image_tokens += other.image_tokens
+        self.completion_tokens += other.completion_tokens
+        self.limiter_tokens += other.limiter_tokens
+        self.cost += other.cost
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.text_tokens + self.image_tokens
+
+
+def read_image_sizes(paths: Iterable[str], workers: int = 16) -> Dict[str, Optional[Tuple[int, int]]]:
+    """(width, height) from the header of every image, None if it cannot be read."""
+    def size_of(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            with Image.open(path) as img:
+                return img.size
+        except Exception:
+            return None
+
+    unique = list(dict.fromkeys(p for p in paths if p))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return dict(zip(unique, pool.map(size_of, unique)))
+
+
+def sent_size(size: Optional[Tuple[int, int]], profile: ImageProfile) -> Tuple[int, int]:
+    """Size of the image after preprocessing with `profile` (thumbnail: longest side <= max_size, never upscaled)."""
+    if size is None:
+        return profile.max_size, profile.max_size
+    width, height = size
+    scale = min(1.0, profile.max_size / max(width, height, 1))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def completion_history(report_paths: Iterable[str], judge_model: str) -> Dict[str, float]:
+    """Mean completion tokens per request of every metric, from the cost reports of earlier runs of `judge_model`."""
+    totals: Dict[str, List[int]] = {}
+    for path in report_paths:
+        try:
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                for row in csv.DictReader(f):
+                    if row.get("subset") == "TOTAL" or row.get("judge_model") != judge_model:
+                        continue
+                    try:
+                        t = totals.setdefault(row["metric"], [0, 0])
+                        t[0] += int(row["completion_tokens"])
+                        t[1] += int(row["requests"])
+                    except (KeyError, ValueError):
+                        continue
+        except OSError:
+            continue
+    return {metric: tokens / requests for metric, (tokens, requests) in totals.items() if requests}
+
+
+def find_cost_reports(score_output_root: str) -> List[str]:
+    """cost_report.csv of every model evaluated under `score_output_root`."""
+    return sorted(glob.glob(os.path.join(score_output_root, "*", "cost_report.csv")))
+
+
+def _message_tokens(
+    message: dict,
+    images: Dict[str, Tuple[str, ImageProfile]],
+    sizes: Dict[str, Optional[Tuple[int, int]]],
+) -> Tuple[int, int]:
+    """(text, image) tokens of a message built with placeholder images (see estimate_plan())."""
+    text_tokens, image_tokens = 0, 0
+    for part in message["content"]:
+        if part.get("type") == "text":
+            text_tokens += estimate_text_tokens(part.get("text", ""))
+        elif part.get("type") == "image_url":
+            placeholder = part["image_url"]["url"].split("base64,", 1)[-1]
+            path, profile = images[placeholder]
+            width, height = sent_size(sizes.get(path), profile)
+            image_tokens += estimate_image_tokens(width, height, profile.detail)
+    return text_tokens, image_tokens
+
+
+def estimate_plan(
+    tasks: List[JudgeTask],
+    inputs_by_row: Dict[Tuple[str, str], dict],
+    judge_model: str,
+    completion_tokens: Optional[Dict[str, float]] = None,
+    discount: float = 1.0,
+    workers: int = 16,
+) -> Dict[PlanKey, PlanTotals]:
+    """
+    Estimate every planned judge task from the message it would send: text tokens of the
+    rubric, instruction and hint; image tokens from the real image sizes after the
+    image profile of each image; completion tokens from earlier runs (`completion_tokens`
+    per metric). No image is encoded and no request is sent.
+    """
+    completion_tokens = completion_tokens or {}
+    paths: List[str] = []
+    for inputs in inputs_by_row.values():
+        paths.extend(inputs["input_paths"])
+        paths.extend(inputs["ref_paths"] or [])
+        paths.extend(p for p in inputs["edited"].values() if p)
+    sizes = read_image_sizes(paths, workers)
+
+    plan: Dict[PlanKey, PlanTotals] = {}
+    for task in tasks:
+        inputs = inputs_by_row[(task.subset, task.idx)]
+        metric = None if task.metrics else task.metric
+        # the builders get placeholders instead of base64 payloads; each maps back to (path, profile)
+        images: Dict[str, Tuple[str, ImageProfile]] = {}
+
+        def placeholders(role: str, role_paths: List[str]) -> List[str]:
+            keys = []
+            for i, p in enumerate(role_paths):
+                key = f"{role}{i}"
+                images[key] = (p, IMAGE_PROFILES.resolve(metric, role))
+                keys.append(key)
+            return keys
+
+        input_keys = placeholders("input", inputs["input_paths"])
+        edited_key = placeholders("edited", [inputs["edited"][task.lang]])[0]
+        ref_keys = placeholders("ref", inputs["ref_paths"] or [])
+        if task.metrics:
+            message = build_combined_message(
+                list(task.metrics), inputs["instr"], input_keys, inputs["is_multi"],
+                edited_key, inputs["hint"], ref_keys,
+            )
+            completion = sum(completion_tokens.get(m, DEFAULT_COMPLETION_TOKENS) for m in task.metrics)
+        else:
+            message = build_message_for_metric(
+                task.metric, inputs["instr"], input_keys, inputs["is_multi"],
+                edited_key, inputs["hint"], ref_keys,
+            )
+            completion = completion_tokens.get(task.metric, DEFAULT_COMPLETION_TOKENS)
+
+        text_tokens, image_tokens = _message_tokens(message, images, sizes)
+        completion = int(round(completion))
+        totals = plan.setdefault((task.subset, COMBINED_METRIC if task.metrics else task.metric, task.lang), PlanTotals())
+        totals.calls += 1
+        totals.text_tokens += text_tokens
+        totals.image_tokens += image_tokens
+        totals.completion_tokens += completion
+        totals.limiter_tokens += estimate_request_tokens(message, max_tokens=MAX_COMPLETION_TOKENS)
+        totals.cost += USAGE.cost_of(judge_model, text_tokens + image_tokens, completion, 0) * discount
+    return plan
+
+
+def plan_total(plan: Dict[PlanKey, PlanTotals]) -> PlanTotals:
+    total = PlanTotals()
+    for t in plan.values():
+        total.merge(t)
+    return total
+
+
+def project_wall_time(
+    total: PlanTotals,
+    concurrency: int,
+    latency: float,
+    rpm: Optional[float] = None,
+    tpm: Optional[float] = None,
+) -> Tuple[float, str]:
+    """Projected seconds of an online run of `total` and what bounds it: concurrency, --rpm or --tpm."""
+    bounds = [(total.calls * latency / max(1, concurrency), f"concurrency ({concurrency} x {latency:g}s per call)")]
+    if rpm:
+        bounds.append((total.calls / rpm * 60.0, f"--rpm {rpm:g}"))
+    if tpm:
+        bounds.append((total.limiter_tokens / tpm * 60.0, f"--tpm {tpm:g}"))
+    return max(bounds, key=lambda b: b[0])
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def plan_lines(plan: Dict[PlanKey, PlanTotals]) -> List[str]:
+    """One line per (subset, metric) with CN / EN calls, then totals per metric and overall."""
+    by_subset_metric: Dict[Tuple[str, str], Dict[str, PlanTotals]] = {}
+    by_metric: Dict[str, PlanTotals] = {}
+    for (subset, metric, lang), t in sorted(plan.items()):
+        by_subset_metric.setdefault((subset, metric), {})[lang] = t
+        by_metric.setdefault(metric, PlanTotals()).merge(t)
+
+    lines = []
+    for (subset, metric), by_lang in by_subset_metric.items():
+        merged = PlanTotals()
+        for t in by_lang.values():
+            merged.merge(t)
+        calls = " ".join(f"{lang}={t.calls}" for lang, t in sorted(by_lang.items()))
+        lines.append(
+            f"[{subset}] {metric:<24} calls {calls:<14} prompt={merged.prompt_tokens:<10} "
+            f"(images {merged.image_tokens}) completion={merged.completion_tokens:<8} cost=${merged.cost:.4f}"
+        )
+    for metric, t in sorted(by_metric.items()) + [("total", plan_total(plan))]:
+        lines.append(
+            f"{metric:<24} calls={t.calls:<7} prompt={t.prompt_tokens:<10} (text {t.text_tokens}, "
+            f"images {t.image_tokens}) completion={t.completion_tokens:<8} cost=${t.cost:.4f}"
+        )
+    return lines
+
+
+def write_plan(plan: Dict[PlanKey, PlanTotals], path: str) -> None:
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=PLAN_FIELDS)
+        writer.writeheader()
+        for (subset, metric, lang), t in sorted(plan.items()):
+            writer.writerow({
+                "subset": subset,
+                "lang": lang,
+                "metric": metric,
+                "calls": t.calls,
+                "text_tokens": t.text_tokens,
+                "image_tokens": t.image_tokens,
+                "completion_tokens": t.completion_tokens,
+                "cost_usd": f"{t.cost:.6f}",
+            })
+    logging.info(f"Dry-run plan written to {path}")
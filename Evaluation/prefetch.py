@@ -0,0 +1,77 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Set, Tuple
+
+
+class ImagePrefetcher:
+    """
+    Encodes the images of upcoming rows ahead of the judge workers.
+
+    A producer thread walks the rows in the order the workers consume them and hands
+    their image jobs to `encode` (which stores the payload in the shared image cache), at
+    most `window` rows ahead: a row leaves the window once row_started() is called for
+    it. Rows the workers reach before the producer does are skipped.
+    """
+
+    def __init__(self, encode: Callable[[Any], Optional[str]], window: int = 32, threads: int = 4):
+        self.encode = encode
+        self.window = max(1, window)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="prefetch")
+        self._cond = threading.Condition()
+        self._started: Set[Hashable] = set()
+        self._ahead: Set[Hashable] = set()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self.prefetched = 0
+        self.skipped = 0
+
+    def start(self, rows: Sequence[Tuple[Hashable, List[Any]]]) -> "ImagePrefetcher":
+        """Prefetch `rows`, a list of (row key, image jobs), in consumption order."""
+        self._thread = threading.Thread(target=self._produce, args=(list(rows),), name="prefetch-producer", daemon=True)
+        self._thread.start()
+        return self
+
+    def row_started(self, key: Hashable) -> None:
+        with self._cond:
+            self._started.add(key)
+            if key in self._ahead:
+                self._ahead.discard(key)
+                self._cond.notify()
+
+    def __enter__(self) -> "ImagePrefetcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        logging.info(f"Image prefetch: {self.prefetched} rows prefetched, {self.skipped} reached by the workers first")
+
+    def _produce(self, rows: List[Tuple[Hashable, List[Any]]]) -> None:
+        for key, jobs in rows:
+            with self._cond:
+                while len(self._ahead) >= self.window and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                if key in self._started:
+                    self.skipped += 1
+                    continue
+                self._ahead.add(key)
+                self.prefetched += 1
+            for job in jobs:
+                self._pool.submit(self._encode_quietly, job)
+
+    def _encode_quietly(self, job: Any) -> None:
+        try:
+            self.encode(job)
+        except Exception as e:
+            # the worker encoding the same image reports the error
+            logging.debug(f"Prefetch of {job} failed: {e}")
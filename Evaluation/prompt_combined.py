@@ -0,0 +1,23 @@
+prompt_combined_header = """
+You are a professional digital artist and image evaluation specialist.
+
+You will evaluate ONE image edit on several independent criteria. Each criterion below comes with its full rubric. Apply every rubric on its own, exactly as if it were the only criterion you were asked about; your judgement on one criterion must not influence another.
+
+## Notes:
+- The rubrics name the images in their own way (e.g. "Image A" / "Image B", "original" / "edited", "Image #1"). They always refer to the input image(s) and the edited image provided after the editing instruction.
+- **visual_quality** judges the edited image alone; ignore the input images for it.
+- The hint and reference images (if provided) only apply to **instruction_following** and **knowledge_fidelity**.
+"""
+
+prompt_combined_criterion = """
+
+==================== Criterion: {metric} ====================
+{rubric}"""
+
+prompt_combined_output = """
+
+==================== Combined Output Format ====================
+Ignore the "Output Format" sections of the individual rubrics above. First explain your reasoning for each criterion, then output exactly one JSON object with one entry per criterion, each holding an integer score from 1 to 10 and a short reason:
+{example}
+Every criterion listed above ({metrics}) must be present in the JSON object.
+"""
@@ -0,0 +1,17 @@
+prompt_repair = """
+Below is the answer an image editing judge gave to an evaluation request. It explains the judgement, but its final score could not be read because the required JSON output is missing or malformed.
+
+Do not evaluate anything yourself. Read the answer and output only the final result it arrives at, in the format below.
+
+==================== Judge answer ====================
+{answer}
+
+==================== Output Format ====================
+{output}
+"""
+
+prompt_repair_single = """Output exactly one JSON object and nothing else, holding the integer score from 1 to 10 stated or implied by the answer and a one-sentence reason taken from it:
+{"score": 8, "reason": "..."}"""
+
+prompt_repair_combined = """Output exactly one JSON object and nothing else, with one entry per criterion ({metrics}), each holding the integer score from 1 to 10 stated or implied by the answer and a one-sentence reason taken from it:
+{example}"""
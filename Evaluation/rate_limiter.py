@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, fall back to in-process limiting
+    fcntl = None
+
+# Rough token costs used to pace requests before their real usage is known.
+DEFAULT_IMAGE_TOKENS = 765  # a 512px image at detail=high: 85 base + 4 * 170 tiles (upper bound)
+LOW_DETAIL_IMAGE_TOKENS = 85
+_CJK_RE = re.compile(r"[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_text_tokens(text: str) -> int:
+    # ~4 chars per token for latin text, ~1 token per CJK character
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def estimate_request_tokens(
+    message: dict,
+    max_tokens: int = 1000,
+    image_tokens: int = DEFAULT_IMAGE_TOKENS,
+) -> int:
+    """
+    Estimate the TPM cost of one chat request: prompt text + images + the completion
+    budget (providers reserve max_tokens against TPM when the request is accepted).
+    """
+    total = max_tokens
+    content = message.get("content")
+    if isinstance(content, str):
+        return total + estimate_text_tokens(content)
+    for part in content or []:
+        if part.get("type") == "text":
+            total += estimate_text_tokens(part.get("text", ""))
+        elif part.get("type") == "image_url":
+            low = (part.get("image_url") or {}).get("detail") == "low"
+            total += LOW_DETAIL_IMAGE_TOKENS if low else image_tokens
+    return total
+
+
+def default_state_file(api_key: Optional[str], base_url: Optional[str]) -> str:
+    """Per-(api_key, base_url) state file, so every local process using the same key shares one budget."""
+    digest = hashlib.sha1(f"{api_key}|{base_url}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"wiseedit_ratelimit_{digest}.json")
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter with a requests-per-minute and a tokens-per-minute budget.
+
+    Callers reserve capacity before each request and sleep for the returned delay.
+    Reservations may drive a bucket negative, which queues later callers behind
+    earlier ones instead of letting all of them poll. A Retry-After from the server
+    blocks everybody until it has passed.
+
+    If `state_file` is given, the bucket levels live in that file under an flock, so
+    several run_eval.py processes sharing one API key also share one budget. All of them
+    should be started with the same rpm / tpm. acquire_async() then touches the file off the
+    event loop (async callers run penalize() in a worker thread as well), and settle() folds
+    its corrections into the next reservation instead of locking the file once more per response.
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        state_file: Optional[str] = None,
+        burst_seconds: float = 10.0,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        # allow bursts of a few seconds worth of budget, not a whole minute at once
+        self.req_capacity = max(1.0, rpm * burst_seconds / 60.0) if rpm else None
+        self.tok_capacity = max(1.0, tpm * burst_seconds / 60.0) if tpm else None
+
+        if state_file and fcntl is None:
+            logging.warning("fcntl is unavailable, rate limiting is per-process only.")
+            state_file = None
+        self.state_file = state_file
+        self._lock = threading.Lock()
+        self._state: Dict[str, float] = {}
+        self._unsettled_tokens = 0.0  # settle() corrections not yet written to the state file
+
+        self.total_wait = 0.0
+        self.retry_after_events = 0
+
+    # ---- shared state --------------------------------------------------
+
+    def _update(self, fn: Callable[[Dict[str, float]], float]) -> float:
+        with self._lock:
+            if not self.state_file:
+                return fn(self._state)
+            with open(self.state_file, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    try:
+                        state = json.loads(raw) if raw.strip() else {}
+                    except ValueError:
+                        state = {}
+                    result = fn(state)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            return result
+
+    def _refill(self, state: Dict[str, float], now: float) -> None:
+        last = state.get("ts", now)
+        elapsed = max(0.0, now - last)
+        if self.rpm:
+            level = state.get("req", self.req_capacity)
+            state["req"] = min(self.req_capacity, level + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            level = state.get("tok", self.tok_capacity)
+            state["tok"] = min(self.tok_capacity, level + elapsed * self.tpm / 60.0)
+        state["ts"] = now
+
+    # ---- API -------------------------------------------------------------
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request of `tokens` and return how many seconds to wait before sending it."""
+        if self.tok_capacity:
+            tokens = min(tokens, self.tok_capacity)
+
+        def fn(state: Dict[str, float]) -> float:
+            now = time.time()
+            self._refill(state, now)
+            if self.tpm and self._unsettled_tokens:
+                state["tok"] = min(self.tok_capacity, state["tok"] + self._unsettled_tokens)
+                self._unsettled_tokens = 0.0
+            wait = max(0.0, state.get("blocked_until", 0.0) - now)
+            if self.rpm:
+                state["req"] -= 1
+                if state["req"] < 0:
+                    wait = max(wait, -state["req"] * 60.0 / self.rpm)
+            if self.tpm:
+                state["tok"] -= tokens
+                if state["tok"] < 0:
+                    wait = max(wait, -state["tok"] * 60.0 / self.tpm)
+            return wait
+
+        return self._update(fn)
+
+    def acquire(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            self.total_wait += wait
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: int) -> float:
+        # flock and file I/O of a shared state file would stall every coroutine of the loop
+        wait = await asyncio.to_thread(self.reserve, tokens) if self.state_file else self.reserve(tokens)
+        if wait > 0:
+            self.total_wait += wait
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Give back (or charge) the difference between the estimate and the real usage of a request."""
+        if not self.tpm or actual_tokens is None:
+            return
+        delta = estimated_tokens - actual_tokens
+        if self.state_file:
+            with self._lock:
+                self._unsettled_tokens += delta
+            return
+
+        def fn(state: Dict[str, float]) -> float:
+            self._refill(state, time.time())
+            state["tok"] = min(self.tok_capacity, state["tok"] + delta)
+            return 0.0
+
+        self._update(fn)
+
+    def penalize(self, retry_after: float) -> None:
+        """Block all (local and cooperating) callers for `retry_after` seconds after a 429."""
+        self.retry_after_events += 1
+
+        def fn(state: Dict[str, float]) -> float:
+            now = time.time()
+            self._refill(state, now)
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), now + retry_after)
+            # whatever budget we thought we had was wrong, start from empty buckets
+            if self.rpm:
+                state["req"] = min(state["req"], 0.0)
+            if self.tpm:
+                state["tok"] = min(state["tok"], 0.0)
+            return 0.0
+
+        self._update(fn)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After (or the OpenAI-style retry-after-ms) from an API error's response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+
+def request_fingerprint(model_name: str, message: dict, params: Dict, endpoint: str = "") -> str:
+    """
+    Hash of everything that determines a judge answer: the endpoint (base URL) and judge
+    model, the full prompt (metric rubric, instruction, hint, labels), the content hashes
+    of all images and the decoding parameters. Image data URLs are hashed individually
+    first, so the key does not depend on how large the base64 payloads are. The endpoint
+    is part of the key because two endpoints serving the same model name (a proxy and the
+    official API, two local deployments) may well answer differently.
+    """
+    parts = []
+    content = message.get("content")
+    if isinstance(content, str):
+        parts.append(["text", content])
+    else:
+        for part in content or []:
+            if part.get("type") == "image_url":
+                url = part["image_url"]["url"]
+                detail = part["image_url"].get("detail")
+                parts.append(["image", hashlib.sha1(url.encode("utf-8")).hexdigest(), detail])
+            else:
+                parts.append([part.get("type"), part.get("text")])
+    blob = json.dumps(
+        {"endpoint": endpoint, "model": model_name, "role": message.get("role"), "parts": parts, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk (SQLite) cache of parsed judge answers keyed by request_fingerprint().
+
+    Stores score, reason and the raw judge text. The total stored size is capped at
+    `max_bytes`; the least recently used entries are evicted first. WAL mode lets several
+    run_eval.py processes share one cache file. With `refresh=True` lookups always miss,
+    but new answers are still written (overwriting old ones).
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024, refresh: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " score INTEGER,"
+            " reason TEXT,"
+            " raw_text TEXT,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Tuple[Optional[int], Optional[str], Optional[str]]]:
+        """Return (score, reason, raw_text) or None. score is None for answers with several scores."""
+        if self.refresh:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT score, reason, raw_text FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0], row[1], row[2]
+
+    def put(self, key: str, score: Optional[int], reason: Optional[str], raw_text: Optional[str]) -> None:
+        size = len(key) + len((reason or "").encode("utf-8")) + len((raw_text or "").encode("utf-8")) + 64
+        now = time.time()
+        with self._lock:
+            try:
+                old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, score, reason, raw_text, size, created, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, score, reason, raw_text, size, now, now),
+                )
+                self._size += size - (old[0] if old else 0)
+                self.writes += 1
+                if self._size > self.max_bytes:
+                    self._evict_locked()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Failed to write judge response cache {self.path}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "bytes": self._size,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict_locked(self) -> None:
+        # evict down to 90% of the cap so we do not evict on every write
+        target = int(self.max_bytes * 0.9)
+        while self._size > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._size -= size
+                self.evictions += 1
+                if self._size <= target:
+                    break
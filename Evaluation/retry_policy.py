@@ -0,0 +1,182 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Optional
+
+import openai
+
+# Error classes of a failed judge attempt
+RATE_LIMIT = "rate_limit"   # 429
+SERVER = "server"           # 5xx
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+CLIENT = "client"           # other 4xx: this request is rejected (bad request, content policy, too large)
+AUTH = "auth"               # 401 / 403 / 404: wrong key, permission or model name, every request fails
+PARSE = "parse"             # the judge answered but no score could be extracted
+
+TRANSPORT_ERRORS = (SERVER, TIMEOUT, CONNECTION)
+
+
+class JudgeUnavailableError(RuntimeError):
+    """
+    Raised when a judge request could not be completed because of the endpoint
+    (transport / server / auth errors, or an open circuit breaker). Unlike parse
+    failures and rejected requests (CLIENT), these must not be recorded as score 0:
+    the score stays empty so that a later run resumes it.
+    """
+
+    def __init__(self, message: str, kind: str):
+        super().__init__(message)
+        self.kind = kind
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMIT
+    if isinstance(error, openai.APITimeoutError):
+        return TIMEOUT
+    if isinstance(error, openai.APIConnectionError):
+        return CONNECTION
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        if status == 429:
+            return RATE_LIMIT
+        if status >= 500 or status in (408, 409):
+            return SERVER
+        if status in (401, 403, 404):
+            return AUTH
+        return CLIENT
+    # anything unexpected (e.g. a malformed response object) is treated like a server hiccup
+    return SERVER
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, per error class."""
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0, parse_delay: float = 0.5):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.parse_delay = parse_delay
+
+    def is_retriable(self, kind: str) -> bool:
+        return kind not in (CLIENT, AUTH)
+
+    def delay(self, attempt: int, kind: str, retry_after: Optional[float] = None) -> float:
+        if kind == PARSE:
+            # the endpoint is healthy, just ask again
+            return self.parse_delay
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, backoff)
+        if kind == RATE_LIMIT:
+            if retry_after is not None:
+                return max(retry_after, delay)
+            # no Retry-After: back off harder than for transient server errors
+            return min(self.max_delay, backoff * 2) * random.uniform(0.5, 1.0)
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Pauses every worker when the endpoint is clearly down.
+
+    After `failure_threshold` consecutive transport failures (5xx, timeouts, connection
+    errors) the breaker opens for `cooldown` seconds, during which callers wait in
+    before_call(). Then a single probe request is let through (half-open): success closes
+    the breaker, failure re-opens it with a doubled cooldown. Once it has been open for
+    more than `give_up_after` seconds in a row, before_call() raises JudgeUnavailableError
+    so the run ends with resumable empty scores instead of hanging.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 10,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        give_up_after: float = 1800.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.give_up_after = give_up_after
+
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.trips = 0
+
+    def _check(self) -> float:
+        """Return 0 if the caller may send a request now, else how long to wait before asking again."""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.CLOSED or self.failure_threshold <= 0:
+                return 0.0
+            if self._opened_at is not None and now - self._opened_at > self.give_up_after:
+                raise JudgeUnavailableError(
+                    f"endpoint down for more than {self.give_up_after:.0f}s (circuit breaker open)", CONNECTION
+                )
+            if self.state == self.OPEN and now >= self._open_until:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return 0.0
+            return max(0.5, min(5.0, self._open_until - now))
+
+    def before_call(self) -> None:
+        while True:
+            wait = self._check()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def before_call_async(self) -> None:
+        while True:
+            wait = self._check()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("Circuit breaker closed, judge endpoint is responding again.")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._cooldown = self.base_cooldown
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self, kind: str) -> None:
+        if kind not in TRANSPORT_ERRORS:
+            # 429 / 4xx / parse failures mean the endpoint is up; a failed half-open probe
+            # of this kind must close the breaker too, or every other caller keeps waiting
+            self.record_success()
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN:
+                self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+            elif self._failures < self.failure_threshold or self.state == self.OPEN:
+                return
+            if self.failure_threshold <= 0:
+                return
+            self.state = self.OPEN
+            self._open_until = now + self._cooldown
+            self._probe_in_flight = False
+            if self._opened_at is None:
+                self._opened_at = now
+            self.trips += 1
+            logging.error(
+                f"Circuit breaker open after {self._failures} consecutive transport failures, "
+                f"pausing all judge requests for {self._cooldown:.0f}s."
+            )
@@ -0,0 +1,123 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+LANGS = ("cn", "en")
+
+
+@dataclass(frozen=True)
+class JudgeTask:
+    """
+    One judge request: a single metric of one language of one row of one subset. In
+    combined mode, `metrics` holds all metrics judged together and `metric` is their label.
+    `mirrors` are other languages of the row whose request is identical (byte-identical
+    edited image); the result is recorded for them as well.
+    """
+    subset: str
+    idx: str
+    lang: str
+    metric: str
+    metrics: Tuple[str, ...] = ()
+    mirrors: Tuple[str, ...] = ()
+
+    def langs(self) -> Tuple[str, ...]:
+        return (self.lang,) + self.mirrors
+
+    def judged_metrics(self) -> Tuple[str, ...]:
+        return self.metrics or (self.metric,)
+
+
+RowScores = Dict[str, Dict[str, Optional[int]]]  # lang -> metric -> score
+
+
+class ScoreAssembler:
+    """
+    Reassembles results of JudgeTasks, which complete in arbitrary order across the
+    whole run, into per-row and per-subset scores.
+
+    Usage: add_row() for every row of a subset (with the scores already known and the
+    tasks still to run), then seal_subset(); record() every finished task. on_row_done
+    fires once all tasks of a row are recorded, on_subset_done once all rows of a sealed
+    subset are done. Callbacks run in the thread that completes the row / subset.
+    """
+
+    def __init__(
+        self,
+        all_metrics: List[str],
+        on_row_done: Optional[Callable[[str, str, RowScores], None]] = None,
+        on_subset_done: Optional[Callable[[str, Dict[str, RowScores]], None]] = None,
+    ):
+        self.all_metrics = all_metrics
+        self.on_row_done = on_row_done
+        self.on_subset_done = on_subset_done
+
+        self._lock = threading.Lock()
+        self._scores: Dict[str, Dict[str, RowScores]] = {}
+        self._pending_tasks: Dict[Tuple[str, str], int] = {}
+        self._pending_rows: Dict[str, int] = {}
+        self._sealed: Dict[str, bool] = {}
+        self._finished: Dict[str, bool] = {}
+
+    def empty_row_scores(self) -> RowScores:
+        return {lang: {m: None for m in self.all_metrics} for lang in LANGS}
+
+    def add_row(self, subset: str, idx: str, scores: RowScores, tasks: List[JudgeTask]) -> None:
+        with self._lock:
+            self._scores.setdefault(subset, {})[idx] = scores
+            self._pending_rows.setdefault(subset, 0)
+            self._sealed.setdefault(subset, False)
+            if tasks:
+                self._pending_tasks[(subset, idx)] = len(tasks)
+                self._pending_rows[subset] += 1
+        if not tasks and self.on_row_done:
+            self.on_row_done(subset, idx, scores)
+
+    def seal_subset(self, subset: str) -> None:
+        with self._lock:
+            self._scores.setdefault(subset, {})
+            self._pending_rows.setdefault(subset, 0)
+            self._sealed[subset] = True
+            done = self._pending_rows[subset] == 0
+        if done:
+            self._finish_subset(subset)
+
+    def record(self, task: JudgeTask, scores: Dict[str, Optional[int]]) -> None:
+        """Record the result of a task. `scores` maps metric -> score (usually just task.metric)."""
+        key = (task.subset, task.idx)
+        with self._lock:
+            row = self._scores[task.subset][task.idx]
+            for lang in task.langs():
+                for m, v in scores.items():
+                    row[lang][m] = v
+            self._pending_tasks[key] -= 1
+            row_done = self._pending_tasks[key] == 0
+            subset_done = False
+            if row_done:
+                del self._pending_tasks[key]
+                self._pending_rows[task.subset] -= 1
+                subset_done = self._sealed[task.subset] and self._pending_rows[task.subset] == 0
+
+        if row_done and self.on_row_done:
+            self.on_row_done(task.subset, task.idx, row)
+        if subset_done:
+            self._finish_subset(task.subset)
+
+    def snapshot(self, subset: str) -> Optional[Dict[str, RowScores]]:
+        """Scores collected so far for a subset that has not finished, else None."""
+        with self._lock:
+            if subset not in self._scores or self._finished.get(subset):
+                return None
+            return {
+                idx: {lang: dict(by_metric) for lang, by_metric in row.items()}
+                for idx, row in self._scores[subset].items()
+            }
+
+    def pending_task_count(self) -> int:
+        with self._lock:
+            return sum(self._pending_tasks.values())
+
+    def _finish_subset(self, subset: str) -> None:
+        with self._lock:
+            self._finished[subset] = True
+        if self.on_subset_done:
+            self.on_subset_done(subset, self._scores[subset])
@@ -0,0 +1,126 @@
+import os
+import re
+import csv
+import glob
+import hashlib
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+# (i, N): the i-th of N shards, 1-based
+Shard = Tuple[int, int]
+
+_SHARD_SUFFIX = re.compile(r"\.shard-(\d+)-of-(\d+)$")
+
+
+def parse_shard(spec: str) -> Shard:
+    """Parse "i/N" into (i, N) with 1 <= i <= N."""
+    try:
+        i, n = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"invalid shard '{spec}', expected i/N, e.g. 1/4")
+    if n < 1 or not 1 <= i <= n:
+        raise ValueError(f"invalid shard '{spec}', i must be in 1..N")
+    return i, n
+
+
+def shard_of(subset: str, idx: str, num_shards: int) -> int:
+    """Shard (1-based) of one (subset, idx) row; a stable hash, the same on every host and Python version."""
+    digest = hashlib.sha1(f"{subset}/{idx}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards + 1
+
+
+def in_shard(subset: str, idx: str, shard: Optional[Shard]) -> bool:
+    return shard is None or shard_of(subset, idx, shard[1]) == shard[0]
+
+
+def shard_path(path: str, shard: Optional[Shard]) -> str:
+    """Per-shard variant of an output path: score_X.csv -> score_X.shard-1-of-4.csv (unchanged without a shard)."""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+
+def find_shard_files(path: str) -> Dict[Shard, str]:
+    """Per-shard files of the output `path` that exist, keyed by their shard."""
+    root, ext = os.path.splitext(path)
+    found: Dict[Shard, str] = {}
+    for p in glob.glob(f"{glob.escape(root)}.shard-*-of-*{ext}"):
+        m = _SHARD_SUFFIX.search(os.path.splitext(p)[0])
+        if m:
+            found[(int(m.group(1)), int(m.group(2)))] = p
+    return found
+
+
+def _idx_of(row: dict) -> Optional[str]:
+    idx_val = row.get("idx") or row.get("\ufeffidx")
+    if idx_val is None or not str(idx_val).strip():
+        return None
+    return str(idx_val).strip()
+
+
+def merge_shard_scores(
+    base_csv_path: str,
+    score_csv_path: str,
+    shard_files: Dict[Shard, str],
+    base_idx: Set[str],
+) -> int:
+    """
+    Merge the per-shard score files of one subset into `score_csv_path`, rows in the order
+    of the base CSV. Every shard of the same N must be present, no idx may appear in two
+    shards and together they must cover exactly `base_idx`; otherwise RuntimeError and
+    nothing is written. Returns the number of merged rows.
+    """
+    counts = {n for _i, n in shard_files}
+    if len(counts) != 1:
+        raise RuntimeError(f"shard files of {score_csv_path} come from different shard counts: {sorted(counts)}")
+    num_shards = counts.pop()
+    missing_shards = [i for i in range(1, num_shards + 1) if (i, num_shards) not in shard_files]
+    if missing_shards:
+        raise RuntimeError(f"missing shard(s) {missing_shards} of {num_shards} for {score_csv_path}")
+
+    rows_by_idx: Dict[str, dict] = {}
+    fieldnames: List[str] = []
+    for shard, path in sorted(shard_files.items()):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            fieldnames = fieldnames or list(reader.fieldnames or [])
+            for row in reader:
+                idx_str = _idx_of(row)
+                if idx_str is None:
+                    continue
+                if idx_str in rows_by_idx:
+                    raise RuntimeError(f"idx {idx_str} of {score_csv_path} is scored by more than one shard ({path})")
+                rows_by_idx[idx_str] = row
+
+    score_idx = set(rows_by_idx)
+    if base_idx != score_idx:
+        missing_in_score = base_idx - score_idx
+        extra_in_score = score_idx - base_idx
+        raise RuntimeError(
+            f"idx mismatch between base and merged shards for '{os.path.basename(score_csv_path)}'.\n"
+            f"  base CSV: {base_csv_path}\n"
+            f"  shard files: {' '.join(p for _s, p in sorted(shard_files.items()))}\n"
+            f"  base_idx count={len(base_idx)}, score_idx count={len(score_idx)}\n"
+            f"  missing in score (first 10): {list(missing_in_score)[:10]}\n"
+            f"  extra in score (first 10): {list(extra_in_score)[:10]}"
+        )
+
+    ordered: List[dict] = []
+    with open(base_csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            idx_str = _idx_of(row)
+            if idx_str is not None and idx_str in rows_by_idx:
+                ordered.append(rows_by_idx.pop(idx_str))
+
+    tmp_path = score_csv_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f_out:
+        writer = csv.DictWriter(f_out, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in ordered:
+            writer.writerow(row)
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    os.replace(tmp_path, score_csv_path)
+    logging.info(f"Merged {num_shards} shards ({len(ordered)} rows) into {score_csv_path}")
+    return len(ordered)
@@ -0,0 +1,299 @@
+import time
+import logging
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, List, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    pos = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[pos]
+
+
+def _format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class RunTelemetry:
+    """
+    Live counters of an evaluation run: judge calls and their latency per metric,
+    retries by error kind, parse failures per response format, text-only repairs of
+    unparsable answers and full re-sends after them, 429s, zero-score fallbacks, judge tasks
+    saved by CN / EN deduplication, task / row progress and queue depth. Latency quantiles are computed over the last
+    `latency_window` calls of each metric; rates over the last `rate_window` seconds.
+    """
+
+    def __init__(self, latency_window: int = 5000, rate_window: float = 60.0):
+        self.latency_window = latency_window
+        self.rate_window = rate_window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.calls: Dict[str, int] = {}
+            self.latency_sum: Dict[str, float] = {}
+            self._latencies: Dict[str, Deque[float]] = {}
+            self.retries: Dict[str, int] = {}
+            self.parse_failures = 0
+            self.answers_by_format: Dict[str, int] = {}
+            self.parse_failures_by_format: Dict[str, int] = {}
+            self.repairs = 0
+            self.repairs_parsed = 0
+            self.parse_resends = 0
+            self.rate_limited = 0
+            self.zero_fallbacks = 0
+            self.dedup_rows = 0
+            self.dedup_tasks = 0
+            self.tasks_total = 0
+            self.tasks_started = 0
+            self.tasks_done = 0
+            self.rows_total = 0
+            self.rows_done = 0
+            self._task_times: Deque[float] = deque()
+            self._row_times: Deque[float] = deque()
+            self._call_times: Deque[float] = deque()
+
+    # ---- recording -------------------------------------------------------
+
+    def observe_call(self, metric: str, seconds: float) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.calls[metric] = self.calls.get(metric, 0) + 1
+            self.latency_sum[metric] = self.latency_sum.get(metric, 0.0) + seconds
+            self._latencies.setdefault(metric, deque(maxlen=self.latency_window)).append(seconds)
+            self._push(self._call_times, now)
+
+    def count_retry(self, kind: str) -> None:
+        with self._lock:
+            self.retries[kind] = self.retries.get(kind, 0) + 1
+            if kind == "rate_limit":
+                self.rate_limited += 1
+
+    def count_parse_result(self, answer_format: str, parsed: bool) -> None:
+        """One judge answer requested as `answer_format` ("text" / "json_schema"), `parsed` or not."""
+        with self._lock:
+            self.answers_by_format[answer_format] = self.answers_by_format.get(answer_format, 0) + 1
+            if not parsed:
+                self.parse_failures += 1
+                self.parse_failures_by_format[answer_format] = self.parse_failures_by_format.get(answer_format, 0) + 1
+
+    def count_repair(self, parsed: bool) -> None:
+        """One text-only repair request for an unparsable answer; `parsed` if it gave a score."""
+        with self._lock:
+            self.repairs += 1
+            if parsed:
+                self.repairs_parsed += 1
+
+    def count_parse_resend(self) -> None:
+        """The full request (with images) is sent again because of an unparsable answer."""
+        with self._lock:
+            self.parse_resends += 1
+
+    def count_zero_fallback(self) -> None:
+        with self._lock:
+            self.zero_fallbacks += 1
+
+    def count_deduplicated(self, tasks: int) -> None:
+        """One row whose CN / EN requests are identical; `tasks` judge tasks are not sent twice."""
+        with self._lock:
+            self.dedup_rows += 1
+            self.dedup_tasks += tasks
+
+    def add_planned(self, tasks: int, rows: int) -> None:
+        with self._lock:
+            self.tasks_total += tasks
+            self.rows_total += rows
+
+    def task_started(self, tasks: int = 1) -> None:
+        with self._lock:
+            self.tasks_started += tasks
+
+    def task_done(self) -> None:
+        with self._lock:
+            self.tasks_done += 1
+            self._push(self._task_times, time.monotonic())
+
+    def row_done(self) -> None:
+        with self._lock:
+            self.rows_done += 1
+            self._push(self._row_times, time.monotonic())
+
+    def _push(self, times: Deque[float], now: float) -> None:
+        times.append(now)
+        while times and now - times[0] > self.rate_window:
+            times.popleft()
+
+    # ---- reading ---------------------------------------------------------
+
+    def _rate_locked(self, times: Deque[float], now: float) -> float:
+        while times and now - times[0] > self.rate_window:
+            times.popleft()
+        window = min(self.rate_window, now - self.started_at)
+        return len(times) / window if window > 0 else 0.0
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            latency = {}
+            for metric, values in self._latencies.items():
+                ordered = sorted(values)
+                latency[metric] = {q: _quantile(ordered, q) for q in QUANTILES}
+            task_rate = self._rate_locked(self._task_times, now)
+            remaining = self.tasks_total - self.tasks_done
+            return {
+                "elapsed": now - self.started_at,
+                "calls": dict(self.calls),
+                "latency_sum": dict(self.latency_sum),
+                "latency": latency,
+                "retries": dict(self.retries),
+                "parse_failures": self.parse_failures,
+                "answers_by_format": dict(self.answers_by_format),
+                "parse_failures_by_format": dict(self.parse_failures_by_format),
+                "repairs": self.repairs,
+                "repairs_parsed": self.repairs_parsed,
+                "parse_resends": self.parse_resends,
+                "rate_limited": self.rate_limited,
+                "zero_fallbacks": self.zero_fallbacks,
+                "dedup_rows": self.dedup_rows,
+                "dedup_tasks": self.dedup_tasks,
+                "tasks_total": self.tasks_total,
+                "tasks_done": self.tasks_done,
+                "rows_total": self.rows_total,
+                "rows_done": self.rows_done,
+                "in_flight": self.tasks_started - self.tasks_done,
+                "queued": max(0, self.tasks_total - self.tasks_started),
+                "rows_per_sec": self._rate_locked(self._row_times, now),
+                "calls_per_sec": self._rate_locked(self._call_times, now),
+                "tasks_per_sec": task_rate,
+                "eta": remaining / task_rate if task_rate > 0 else None,
+            }
+
+    def progress_line(self) -> str:
+        s = self.snapshot()
+        pct = 100.0 * s["tasks_done"] / s["tasks_total"] if s["tasks_total"] else 100.0
+        p95 = max((q[0.95] for q in s["latency"].values()), default=0.0)
+        return (
+            f"Progress: {s['tasks_done']}/{s['tasks_total']} tasks ({pct:.1f}%), "
+            f"rows {s['rows_done']}/{s['rows_total']}, {s['rows_per_sec']:.2f} rows/s, "
+            f"{s['calls_per_sec']:.2f} calls/s, p95 {p95:.1f}s, "
+            f"retries {sum(s['retries'].values())}, 429s {s['rate_limited']}, "
+            f"parse failures {s['parse_failures']}, zero fallbacks {s['zero_fallbacks']}, "
+            f"in flight {s['in_flight']}, queued {s['queued']}, ETA {_format_eta(s['eta'])}"
+        )
+
+    def parse_report_lines(self) -> List[str]:
+        """Parse-failure rate of the judge answers of each response format."""
+        s = self.snapshot()
+        lines = []
+        for answer_format, answers in sorted(s["answers_by_format"].items()):
+            failed = s["parse_failures_by_format"].get(answer_format, 0)
+            lines.append(f"{answer_format:<12} answers={answers:<7} unparsable={failed:<5} ({failed / answers:.1%})")
+        if s["repairs"] or s["parse_resends"]:
+            lines.append(
+                f"{'repairs':<12} text-only={s['repairs']:<5} parsed={s['repairs_parsed']:<5} "
+                f"full re-sends={s['parse_resends']}"
+            )
+        return lines
+
+    def openmetrics(self) -> str:
+        s = self.snapshot()
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str, samples: List[Tuple[str, str, float]]) -> None:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{labels} {value}")
+
+        def lbl(**kv) -> str:
+            return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items()) + "}"
+
+        family("wiseedit_judge_calls", "counter", "Judge HTTP calls that returned a response.",
+               [("_total", lbl(metric=m), n) for m, n in sorted(s["calls"].items())])
+        latency_samples = []
+        for m in sorted(s["latency"]):
+            for q, v in s["latency"][m].items():
+                latency_samples.append(("", lbl(metric=m, quantile=q), round(v, 4)))
+            latency_samples.append(("_sum", lbl(metric=m), round(s["latency_sum"][m], 4)))
+            latency_samples.append(("_count", lbl(metric=m), s["calls"][m]))
+        family("wiseedit_judge_latency_seconds", "summary", "Latency of judge HTTP calls.", latency_samples)
+        family("wiseedit_judge_retries", "counter", "Failed judge attempts by error kind.",
+               [("_total", lbl(kind=k), n) for k, n in sorted(s["retries"].items())])
+        family("wiseedit_judge_rate_limited", "counter", "Judge calls answered with HTTP 429.",
+               [("_total", "", s["rate_limited"])])
+        family("wiseedit_judge_parse_failures", "counter", "Judge answers without a parsable score.",
+               [("_total", "", s["parse_failures"])])
+        family("wiseedit_judge_answers", "counter", "Judge answers by requested response format and whether a score could be parsed.",
+               [("_total", lbl(format=f, parsed=p), n)
+                for f, total in sorted(s["answers_by_format"].items())
+                for p, n in (("true", total - s["parse_failures_by_format"].get(f, 0)),
+                             ("false", s["parse_failures_by_format"].get(f, 0)))])
+        family("wiseedit_judge_repairs", "counter", "Text-only repair requests for unparsable answers, by whether they gave a score.",
+               [("_total", lbl(parsed="true"), s["repairs_parsed"]),
+                ("_total", lbl(parsed="false"), s["repairs"] - s["repairs_parsed"])])
+        family("wiseedit_judge_parse_resends", "counter", "Full judge requests re-sent because of an unparsable answer.",
+               [("_total", "", s["parse_resends"])])
+        family("wiseedit_judge_zero_fallbacks", "counter", "Scores set to 0 after all attempts gave no parsable answer.",
+               [("_total", "", s["zero_fallbacks"])])
+        family("wiseedit_dedup_tasks", "counter", "Judge tasks whose result was shared by CN and EN (identical edited images).",
+               [("_total", "", s["dedup_tasks"])])
+        family("wiseedit_tasks_done", "counter", "Finished judge tasks.", [("_total", "", s["tasks_done"])])
+        family("wiseedit_rows_done", "counter", "Finished rows.", [("_total", "", s["rows_done"])])
+        family("wiseedit_tasks_planned", "gauge", "Judge tasks planned for this run.", [("", "", s["tasks_total"])])
+        family("wiseedit_tasks_in_flight", "gauge", "Judge tasks in progress.", [("", "", s["in_flight"])])
+        family("wiseedit_queue_depth", "gauge", "Judge tasks waiting to start.", [("", "", s["queued"])])
+        family("wiseedit_rows_per_second", "gauge", "Rows finished per second (recent window).", [("", "", round(s["rows_per_sec"], 4))])
+        family("wiseedit_calls_per_second", "gauge", "Judge calls per second (recent window).", [("", "", round(s["calls_per_sec"], 4))])
+        family("wiseedit_eta_seconds", "gauge", "Estimated seconds until all planned tasks are done.",
+               [("", "", round(s["eta"], 1) if s["eta"] is not None else "NaN")])
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    # ---- exporters ---------------------------------------------------------
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve openmetrics() at http://host:port/metrics from a daemon thread."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = telemetry.openmetrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logging.info(f"Serving OpenMetrics at http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def start_progress_log(self, interval: float) -> threading.Event:
+        """Log progress_line() every `interval` seconds until the returned event is set."""
+        stop = threading.Event()
+
+        def loop() -> None:
+            while not stop.wait(interval):
+                logging.info(self.progress_line())
+
+        threading.Thread(target=loop, name="progress-log", daemon=True).start()
+        return stop
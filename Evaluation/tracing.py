@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+from contextvars import ContextVar
+from typing import Iterator, Optional, Tuple
+
+# (subset, idx, lang, metric) of the judge task running in the current thread / asyncio task
+_TASK: ContextVar[Tuple[str, str, str, str]] = ContextVar("wiseedit_trace_task", default=("", "", "", ""))
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    """
+    Appends one JSON line per finished span to `path`:
+    {"stage", "subset", "idx", "lang", "metric", "start" (epoch seconds), "dur" (seconds), ...}.
+    Spans carry the task tags of the surrounding trace_task() block.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._f = open(path, "a", encoding="utf-8")
+
+    def emit(self, stage: str, start: float, dur: float, **extra) -> None:
+        subset, idx, lang, metric = _TASK.get()
+        rec = {"stage": stage, "subset": subset, "idx": idx, "lang": lang, "metric": metric,
+               "start": round(start, 6), "dur": round(dur, 6)}
+        rec.update(extra)
+        line = json.dumps(rec, ensure_ascii=False)
+        with self._lock:
+            self._f.write(line + "\n")
+
+    @contextlib.contextmanager
+    def span(self, stage: str, **extra) -> Iterator[dict]:
+        # callers may add fields (e.g. the outcome) to the yielded dict
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield extra
+        except BaseException as e:
+            extra.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            self.emit(stage, start, time.perf_counter() - t0, **extra)
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+
+TRACER: Optional[Tracer] = None
+
+
+def configure_tracing(path: Optional[str]) -> Optional[Tracer]:
+    """Write spans to `path` (JSONL); None disables tracing."""
+    global TRACER
+    if TRACER is not None:
+        TRACER.close()
+        TRACER = None
+    if path:
+        TRACER = Tracer(path)
+        logging.info(f"Writing trace spans to {path}")
+    return TRACER
+
+
+def span(stage: str, **extra):
+    """Context manager timing one stage of the current task; a no-op unless tracing is configured."""
+    if TRACER is None:
+        return _NULL_SPAN
+    return TRACER.span(stage, **extra)
+
+
+def emit_since(stage: str, started: float, **extra) -> None:
+    """Record a span that began at the time.monotonic() value `started` and ends now."""
+    if TRACER is not None:
+        dur = time.monotonic() - started
+        TRACER.emit(stage, time.time() - dur, dur, **extra)
+
+
+@contextlib.contextmanager
+def trace_task(subset: str, idx: str, lang: str, metric: str) -> Iterator[None]:
+    """Tag every span emitted inside this block with the given task."""
+    token = _TASK.set((subset, idx, lang, metric))
+    try:
+        yield
+    finally:
+        _TASK.reset(token)
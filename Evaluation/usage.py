@@ -0,0 +1,276 @@
+import os
+import csv
+import logging
+import threading
+import contextlib
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, reports are then written without a file lock
+    fcntl = None
+
+# USD per 1M tokens: (input, cached input, output). Matched by longest model-name prefix.
+JUDGE_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-5": (1.25, 0.125, 10.00),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+}
+BATCH_DISCOUNT = 0.5  # Batch API requests are billed at half price
+COMBINED_METRIC = "combined"  # usage / telemetry bucket of requests scoring several metrics at once
+
+REPORT_FIELDS = [
+    "judge_model", "subset", "lang", "metric", "requests",
+    "prompt_tokens", "cached_tokens", "completion_tokens", "cost_usd",
+]
+
+# (subset, lang) of the judge task running in the current thread / asyncio task
+_TAGS: ContextVar[Tuple[str, str]] = ContextVar("wiseedit_usage_tags", default=("", ""))
+
+
+@contextlib.contextmanager
+def usage_tags(subset: str, lang: str) -> Iterator[None]:
+    """Attribute the usage of every judge response received inside this block to (subset, lang)."""
+    token = _TAGS.set((subset, lang))
+    try:
+        yield
+    finally:
+        _TAGS.reset(token)
+
+
+@dataclass
+class UsageTotals:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    cost: float = 0.0
+
+    def add(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int, cost: float = 0.0, requests: int = 1) -> None:
+        self.requests += requests
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cached_tokens += cached_tokens
+        self.cost += cost
+
+    def merge(self, other: "UsageTotals") -> None:
+        self.add(other.prompt_tokens, other.completion_tokens, other.cached_tokens, other.cost, other.requests)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+def _field(obj, name: str):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_counts(usage) -> Tuple[int, int, int]:
+    """(prompt, completion, cached prompt) tokens of a response's `usage`, either an SDK object or a raw dict."""
+    details = _field(usage, "prompt_tokens_details")
+    return (
+        _field(usage, "prompt_tokens") or 0,
+        _field(usage, "completion_tokens") or 0,
+        _field(details, "cached_tokens") or 0,
+    )
+
+
+def lookup_prices(model: str) -> Optional[Tuple[float, float, float]]:
+    best = None
+    for prefix in JUDGE_PRICES:
+        if model.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return JUDGE_PRICES[best] if best else None
+
+
+# (judge model, subset, lang, metric)
+UsageKey = Tuple[str, str, str, str]
+
+
+def read_report(path: str) -> Dict[UsageKey, UsageTotals]:
+    """Usage rows of a cost_report.csv (without the TOTAL row); empty if there is none."""
+    merged: Dict[UsageKey, UsageTotals] = {}
+    if not os.path.exists(path):
+        return merged
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("subset") == "TOTAL":
+                continue
+            try:
+                key = (row["judge_model"], row["subset"], row["lang"], row["metric"])
+                merged.setdefault(key, UsageTotals()).add(
+                    int(row["prompt_tokens"]), int(row["completion_tokens"]),
+                    int(row["cached_tokens"]), float(row["cost_usd"]), int(row["requests"]),
+                )
+            except (KeyError, ValueError):
+                continue
+    return merged
+
+
+class UsageTracker:
+    """
+    Thread-safe totals of the token usage reported by judge responses, keyed by judge
+    model, subset, language and metric, with the cost derived from JUDGE_PRICES (or the
+    prices given to configure()).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries: Dict[UsageKey, UsageTotals] = {}
+        self.prices: Optional[Tuple[float, float, float]] = None
+        self._unpriced: set = set()
+
+    def configure(self, prices: Optional[Tuple[float, float, float]] = None) -> None:
+        """Override the per-1M-token (input, cached input, output) prices of every judge model."""
+        self.prices = prices
+
+    def cost_of(self, model: str, prompt: int, completion: int, cached: int) -> float:
+        prices = self.prices or lookup_prices(model)
+        if prices is None:
+            if model not in self._unpriced:
+                self._unpriced.add(model)
+                logging.warning(f"No price known for judge model '{model}', its cost is counted as 0 (set --price_input / --price_output).")
+            return 0.0
+        p_in, p_cached, p_out = prices
+        return ((prompt - cached) * p_in + cached * p_cached + completion * p_out) / 1e6
+
+    def record(
+        self,
+        metric: str,
+        usage,
+        model: str = "",
+        subset: Optional[str] = None,
+        lang: Optional[str] = None,
+        discount: float = 1.0,
+    ) -> None:
+        if usage is None:
+            return
+        prompt, completion, cached = usage_counts(usage)
+        tag_subset, tag_lang = _TAGS.get()
+        key = (model, subset if subset is not None else tag_subset, lang if lang is not None else tag_lang, metric)
+        cost = self.cost_of(model, prompt, completion, cached) * discount
+        with self._lock:
+            self.entries.setdefault(key, UsageTotals()).add(prompt, completion, cached, cost)
+
+    def totals(self) -> UsageTotals:
+        total = UsageTotals()
+        with self._lock:
+            for t in self.entries.values():
+                total.merge(t)
+        return total
+
+    def by_metric(self) -> Dict[str, UsageTotals]:
+        result: Dict[str, UsageTotals] = {}
+        with self._lock:
+            for (_model, _subset, _lang, metric), t in self.entries.items():
+                result.setdefault(metric, UsageTotals()).merge(t)
+        return result
+
+    def report_lines(self) -> List[str]:
+        lines = []
+        for metric, t in sorted(self.by_metric().items()) + [("total", self.totals())]:
+            lines.append(
+                f"{metric:<24} requests={t.requests:<7} prompt={t.prompt_tokens:<10} "
+                f"cached={t.cached_tokens:<10} ({t.cached_ratio:.1%}) completion={t.completion_tokens:<8} "
+                f"cost=${t.cost:.4f}"
+            )
+        return lines
+
+    def add_report(self, path: str) -> None:
+        """Add the usage of an existing report (e.g. of one shard of a sharded run) to this tracker."""
+        with self._lock:
+            for key, t in read_report(path).items():
+                self.entries.setdefault(key, UsageTotals()).merge(t)
+
+    def write_report(self, path: str, subsets: Optional[Dict[str, str]] = None) -> None:
+        """
+        Write the usage of this run, added to what an existing report at `path` already
+        holds (earlier or resumed runs), as one CSV row per (judge model, subset, lang, metric).
+        With `subsets` (recorded subset tag -> reported name), only the usage of those
+        subsets is written, e.g. the "<model>/<subset>" tags of one model of a multi-model run.
+        The read-add-write runs under an flock of `path`.lock, so processes finishing at the
+        same time (e.g. --worker processes of one model) never lose each other's usage.
+        """
+        with open(path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._write_report_locked(path, subsets)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_report_locked(self, path: str, subsets: Optional[Dict[str, str]]) -> None:
+        merged = read_report(path)
+        with self._lock:
+            for (model, subset, lang, metric), t in self.entries.items():
+                if subsets is not None:
+                    if subset not in subsets:
+                        continue
+                    subset = subsets[subset]
+                merged.setdefault((model, subset, lang, metric), UsageTotals()).merge(t)
+
+        total = UsageTotals()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            for (model, subset, lang, metric), t in sorted(merged.items()):
+                total.merge(t)
+                writer.writerow(self._report_row(model, subset, lang, metric, t))
+            writer.writerow(self._report_row("", "TOTAL", "", "", total))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _report_row(model: str, subset: str, lang: str, metric: str, t: UsageTotals) -> dict:
+        return {
+            "judge_model": model,
+            "subset": subset,
+            "lang": lang,
+            "metric": metric,
+            "requests": t.requests,
+            "prompt_tokens": t.prompt_tokens,
+            "cached_tokens": t.cached_tokens,
+            "completion_tokens": t.completion_tokens,
+            "cost_usd": f"{t.cost:.6f}",
+        }
+
+
+class Budget:
+    """Hard caps on the cost / tokens of one run; exhausted() turns true once either is reached."""
+
+    def __init__(self, tracker: UsageTracker, max_cost: Optional[float] = None, max_tokens: Optional[int] = None):
+        self.tracker = tracker
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self._reported = False
+
+    def exhausted(self) -> bool:
+        if self.max_cost is None and self.max_tokens is None:
+            return False
+        total = self.tracker.totals()
+        hit = (
+            (self.max_cost is not None and total.cost >= self.max_cost)
+            or (self.max_tokens is not None and total.total_tokens >= self.max_tokens)
+        )
+        if hit and not self._reported:
+            self._reported = True
+            logging.warning(
+                f"Budget reached (cost=${total.cost:.4f}, tokens={total.total_tokens}); "
+                f"no new judge requests will be scheduled."
+            )
+        return hit
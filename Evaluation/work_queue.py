@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+import contextlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+TASK_STATES = ("pending", "leased", "done")
+
+
+class WorkQueue:
+    """
+    Judge tasks shared by cooperating `run_eval.py --worker` processes, in one SQLite file.
+
+    Workers add the tasks they planned (ids already present are kept), claim batches of
+    pending tasks under a lease of `lease_seconds`, renew the leases of the tasks they are
+    running with a heartbeat and commit each result. Tasks whose lease expired (their worker
+    died or hangs) are claimed again by any worker. Once every task of a subset is done,
+    one worker claims the subset, writes its score CSV from the committed results and
+    removes the subset from the queue.
+
+    The rollback journal is used instead of WAL, so the file also works on a shared
+    filesystem with working POSIX locks; leases compare wall-clock times of the hosts.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, worker_id: Optional[str] = None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        # autocommit; writes run in explicit BEGIN IMMEDIATE transactions
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " id TEXT PRIMARY KEY,"
+                " subset TEXT NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'pending',"
+                " owner TEXT,"
+                " lease_expires REAL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " result TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks(state)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_subset ON tasks(subset, state)")
+            # subsets whose score CSV a worker is writing
+            conn.execute("CREATE TABLE IF NOT EXISTS subsets (subset TEXT PRIMARY KEY, owner TEXT NOT NULL, claimed_at REAL NOT NULL)")
+        # ids planned by this worker; it only ever claims those
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS mine (id TEXT PRIMARY KEY)")
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def add(self, tasks: Iterable[Tuple[str, str]]) -> int:
+        """Add (task id, subset) pairs that are not queued yet; returns how many were new."""
+        tasks = list(tasks)
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO tasks (id, subset) VALUES (?, ?)", tasks)
+            added = conn.total_changes - before
+            conn.executemany("INSERT OR IGNORE INTO temp.mine (id) VALUES (?)", [(task_id,) for task_id, _subset in tasks])
+        return added
+
+    def claim(self, limit: int) -> Tuple[List[str], int]:
+        """Lease up to `limit` pending or expired tasks; returns their ids and how many had an expired lease."""
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT t.id, t.state FROM tasks t JOIN temp.mine m ON m.id = t.id"
+                " WHERE t.state = 'pending' OR (t.state = 'leased' AND t.lease_expires < ?)"
+                " LIMIT ?",
+                (now, max(0, limit)),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                [(self.worker_id, now + self.lease_seconds, task_id) for task_id, _state in rows],
+            )
+        return [task_id for task_id, _state in rows], sum(1 for _id, state in rows if state == "leased")
+
+    def renew(self) -> None:
+        """Extend the lease of every task this worker holds."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE owner = ? AND state = 'leased'",
+                (time.time() + self.lease_seconds, self.worker_id),
+            )
+
+    def complete(self, task_id: str, scores: Dict[str, Optional[int]]) -> bool:
+        """Commit the result of a task; False if another worker (after a lease expiry) committed it first."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET state = 'done', owner = ?, lease_expires = NULL, result = ? WHERE id = ? AND state != 'done'",
+                (self.worker_id, json.dumps(scores), task_id),
+            )
+            return cur.rowcount == 1
+
+    def release(self, task_ids: Optional[List[str]] = None) -> None:
+        """Hand leased tasks of this worker (all of them by default) back to the queue."""
+        with self._transaction() as conn:
+            if task_ids is None:
+                conn.execute(
+                    "UPDATE tasks SET state = 'pending', owner = NULL, lease_expires = NULL WHERE owner = ? AND state = 'leased'",
+                    (self.worker_id,),
+                )
+            else:
+                conn.executemany(
+                    "UPDATE tasks SET state = 'pending', owner = NULL, lease_expires = NULL WHERE id = ? AND owner = ? AND state = 'leased'",
+                    [(task_id, self.worker_id) for task_id in task_ids],
+                )
+
+    def subset_progress(self, subset: str) -> Tuple[int, int]:
+        """
+        (tasks not done, all tasks) of a subset among those this worker planned; (0, 0) once
+        its score CSV was written and it left the queue. Tasks queued by workers started with
+        other options (e.g. --combined_metrics) never block this worker.
+        """
+        with self._lock:
+            open_tasks, total = self._conn.execute(
+                "SELECT COALESCE(SUM(t.state != 'done'), 0), COUNT(*) FROM tasks t JOIN temp.mine m ON m.id = t.id"
+                " WHERE t.subset = ?",
+                (subset,),
+            ).fetchone()
+        return open_tasks, total
+
+    def claim_subset(self, subset: str) -> bool:
+        """Become the worker that writes the score CSV of a finished subset (taken over if its writer's lease expired)."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT owner, claimed_at FROM subsets WHERE subset = ?", (subset,)).fetchone()
+            if row is not None and row[0] != self.worker_id and row[1] + self.lease_seconds > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO subsets (subset, owner, claimed_at) VALUES (?, ?, ?)",
+                (subset, self.worker_id, now),
+            )
+            return True
+
+    def results(self, subset: str) -> Dict[str, Dict[str, Optional[int]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, result FROM tasks WHERE subset = ? AND state = 'done'", (subset,)
+            ).fetchall()
+        return {task_id: json.loads(result) for task_id, result in rows if result is not None}
+
+    def finish_subset(self, subset: str) -> None:
+        """Drop a subset whose score CSV is written, so a later evaluation of it starts from its CSV again."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM tasks WHERE subset = ?", (subset,))
+            conn.execute("DELETE FROM subsets WHERE subset = ?", (subset,))
+
+    def counts(self) -> Dict[str, int]:
+        """Tasks planned by this worker per state, plus those leased by other workers ("leased_by_others")."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT t.state, t.owner = ?, COUNT(*) FROM tasks t JOIN temp.mine m ON m.id = t.id GROUP BY 1, 2",
+                (self.worker_id,),
+            ).fetchall()
+        counts = {state: 0 for state in TASK_STATES}
+        counts["leased_by_others"] = 0
+        for state, own, n in rows:
+            counts[state] = counts.get(state, 0) + n
+            if state == "leased" and not own:
+                counts["leased_by_others"] += n
+        return counts
+
+    @contextlib.contextmanager
+    def heartbeat(self) -> Iterator[None]:
+        """Renew this worker's leases every lease_seconds / 3 while the block runs."""
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    self.renew()
+                except sqlite3.Error as e:
+                    logging.warning(f"Work queue heartbeat failed ({self.path}): {e}")
+
+        thread = threading.Thread(target=beat, name="work-queue-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,154 @@
+import argparse
+import json
+from typing import Dict, List, Tuple
+
+# Stages in the order they happen inside one judge task
+STAGE_ORDER: List[str] = ["queue", "encode", "throttle", "http", "backoff", "parse"]
+
+TaskKey = Tuple[str, str, str, str]  # (subset, idx, lang, metric)
+ExampleKey = Tuple[str, str]  # (subset, idx)
+
+
+def load_spans(path: str) -> List[dict]:
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+                rec["start"] = float(rec["start"])
+                rec["dur"] = float(rec["dur"])
+            except (ValueError, KeyError, TypeError):
+                print(f"[WARN] Skip unreadable line {line_no} of {path}")
+                continue
+            spans.append(rec)
+    return spans
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[pos]
+
+
+def group_tasks(spans: List[dict]) -> Dict[TaskKey, dict]:
+    """
+    Per judge task: first start, last end, wall time of the "task" span, and the summed
+    duration of every other stage.
+    """
+    tasks: Dict[TaskKey, dict] = {}
+    for s in spans:
+        key = (s.get("subset", ""), str(s.get("idx", "")), s.get("lang", ""), s.get("metric", ""))
+        t = tasks.setdefault(key, {"start": s["start"], "end": s["start"] + s["dur"], "task": 0.0, "stages": {}})
+        t["start"] = min(t["start"], s["start"])
+        t["end"] = max(t["end"], s["start"] + s["dur"])
+        if s["stage"] == "task":
+            t["task"] += s["dur"]
+        else:
+            t["stages"][s["stage"]] = t["stages"].get(s["stage"], 0.0) + s["dur"]
+    return tasks
+
+
+def ordered_stages(stages: Dict[str, float]) -> List[str]:
+    return [st for st in STAGE_ORDER if st in stages] + sorted(st for st in stages if st not in STAGE_ORDER)
+
+
+def format_breakdown(t: dict) -> str:
+    parts = [f"{st}={t['stages'][st]:.2f}s" for st in ordered_stages(t["stages"])]
+    # time inside the task not covered by a traced stage (scheduling, CSV bookkeeping, ...)
+    inner = sum(d for st, d in t["stages"].items() if st != "queue")
+    if t["task"] > inner:
+        parts.append(f"other={t['task'] - inner:.2f}s")
+    return " ".join(parts)
+
+
+def print_stage_summary(spans: List[dict]) -> None:
+    by_stage: Dict[str, List[float]] = {}
+    for s in spans:
+        by_stage.setdefault(s["stage"], []).append(s["dur"])
+    task_total = sum(by_stage.get("task", [])) or 1.0
+
+    print("=" * 100)
+    print("Per-stage totals (share = stage time / total task time, queue excluded from tasks)")
+    print(f"{'stage':<10} {'count':>8} {'total_s':>10} {'mean_s':>8} {'p50_s':>8} {'p95_s':>8} {'max_s':>8} {'share':>7}")
+    stages = ordered_stages({k: 0.0 for k in by_stage if k != "task"}) + (["task"] if "task" in by_stage else [])
+    for stage in stages:
+        values = by_stage[stage]
+        total = sum(values)
+        share = f"{total / task_total:.1%}" if stage not in ("task", "queue") else "-"
+        print(
+            f"{stage:<10} {len(values):>8} {total:>10.2f} {total / len(values):>8.3f} "
+            f"{percentile(values, 0.5):>8.3f} {percentile(values, 0.95):>8.3f} {max(values):>8.3f} {share:>7}"
+        )
+
+
+def print_critical_path(tasks: Dict[TaskKey, dict]) -> None:
+    """
+    Sum, over all examples, of the stages of the task that finished last: that task
+    decides when the example's CSV row is complete.
+    """
+    last_task: Dict[ExampleKey, TaskKey] = {}
+    for key, t in tasks.items():
+        ex = (key[0], key[1])
+        if ex not in last_task or t["end"] > tasks[last_task[ex]]["end"]:
+            last_task[ex] = key
+
+    totals: Dict[str, float] = {}
+    for key in last_task.values():
+        for st, d in tasks[key]["stages"].items():
+            totals[st] = totals.get(st, 0.0) + d
+    grand = sum(totals.values()) or 1.0
+
+    print("=" * 100)
+    print(f"Critical path over {len(last_task)} examples (stages of the last-finishing task of each example)")
+    for st in ordered_stages(totals):
+        print(f"   {st:<10} {totals[st]:>10.2f}s  {totals[st] / grand:>6.1%}")
+
+
+def print_slowest(tasks: Dict[TaskKey, dict], top: int) -> None:
+    examples: Dict[ExampleKey, List[TaskKey]] = {}
+    for key in tasks:
+        examples.setdefault((key[0], key[1]), []).append(key)
+
+    def wall(ex: ExampleKey) -> float:
+        keys = examples[ex]
+        return max(tasks[k]["end"] for k in keys) - min(tasks[k]["start"] for k in keys)
+
+    print("=" * 100)
+    print(f"Slowest {top} examples (first queued -> last task finished)")
+    for ex in sorted(examples, key=wall, reverse=True)[:top]:
+        keys = examples[ex]
+        slowest = max(keys, key=lambda k: tasks[k]["end"])
+        print(f"[{ex[0]}] idx={ex[1]}  wall={wall(ex):.2f}s  tasks={len(keys)}")
+        print(f"   critical: {slowest[2].upper()} {slowest[3]}  {format_breakdown(tasks[slowest])}")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Summarize a run_eval.py --trace_file: stage totals, critical path and slowest examples.")
+    parser.add_argument("trace_file", type=str, help="JSONL span file written by run_eval.py --trace_file.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest examples to list.")
+    parser.add_argument("--subset", type=str, default=None, help="Only analyze spans of this subset.")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    spans = load_spans(args.trace_file)
+    if args.subset:
+        spans = [s for s in spans if s.get("subset") == args.subset]
+    if not spans:
+        print(f"[ERROR] No spans found in {args.trace_file}")
+        return
+    tasks = group_tasks(spans)
+    print(f"[INFO] {len(spans)} spans, {len(tasks)} judge tasks")
+    print_stage_summary(spans)
+    print_critical_path(tasks)
+    print_slowest(tasks, args.top)
+
+
+if __name__ == "__main__":
+    main()
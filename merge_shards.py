@@ -0,0 +1,95 @@
+import os
+import sys
+import logging
+import argparse
+from typing import List
+
+from Evaluation.dataset import CSV_METRICS, DEFAULT_METRICS, resolve_model_tags, score_journal_path, walk_benchmark_csvs
+from Evaluation.sharding import find_shard_files, merge_shard_scores
+from Evaluation.usage import UsageTracker
+from statistic import load_idx_set_from_csv, load_score_rows_and_idx, row_has_zero_or_empty
+
+
+def merge_model(model_tag: str, csv_files: List[str], score_output_root: str, keep_shards: bool) -> bool:
+    """Merge the shard files of every subset of one model and fold the shard cost reports in; False on any error."""
+    score_dir = os.path.join(score_output_root, model_tag)
+    ok = True
+    merged = 0
+    for csv_path in csv_files:
+        subset = os.path.splitext(os.path.basename(csv_path))[0]
+        score_csv_path = os.path.join(score_dir, f"score_{subset}.csv")
+        shard_files = find_shard_files(score_csv_path)
+        if not shard_files:
+            continue
+        # a journal next to a shard file means that shard is still running or was killed before saving
+        unfinished = [p for p in shard_files.values() if os.path.exists(score_journal_path(p))]
+        if unfinished:
+            logging.error(f"[{model_tag}] {subset}: shard(s) not finished, rerun them first: {' '.join(sorted(unfinished))}")
+            ok = False
+            continue
+        try:
+            merge_shard_scores(csv_path, score_csv_path, shard_files, load_idx_set_from_csv(csv_path))
+        except RuntimeError as e:
+            logging.error(f"[{model_tag}] {e}")
+            ok = False
+            continue
+        merged += 1
+        rows, _idx = load_score_rows_and_idx(score_csv_path)
+        metrics = CSV_METRICS.get(os.path.basename(csv_path), DEFAULT_METRICS)
+        incomplete = sum(1 for row in rows if row_has_zero_or_empty(row, metrics))
+        if incomplete:
+            logging.warning(
+                f"[{model_tag}] {subset}: {incomplete} rows have empty or zero scores and are skipped by statistic.py; "
+                f"rerun run_eval.py (without --shard) to resume the empty ones."
+            )
+        if not keep_shards:
+            for p in shard_files.values():
+                os.remove(p)
+
+    # shard cost reports are added once to cost_report.csv and removed, so merging again never counts twice
+    cost_report_path = os.path.join(score_dir, "cost_report.csv")
+    shard_reports = find_shard_files(cost_report_path)
+    if shard_reports:
+        usage = UsageTracker()
+        for p in shard_reports.values():
+            usage.add_report(p)
+        usage.write_report(cost_report_path)
+        for p in shard_reports.values():
+            os.remove(p)
+        logging.info(f"[{model_tag}] Added {len(shard_reports)} shard cost reports to {cost_report_path}")
+
+    logging.info(f"[{model_tag}] Merged {merged} subsets in {score_dir}")
+    return ok
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Merge the per-shard score files of run_eval.py --shard i/N runs into score_<subset>.csv."
+    )
+    parser.add_argument("--dataset_dir", type=str, required=True, help="Path to WiseEdit-Benchmark.")
+    parser.add_argument("--score_output_root", type=str, required=True, help="Root directory of output score CSVs (without model name).")
+    parser.add_argument("--name", type=str, nargs="+", required=True,
+                        help="Model tag(s), or quoted glob patterns over the model folders of --score_output_root.")
+    parser.add_argument("--target_csv", type=str, nargs="*", default=None,
+                        help="Only merge these CSV files (default: the same benchmark CSVs as run_eval.py).")
+    parser.add_argument("--keep_shards", action="store_true", help="Keep the per-shard score files after a successful merge.")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    csv_files = walk_benchmark_csvs(args.dataset_dir, args.target_csv)
+    if not csv_files:
+        logging.error(f"There is no matching csv in: {args.dataset_dir}")
+        sys.exit(1)
+    model_tags = resolve_model_tags(args.name, args.score_output_root)
+    ok = True
+    for model_tag in model_tags:
+        ok &= merge_model(model_tag, csv_files, args.score_output_root, args.keep_shards)
+    if not ok:
+        logging.error("Some subsets could not be merged; their shard files are left untouched.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import csv
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from Evaluation.dataset import CSV_METRICS, DEFAULT_METRICS, DEFAULT_STORE_DIRNAME, walk_benchmark_csvs
+from Evaluation.image_profiles import ImageProfile, ProfileTable, load_profiles
+from Evaluation.image_store import PackedImageStoreWriter, encode_file
+from run_eval import collect_input_images, parse_ref_paths
+
+
+def collect_image_jobs(csv_files: List[str], profiles: ProfileTable) -> List[Tuple[str, ImageProfile]]:
+    """
+    Every (dataset-relative input / ref path, profile) the judge messages of these CSVs
+    need, for per-metric requests as well as combined ones.
+    """
+    jobs: Dict[Tuple[str, ImageProfile], None] = {}
+    for csv_path in csv_files:
+        subset_name = os.path.splitext(os.path.basename(csv_path))[0]
+        last_part = subset_name.split("_")[-1]
+        num_inputs = int(last_part) if last_part.isdigit() else None
+        metrics = list(CSV_METRICS.get(os.path.basename(csv_path), DEFAULT_METRICS)) + [None]
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            input_paths, _is_multi = collect_input_images(row, num_inputs)
+            ref_paths = parse_ref_paths(row)
+            for role, paths in (("input", input_paths), ("ref", ref_paths)):
+                for metric in metrics:
+                    profile = profiles.resolve(metric, role)
+                    for p in paths:
+                        jobs[(p, profile)] = None
+    return list(jobs)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Preprocess all benchmark input / ref images once into a packed, memory-mapped store used by run_eval.py."
+    )
+    parser.add_argument("--dataset_dir", type=str, required=True, help="Root directory of the WiseEdit benchmark.")
+    parser.add_argument("--store_dir", type=str, default=None,
+                        help=f"Output directory of the store (default: <dataset_dir>/{DEFAULT_STORE_DIRNAME}).")
+    parser.add_argument("--target_csv", type=str, nargs="*", default=None,
+                        help="Only prepare these CSV files (default: the same benchmark CSVs as run_eval.py).")
+    parser.add_argument("--image_profile", type=str, action="append", default=None,
+                        help="Same image profile rules as run_eval.py; prepare with the rules you evaluate with.")
+    parser.add_argument("--image_profile_file", type=str, default=None, help="JSON file defining extra image profiles.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Worker processes encoding images.")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    store_dir = args.store_dir or os.path.join(args.dataset_dir, DEFAULT_STORE_DIRNAME)
+    profiles = ProfileTable(load_profiles(args.image_profile_file), args.image_profile)
+
+    csv_files = walk_benchmark_csvs(args.dataset_dir, args.target_csv)
+    if not csv_files:
+        logging.error(f"There is no matching csv in: {args.dataset_dir}")
+        return
+    jobs = collect_image_jobs(csv_files, profiles)
+    logging.info(f"Preparing {len(jobs)} images ({', '.join(sorted({p.name for _, p in jobs}))}) from {len(csv_files)} CSVs into {store_dir}")
+
+    started = time.monotonic()
+    writer = PackedImageStoreWriter(store_dir)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(encode_file, os.path.join(args.dataset_dir, rel_path), profile)
+            for rel_path, profile in jobs
+        ]
+        for (rel_path, profile), fut in zip(jobs, futures):
+            try:
+                payload, size, stamp = fut.result()
+                writer.add(rel_path, profile.cache_params(), payload, size, stamp)
+            except Exception as e:
+                failed += 1
+                logging.warning(f"Skip image {rel_path} ({profile.name}): {e}")
+    index_path = writer.close()
+    size_mb = sum(entry[1] for entry in writer.entries.values()) / 1e6
+    logging.info(
+        f"Wrote {len(writer.entries)} payloads ({size_mb:.1f} MB, {failed} failed) in {time.monotonic() - started:.1f}s; "
+        f"index: {index_path}"
+    )
+    logging.info(f"run_eval.py picks the store up from {store_dir} (or pass --image_store {store_dir}).")
+
+
+if __name__ == "__main__":
+    main()
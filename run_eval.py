@@ -3,102 +3,111 @@ import sys
 import csv
 import json
 import logging
+import signal
+import hashlib
+import functools
+import time
+import asyncio
+import contextlib
 import argparse
+import threading
+from dataclasses import dataclass, field, replace
 from typing import List, Optional, Dict, Tuple
-from concurrent.futures import as_completed, ThreadPoolExecutor
-from Evaluation.evaluation_utils import evaluate_example_with_gpt
+from concurrent.futures import wait, FIRST_COMPLETED, Future, ThreadPoolExecutor
+from Evaluation.evaluation_utils import (
+    evaluate_metric_with_gpt,
+    evaluate_metric_with_gpt_async,
+    evaluate_metrics_combined_with_gpt,
+    evaluate_metrics_combined_with_gpt_async,
+    configure_image_cache,
+    configure_client_pool,
+    configure_rate_limiter,
+    configure_retry_policy,
+    configure_response_cache,
+    configure_message_layout,
+    configure_response_format,
+    configure_parse_repair,
+    requested_response_format,
+    build_repair_message,
+    configure_image_workers,
+    configure_image_profiles,
+    configure_image_store,
+    encode_image_to_base64,
+    build_metric_message,
+    judge_request_body,
+    lookup_cached_answer,
+    endpoint_url,
+    store_cached_answer,
+    extract_score_and_reason_generic,
+    extract_structured_score,
+    get_client,
+    IMAGE_CACHE,
+    IMAGE_PROFILES,
+    PROFILE_STATS,
+    USAGE,
+    TELEMETRY,
+    MESSAGE_LAYOUTS,
+    RESPONSE_FORMATS,
+)
+from Evaluation.scheduler import JudgeTask, ScoreAssembler, LANGS
+from Evaluation.retry_policy import JudgeUnavailableError, PARSE, CLIENT, AUTH
+from Evaluation.journal import ScoreJournal
+from Evaluation.usage import Budget, usage_tags, lookup_prices, BATCH_DISCOUNT
+from Evaluation.tracing import configure_tracing, trace_task, span, emit_since
+from Evaluation.prefetch import ImagePrefetcher
+from Evaluation.manifest import ResultManifest, run_preflight, preflight_lines, write_preflight_report, same_content
+from Evaluation.sharding import Shard, parse_shard, in_shard, shard_path
+from Evaluation.work_queue import WorkQueue
+from Evaluation.dataset import (
+    ALL_METRICS,
+    METRIC_SCORE_KEYS,
+    CSV_METRICS,
+    DEFAULT_METRICS,
+    score_journal_path,
+    walk_benchmark_csvs,
+    resolve_model_tags,
+)
+from Evaluation.planner import (
+    estimate_plan,
+    completion_history,
+    find_cost_reports,
+    plan_lines,
+    plan_total,
+    project_wall_time,
+    format_duration,
+    write_plan,
+)
+from Evaluation.batch_api import (
+    BatchInputWriter,
+    BatchState,
+    submit_batch,
+    wait_for_batch,
+    download_batch_files,
+    iter_batch_output,
+    load_cache_keys,
+    completion_text,
+)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
 TARGET_CSV_FILES: List[str] = []
 
-default_CSV_files: List[str] = [
-    "Imagination_1.csv",
-    "Imagination_2.csv",
-    "Imagination_3.csv",
-    "Imagination_4.csv",
-    "Imagination_5.csv",
-    "Awareness_1.csv",
-    "Awareness_2.csv",
-    "Interpretation_1.csv",
-    "WiseEdit_Complex_2.csv",
-    "WiseEdit_Complex_3.csv",
-    "WiseEdit_Complex_4.csv",
-]
-
-ALL_METRICS = [
-    "detail_preserving",
-    "instruction_following",
-    "visual_quality",
-    "knowledge_fidelity",
-    "creative_fusion",
-]  # all metrics could be used to eval
-
-METRIC_SCORE_KEYS = {
-    "detail_preserving": "DP_score",
-    "instruction_following": "IF_score",
-    "visual_quality": "VQ_score",
-    "knowledge_fidelity": "KF_score",
-    "creative_fusion": "CF_score",
-}  # print out word
-
-CSV_METRICS = {
-    "Imagination_1.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "creative_fusion",
-    ],
-    "Imagination_2.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "creative_fusion",
-    ],
-    "Imagination_3.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "creative_fusion",
-    ],
-    "Imagination_4.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "creative_fusion",
-    ],
-    "Imagination_5.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "creative_fusion",
-    ],
-    "Awareness_1.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "knowledge_fidelity",
-    ],
-    "Awareness_2.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "knowledge_fidelity",
-    ],
-    "Interpretation_1.csv": [
-        "detail_preserving",
-        "instruction_following",
-        "visual_quality",
-        "knowledge_fidelity",
-    ],
-}   # different metrics to different task, no setting in this will use default metrics(all metrics)
-DEFAULT_METRICS = ALL_METRICS
+
+# Result images of every evaluated model (keyed by its result_img_root), scanned once per subset;
+# models without a manifest probe the filesystem per image
+RESULT_MANIFESTS: Dict[str, ResultManifest] = {}
 
 
 # =====================================================
 
 def find_edited_image(subset_name: str, lang: str, idx: str, result_img_root: Optional[str] = None,) -> Optional[str]:
     folder = os.path.join(result_img_root, subset_name, lang)
+    manifest = RESULT_MANIFESTS.get(result_img_root)
+    if manifest is not None and manifest.covers(result_img_root, subset_name):
+        p = manifest.lookup(subset_name, lang, idx)
+        if p is None:
+            logging.error(f"[{subset_name}] {lang} result image for idx={idx} not found in {folder}")
+        return p
     for ext in [".png", ".jpg", ".jpeg", ".webp"]:
         p = os.path.join(folder, f"{idx}{ext}")
         if os.path.exists(p):
@@ -156,22 +165,98 @@ def _row_is_fully_scored(
     return True
 
 
-def run_eval_for_one_csv(
+def parse_ref_paths(row: dict, dataset_root: Optional[str] = None) -> List[str]:
+    ref_raw = row.get("ref", "")
+    ref_col = ref_raw.strip() if isinstance(ref_raw, str) else ""
+    ref_paths: List[str] = []
+    if ref_col:
+        try:
+            obj = json.loads(ref_col)
+            if isinstance(obj, list):
+                ref_paths = [str(x).strip() for x in obj if str(x).strip()]
+            elif isinstance(obj, str):
+                ref_paths = [obj.strip()]
+        except Exception:
+            for sep in ["|", ";"]:
+                if sep in ref_col:
+                    ref_paths = [p.strip() for p in ref_col.split(sep) if p.strip()]
+                    break
+            if not ref_paths:
+                ref_paths = [ref_col]
+
+    if dataset_root and ref_paths:
+        ref_paths = [os.path.join(dataset_root, p) for p in ref_paths]
+    return ref_paths
+
+
+def _known_scores(erow: Optional[dict], lang: str) -> Dict[str, int]:
+    """Integer scores of one language already present in an existing / replayed score row."""
+    known: Dict[str, int] = {}
+    if not erow:
+        return known
+    for m in ALL_METRICS:
+        val = erow.get(f"{METRIC_SCORE_KEYS[m]}_{lang}")
+        if val is None or not str(val).strip():
+            continue
+        try:
+            known[m] = int(str(val).strip())
+        except Exception:
+            continue
+    return known
+
+
+@dataclass
+class SubsetJob:
+    """State of one CSV to be evaluated: base rows, resume info and rows still to score."""
+    csv_path: str
+    subset_name: str
+    num_inputs: Optional[int]
+    metrics_to_eval: List[str]
+    out_csv_path: str
+    rows: List[dict]
+    out_fieldnames: List[str]
+    existing_rows_by_idx: Dict[str, dict] = field(default_factory=dict)
+    to_eval_rows: List[Tuple[str, dict]] = field(default_factory=list)
+    journal: Optional[ScoreJournal] = None
+    model_tag: Optional[str] = None
+    result_img_root: Optional[str] = None
+    # scheduling key of the subset: its name, or "<model>/<subset>" when several models run together
+    key: str = ""
+
+    def __post_init__(self):
+        if not self.key:
+            self.key = self.subset_name
+
+
+@functools.lru_cache(maxsize=None)
+def read_benchmark_csv(csv_path: str) -> Tuple[List[dict], List[str]]:
+    """Rows and field names of a benchmark CSV, parsed once per process and shared by all models (read-only)."""
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f_in:
+        reader = csv.DictReader(f_in)
+        rows = list(reader)
+        return rows, reader.fieldnames or []
+
+
+def load_subset_job(
     csv_path: str,
-    max_workers: int = 5,
-    model_name: str = None,
-    api_key: str = None,
-    base_url: str = None,
     model_tag: str = None,
     result_img_root: Optional[str] = None,
     score_output_root: Optional[str] = None,
-    dataset_root: str = None,
-) -> None:
+    key_by_model: bool = False,
+    shard: Optional[Shard] = None,
+    read_only: bool = False,
+) -> Optional[SubsetJob]:
     """
-    Multi-thread evaluate one CSV file and save results to score_<subset_name>.csv.
+    Read one CSV and its existing score file (if any). Returns None if the subset
+    is skipped (no result dir) or already fully scored. With `key_by_model` (several
+    models in one run) the job is keyed and logged as "<model_tag>/<subset>".
+    With `shard`, only the rows hashed into that shard are kept and scores go to the
+    per-shard file score_<subset>.shard-<i>-of-<N>.csv (see merge_shards.py).
+    With `read_only` (--dry_run) nothing is created: no score folder and no journal.
     """
     subset_name = os.path.splitext(os.path.basename(csv_path))[0]
     csv_filename = os.path.basename(csv_path)
+    key = f"{model_tag}/{subset_name}" if key_by_model else subset_name
 
     num_inputs: Optional[int] = None
     last_part = subset_name.split("_")[-1]
@@ -182,25 +267,32 @@ def run_eval_for_one_csv(
     subset_dir = os.path.join(result_img_root, subset_name)
     if not os.path.exists(subset_dir):
         logging.warning(
-            f"[{subset_name}] Skipped — result directory not found: {subset_dir}"
+            f"[{key}] Skipped — result directory not found: {subset_dir}"
         )
-        return
+        return None
 
     logging.info(
         f"Start evaluating CSV: {csv_path} "
         f"(subset={subset_name}, model={model_tag}, num_inputs={num_inputs}, metrics={metrics_to_eval})"
     )
 
-    os.makedirs(score_output_root, exist_ok=True)
-    out_csv_path = os.path.join(
+    if not read_only:
+        os.makedirs(score_output_root, exist_ok=True)
+    merged_csv_path = os.path.join(
         score_output_root,
         f"score_{subset_name}.csv"
     )
-
-    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f_in:
-        reader = csv.DictReader(f_in)
-        rows = list(reader)
-        fieldnames = reader.fieldnames or []
+    out_csv_path = shard_path(merged_csv_path, shard)
+
+    rows, fieldnames = read_benchmark_csv(csv_path)
+    if shard is not None:
+        shard_rows = []
+        for row in rows:
+            idx_val = row.get("idx") or row.get("\ufeffidx")
+            if idx_val is not None and in_shard(subset_name, str(idx_val).strip(), shard):
+                shard_rows.append(row)
+        logging.info(f"[{key}] shard {shard[0]}/{shard[1]}: {len(shard_rows)} of {len(rows)} rows")
+        rows = shard_rows
 
     score_fields_cn: List[str] = []
     score_fields_en: List[str] = []
@@ -213,9 +305,14 @@ def run_eval_for_one_csv(
     processed_idx: set[str] = set()
     existing_rows_by_idx: Dict[str, dict] = {}
 
-    if os.path.exists(out_csv_path):
-        logging.info(f"[{subset_name}] Found existing score file, will reuse: {out_csv_path}")
-        with open(out_csv_path, "r", encoding="utf-8-sig", newline="") as f_exist:
+    existing_csv_path = out_csv_path
+    if shard is not None and not os.path.exists(out_csv_path) and os.path.exists(merged_csv_path):
+        # a shard starts from the merged score file of an earlier run
+        existing_csv_path = merged_csv_path
+
+    if os.path.exists(existing_csv_path):
+        logging.info(f"[{key}] Found existing score file, will reuse: {existing_csv_path}")
+        with open(existing_csv_path, "r", encoding="utf-8-sig", newline="") as f_exist:
             exist_reader = csv.DictReader(f_exist)
             for erow in exist_reader:
                 eidx = erow.get("idx") or erow.get("\ufeffidx")
@@ -226,21 +323,43 @@ def run_eval_for_one_csv(
                     continue
                 existing_rows_by_idx[idx_str] = erow
 
-        for idx_str, erow in existing_rows_by_idx.items():
-            if _row_is_fully_scored(erow, metrics_to_eval):
-                processed_idx.add(idx_str)
-
+    else:
+        logging.info(f"[{key}] No existing score file, start fresh.")
+
+    # Results of an interrupted run that never reached the score CSV
+    journal_path = score_journal_path(out_csv_path)
+    journal_scores = ScoreJournal.replay(journal_path)
+    if journal_scores:
+        rows_by_idx = {}
+        for row in rows:
+            idx_val = row.get("idx") or row.get("\ufeffidx")
+            if idx_val is not None and str(idx_val).strip():
+                rows_by_idx[str(idx_val).strip()] = row
+        replayed = 0
+        for idx_str, by_lang in journal_scores.items():
+            if idx_str not in rows_by_idx:
+                continue
+            erow = existing_rows_by_idx.setdefault(idx_str, rows_by_idx[idx_str].copy())
+            for lang, by_metric in by_lang.items():
+                for m, score in by_metric.items():
+                    if m in METRIC_SCORE_KEYS:
+                        erow[f"{METRIC_SCORE_KEYS[m]}_{lang}"] = score
+                        replayed += 1
+        logging.info(f"[{key}] Replayed {replayed} judge results from journal: {journal_path}")
+
+    for idx_str, erow in existing_rows_by_idx.items():
+        if _row_is_fully_scored(erow, metrics_to_eval):
+            processed_idx.add(idx_str)
+
+    if existing_rows_by_idx:
         logging.info(
-            f"[{subset_name}] existing score file rows = {len(existing_rows_by_idx)}, "
+            f"[{key}] existing score rows = {len(existing_rows_by_idx)}, "
             f"fully-scored idx count = {len(processed_idx)}"
         )
-    else:
-        logging.info(f"[{subset_name}] No existing score file, start fresh.")
 
     to_eval_rows: List[Tuple[str, dict]] = []
-    idx_order: Dict[str, int] = {}
 
-    for order, row in enumerate(rows):
+    for row in rows:
         idx_val = row.get("idx") or row.get("\ufeffidx")
         if idx_val is None:
             logging.warning("Found row with empty idx, skip.")
@@ -250,151 +369,44 @@ def run_eval_for_one_csv(
             logging.warning("Found row with empty idx (after strip), skip.")
             continue
 
-        idx_order[idx_str] = order
         if idx_str in processed_idx:
             continue
 
         to_eval_rows.append((idx_str, row))
 
     logging.info(
-        f"[{subset_name}] total rows = {len(rows)}, "
+        f"[{key}] total rows = {len(rows)}, "
         f"need evaluation = {len(to_eval_rows)}"
     )
 
-    if len(to_eval_rows) == 0 and os.path.exists(out_csv_path):
-        logging.info(f"[{subset_name}] All rows already fully scored. Skip re-evaluation.")
-        return
-
-    # Multi-thread evaluation: each thread handles one row
-    def eval_single_row(idx_str: str, row: dict, dataset_root: str) -> Tuple[str, Dict[str, Optional[int]], Dict[str, Optional[int]]]:
-        scores_cn: Dict[str, Optional[int]] = {m: None for m in ALL_METRICS}
-        scores_en: Dict[str, Optional[int]] = {m: None for m in ALL_METRICS}
-        input_paths, is_multi = collect_input_images(row, num_inputs, dataset_root)
-
-        instr = row.get("prompt", "")
-        hint = row.get("hint", "").strip() or None
-
-        ref_raw = row.get("ref", "")
-        ref_col = ref_raw.strip() if isinstance(ref_raw, str) else ""
-        ref_paths: List[str] = []
-        if ref_col:
-            try:
-                obj = json.loads(ref_col)
-                if isinstance(obj, list):
-                    ref_paths = [str(x).strip() for x in obj if str(x).strip()]
-                elif isinstance(obj, str):
-                    ref_paths = [obj.strip()]
-            except Exception:
-                for sep in ["|", ";"]:
-                    if sep in ref_col:
-                        ref_paths = [p.strip() for p in ref_col.split(sep) if p.strip()]
-                        break
-                if not ref_paths:
-                    ref_paths = [ref_col]
-
-        if dataset_root and ref_paths:
-            ref_paths = [os.path.join(dataset_root, p) for p in ref_paths]
-
-        edited_cn = find_edited_image(subset_name, "cn", idx_str, result_img_root=result_img_root)
-        edited_en = find_edited_image(subset_name, "en", idx_str, result_img_root=result_img_root)
-
-        if instr.strip() and metrics_to_eval:
-            if edited_cn:
-                try:
-                    sc = evaluate_example_with_gpt(
-                        input_image_paths=input_paths,
-                        is_multi_input=is_multi,
-                        edited_image_path=edited_cn,
-                        instruction=instr,
-                        metrics=metrics_to_eval,
-                        hint=hint,
-                        ref_image_paths=ref_paths if ref_paths else None,
-                        model_name=model_name,
-                        api_key=api_key,
-                        base_url=base_url,
-                    )
-                    for m in ALL_METRICS:
-                        if m in sc:
-                            scores_cn[m] = sc[m]
-                except Exception as e:
-                    logging.error(f"[{subset_name}] Error evaluating CN idx={idx_str}: {e}", exc_info=True)
-            else:
-                logging.warning(
-                    f"[{subset_name}] no CN image for idx={idx_str}, "
-                    f"set required CN metrics to 0."
-                )
-                for m in metrics_to_eval:
-                    if m in ALL_METRICS:
-                        scores_cn[m] = 0
-        else:
-            logging.warning(
-                f"[{subset_name}] skip CN eval for idx={idx_str} "
-                f"(no prompt or no metrics_to_eval)."
-            )
-
-        if instr.strip() and metrics_to_eval:
-            if edited_en:
-                try:
-                    sc = evaluate_example_with_gpt(
-                        input_image_paths=input_paths,
-                        is_multi_input=is_multi,
-                        edited_image_path=edited_en,
-                        instruction=instr,
-                        metrics=metrics_to_eval,
-                        hint=hint,
-                        ref_image_paths=ref_paths if ref_paths else None,
-                        model_name=model_name,
-                        api_key=api_key,
-                        base_url=base_url,
-                    )
-                    for m in ALL_METRICS:
-                        if m in sc:
-                            scores_en[m] = sc[m]
-                except Exception as e:
-                    logging.error(f"[{subset_name}] Error evaluating EN idx={idx_str}: {e}", exc_info=True)
-            else:
-                logging.warning(
-                    f"[{subset_name}] no EN image for idx={idx_str}, "
-                    f"set required EN metrics to 0."
-                )
-                for m in metrics_to_eval:
-                    if m in ALL_METRICS:
-                        scores_en[m] = 0
-        else:
-            logging.warning(
-                f"[{subset_name}] skip EN eval for idx={idx_str} "
-                f"(no prompt or no metrics_to_eval)."
-            )
-
-        cn_str = ", ".join(f"{m}={scores_cn[m]}" for m in ALL_METRICS)
-        en_str = ", ".join(f"{m}={scores_en[m]}" for m in ALL_METRICS)
-        logging.info(f"[{subset_name}] idx={idx_str} CN scores: {cn_str}")
-        logging.info(f"[{subset_name}] idx={idx_str} EN scores: {en_str}")
-
-        return idx_str, scores_cn, scores_en
-
-    # Start the thread pool.
-    new_scores_by_idx: Dict[str, Tuple[Dict[str, Optional[int]], Dict[str, Optional[int]]]] = {}
-
-    if to_eval_rows:
-        logging.info(f"[{subset_name}] Start ThreadPoolExecutor with max_workers={max_workers}")
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_idx = {}
-            for idx_str, row in to_eval_rows:
-                fut = executor.submit(eval_single_row, idx_str, row, dataset_root)
-                future_to_idx[fut] = idx_str
+    if len(to_eval_rows) == 0 and os.path.exists(out_csv_path) and not journal_scores:
+        logging.info(f"[{key}] All rows already fully scored. Skip re-evaluation.")
+        return None
+
+    return SubsetJob(
+        csv_path=csv_path,
+        subset_name=subset_name,
+        num_inputs=num_inputs,
+        metrics_to_eval=metrics_to_eval,
+        out_csv_path=out_csv_path,
+        rows=rows,
+        out_fieldnames=out_fieldnames,
+        existing_rows_by_idx=existing_rows_by_idx,
+        to_eval_rows=to_eval_rows,
+        journal=None if read_only else ScoreJournal(journal_path),
+        model_tag=model_tag,
+        result_img_root=result_img_root,
+        key=key,
+    )
 
-            for fut in as_completed(future_to_idx):
-                idx_str = future_to_idx[fut]
-                try:
-                    idx_ret, scores_cn, scores_en = fut.result()
-                    new_scores_by_idx[idx_ret] = (scores_cn, scores_en)
-                except Exception as e:
-                    logging.error(f"[{subset_name}] Failed processing idx={idx_str}: {e}", exc_info=True)
 
+def write_subset_scores(
+    job: SubsetJob,
+    new_scores_by_idx: Dict[str, Tuple[Dict[str, Optional[int]], Dict[str, Optional[int]]]],
+) -> None:
     final_rows: List[dict] = []
 
-    for row in rows:
+    for row in job.rows:
         idx_val = row.get("idx") or row.get("\ufeffidx")
         if idx_val is None:
             continue
@@ -402,7 +414,7 @@ def run_eval_for_one_csv(
         if not idx_str:
             continue
 
-        base_row = existing_rows_by_idx.get(idx_str, row.copy())
+        base_row = job.existing_rows_by_idx.get(idx_str, row.copy())
 
         for m in ALL_METRICS:
             base_key = METRIC_SCORE_KEYS[m]
@@ -420,25 +432,1108 @@ def run_eval_for_one_csv(
 
         final_rows.append(base_row)
 
-    with open(out_csv_path, "w", encoding="utf-8-sig", newline="") as f_out:
-        writer = csv.DictWriter(f_out, fieldnames=out_fieldnames)
+    # write to a temp file and rename, so a crash never leaves a truncated score CSV
+    # per process: cooperating --worker processes may write the same finished subset
+    tmp_path = f"{job.out_csv_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f_out:
+        writer = csv.DictWriter(f_out, fieldnames=job.out_fieldnames)
         writer.writeheader()
         for row in final_rows:
             writer.writerow(row)
+        f_out.flush()
+        os.fsync(f_out.fileno())
+    os.replace(tmp_path, job.out_csv_path)
+
+    # everything in the journal is in the CSV now
+    if job.journal is not None:
+        job.journal.remove()
 
-    logging.info(f"[{subset_name}] Done. Result written to: {out_csv_path}")
+    logging.info(f"[{job.key}] Done. Result written to: {job.out_csv_path}")
+
+
+def prepare_row_inputs(
+    job: SubsetJob,
+    idx_str: str,
+    row: dict,
+    result_img_root: Optional[str] = None,
+    dataset_root: Optional[str] = None,
+) -> dict:
+    """Resolve everything needed to judge one row: input / ref paths, prompt, hint and the CN / EN edited images."""
+    input_paths, is_multi = collect_input_images(row, job.num_inputs, dataset_root)
+    ref_paths = parse_ref_paths(row, dataset_root)
+    return {
+        "input_paths": input_paths,
+        "is_multi": is_multi,
+        "instr": row.get("prompt", ""),
+        "hint": row.get("hint", "").strip() or None,
+        "ref_paths": ref_paths,
+        "edited": {
+            lang: find_edited_image(job.subset_name, lang, idx_str, result_img_root=job.result_img_root or result_img_root)
+            for lang in ("cn", "en")
+        },
+    }
+
+
+def _log_row_scores(
+    subset_name: str,
+    idx_str: str,
+    scores_cn: Dict[str, Optional[int]],
+    scores_en: Dict[str, Optional[int]],
+) -> None:
+    cn_str = ", ".join(f"{m}={scores_cn[m]}" for m in ALL_METRICS)
+    en_str = ", ".join(f"{m}={scores_en[m]}" for m in ALL_METRICS)
+    logging.info(f"[{subset_name}] idx={idx_str} CN scores: {cn_str}")
+    logging.info(f"[{subset_name}] idx={idx_str} EN scores: {en_str}")
+
+
+def _lang_needs_eval(job: SubsetJob, idx_str: str, inputs: dict, lang: str, scores: Dict[str, Optional[int]]) -> bool:
+    """Return whether `lang` of this row should be sent to the judge; otherwise fill `scores` as the old flow did."""
+    if not (inputs["instr"].strip() and job.metrics_to_eval):
+        logging.warning(
+            f"[{job.key}] skip {lang.upper()} eval for idx={idx_str} "
+            f"(no prompt or no metrics_to_eval)."
+        )
+        return False
+    if not inputs["edited"][lang]:
+        logging.warning(
+            f"[{job.key}] no {lang.upper()} image for idx={idx_str}, "
+            f"set required {lang.upper()} metrics to 0."
+        )
+        for m in job.metrics_to_eval:
+            if m in ALL_METRICS:
+                scores[m] = 0
+        return False
+    return True
+
+
+def _share_identical_langs(inputs: dict, tasks_by_lang: Dict[str, List[JudgeTask]]) -> List[JudgeTask]:
+    """
+    If the CN and EN edited images of a row are byte-identical, their judge requests are
+    identical too (same instruction, input / ref images and hint): EN tasks with a CN
+    twin are dropped and the CN task records its result for both languages.
+    """
+    cn_tasks, en_tasks = tasks_by_lang.get("cn", []), tasks_by_lang.get("en", [])
+    if not cn_tasks or not en_tasks or not same_content(inputs["edited"]["cn"], inputs["edited"]["en"]):
+        return cn_tasks + en_tasks
+    en_by_metric = {(t.metric, t.metrics): t for t in en_tasks}
+    tasks: List[JudgeTask] = []
+    for t in cn_tasks:
+        if en_by_metric.pop((t.metric, t.metrics), None) is not None:
+            t = replace(t, mirrors=("en",))
+        tasks.append(t)
+    shared = len(en_tasks) - len(en_by_metric)
+    if shared:
+        TELEMETRY.count_deduplicated(shared)
+    return tasks + list(en_by_metric.values())
+
+
+def _interleave_rows(jobs: List[SubsetJob]) -> List[Tuple[SubsetJob, str, dict]]:
+    """Pending rows of jobs of the same CSV (one per model), row by row: idx 1 of every model, then idx 2, ..."""
+    order: Dict[str, int] = {}
+    for job in jobs:
+        for idx_str, _row in job.to_eval_rows:
+            order.setdefault(idx_str, len(order))
+    entries = [
+        (order[idx_str], j, job, idx_str, row)
+        for j, job in enumerate(jobs)
+        for idx_str, row in job.to_eval_rows
+    ]
+    entries.sort(key=lambda e: (e[0], e[1]))
+    return [(job, idx_str, row) for _pos, _j, job, idx_str, row in entries]
+
+
+def plan_judge_tasks(
+    jobs: List[SubsetJob],
+    assembler: ScoreAssembler,
+    result_img_root: Optional[str] = None,
+    dataset_root: Optional[str] = None,
+    combined: bool = False,
+) -> Tuple[List[JudgeTask], Dict[Tuple[str, str], dict]]:
+    """
+    Flatten all pending rows of all subsets into one list of (subset, idx, lang, metric)
+    judge tasks, in CSV / row order. Rows are registered with the assembler; languages
+    that cannot be judged (no prompt, missing edited image) get their scores filled directly,
+    and scores already in the score CSV / journal are reused instead of judged again.
+    With `combined`, the metrics still to judge of one language form a single task.
+    Rows with byte-identical CN / EN edited images send each request once for both.
+    Jobs of the same CSV for several models are planned row by row across the models,
+    so the input and reference images of a row are encoded once for all of them.
+    Returns the tasks and the resolved row inputs keyed by (job key, idx).
+    """
+    tasks: List[JudgeTask] = []
+    inputs_by_row: Dict[Tuple[str, str], dict] = {}
+    planned_rows = 0
+
+    jobs_by_csv: Dict[str, List[SubsetJob]] = {}
+    for job in jobs:
+        jobs_by_csv.setdefault(job.csv_path, []).append(job)
+
+    for csv_jobs in jobs_by_csv.values():
+        for job, idx_str, row in _interleave_rows(csv_jobs):
+            planned_rows += 1
+            inputs = prepare_row_inputs(job, idx_str, row, result_img_root, dataset_root)
+            inputs_by_row[(job.key, idx_str)] = inputs
+            erow = job.existing_rows_by_idx.get(idx_str)
+            scores = assembler.empty_row_scores()
+            tasks_by_lang: Dict[str, List[JudgeTask]] = {}
+            for lang in LANGS:
+                if not _lang_needs_eval(job, idx_str, inputs, lang, scores[lang]):
+                    continue
+                known = _known_scores(erow, lang)
+                lang_tasks: List[JudgeTask] = []
+                for metric in job.metrics_to_eval:
+                    if metric not in ALL_METRICS:
+                        logging.warning(f"Unknown metric '{metric}', skip.")
+                        continue
+                    if metric in known:
+                        scores[lang][metric] = known[metric]
+                        continue
+                    lang_tasks.append(JudgeTask(job.key, idx_str, lang, metric))
+                if combined and len(lang_tasks) > 1:
+                    metrics = tuple(t.metric for t in lang_tasks)
+                    lang_tasks = [JudgeTask(job.key, idx_str, lang, "+".join(metrics), metrics)]
+                tasks_by_lang[lang] = lang_tasks
+            row_tasks = _share_identical_langs(inputs, tasks_by_lang)
+            assembler.add_row(job.key, idx_str, scores, row_tasks)
+            tasks.extend(row_tasks)
+        for job in csv_jobs:
+            assembler.seal_subset(job.key)
+
+    TELEMETRY.add_planned(len(tasks), planned_rows)
+    return tasks, inputs_by_row
+
+
+def start_image_prefetch(
+    tasks: List[JudgeTask],
+    inputs_by_row: Dict[Tuple[str, str], dict],
+    window: int,
+) -> Optional[ImagePrefetcher]:
+    """
+    Start encoding the images of the rows of `tasks` into the image cache, in task
+    order and at most `window` rows ahead of the judge workers. None if window is 0.
+    """
+    if window <= 0 or not tasks:
+        return None
+    # (path, profile) jobs per row, in the order encode_example_images() needs them
+    rows: Dict[Tuple[str, str], Dict[tuple, None]] = {}
+    for task in tasks:
+        key = (task.subset, task.idx)
+        inputs = inputs_by_row[key]
+        metric = None if task.metrics else task.metric
+        jobs = rows.setdefault(key, {})
+        for role, paths in (
+            ("input", inputs["input_paths"]),
+            ("edited", [inputs["edited"][task.lang]]),
+            ("ref", inputs["ref_paths"] or []),
+        ):
+            for p in paths:
+                if p:
+                    jobs[(p, IMAGE_PROFILES.resolve(metric, role))] = None
+    return ImagePrefetcher(
+        lambda job: encode_image_to_base64(job[0], profile=job[1]),
+        window=window,
+        threads=os.cpu_count() or 4,
+    ).start([(key, list(jobs)) for key, jobs in rows.items()])
+
+
+def preflight_jobs(
+    jobs: List[SubsetJob],
+    manifest: ResultManifest,
+    workers: int,
+    report_path: Optional[str],
+    label: str = "",
+) -> bool:
+    """
+    Check the result images of every row of `jobs` (all of one model) before any judge
+    request: log missing, corrupt and unexpected files per subset / language and write
+    them to `report_path` (if not None). `label` prefixes the log lines (the model tag in multi-model runs).
+    Returns False if a row still to be judged has a missing or corrupt image.
+    """
+    expected: Dict[str, List[str]] = {}
+    for job in jobs:
+        idx_list = []
+        for row in job.rows:
+            idx_val = row.get("idx") or row.get("\ufeffidx")
+            if idx_val is not None and str(idx_val).strip():
+                idx_list.append(str(idx_val).strip())
+        expected[job.subset_name] = idx_list
+    results = run_preflight(manifest, expected, workers=workers)
+    name = f"Preflight {label}" if label else "Preflight"
+    for line in preflight_lines(results):
+        logging.info(f"{name} {line}")
+    if report_path is not None:
+        write_preflight_report(results, report_path)
+
+    pending = {(job.subset_name, idx_str) for job in jobs for idx_str, _row in job.to_eval_rows}
+    blocking = sum(
+        1
+        for r in results
+        for idx in list(r.missing) + list(r.corrupt)
+        if (r.subset, idx) in pending
+    )
+    if blocking:
+        logging.error(f"{name}: {blocking} result images of rows still to be judged are missing or corrupt.")
+    return blocking == 0
+
+
+def dry_run_jobs(
+    jobs: List[SubsetJob],
+    args: argparse.Namespace,
+    score_output_roots: Dict[str, str],
+    shard: Optional[Shard] = None,
+) -> None:
+    """
+    Plan the judge tasks of `jobs` exactly as a real run would (same CSVs, same resume
+    state) and log the projected calls, tokens, cost and wall time; nothing is sent.
+    With --dry_run_plan, each model of `score_output_roots` (model tag -> score folder) gets its
+    own dry_run_plan.csv; otherwise nothing is written.
+    """
+    # no callbacks: rows that need no judge call must not be written to the score CSVs
+    assembler = ScoreAssembler(ALL_METRICS)
+    tasks, inputs_by_row = plan_judge_tasks(
+        jobs, assembler, None, args.dataset_dir, combined=args.combined_metrics,
+    )
+    batch = args.mode == "batch" or bool(args.batch_output_file)
+    history = completion_history(find_cost_reports(args.score_output_root), args.eval_model)
+    plan = estimate_plan(
+        tasks,
+        inputs_by_row,
+        args.eval_model,
+        completion_tokens=history,
+        discount=BATCH_DISCOUNT if batch else 1.0,
+        workers=args.preflight_workers,
+    )
+
+    logging.info(
+        f"Dry run: {len(tasks)} pending judge calls for {len(inputs_by_row)} rows "
+        f"({TELEMETRY.dedup_tasks} more shared by identical CN / EN images; "
+        f"completion tokens {'from earlier cost reports' if history else 'assumed'}; "
+        f"answers already in the judge response cache are counted too):"
+    )
+    for line in plan_lines(plan):
+        logging.info(f"   {line}")
+    total = plan_total(plan)
+    if batch:
+        logging.info(f"Dry run: projected cost ${total.cost:.4f} at Batch API prices; batches complete within 24h.")
+    else:
+        concurrency = args.max_in_flight if args.engine == "async" else args.num_workers
+        seconds, bound = project_wall_time(total, concurrency, args.assumed_latency, rpm=args.rpm, tpm=args.tpm)
+        logging.info(f"Dry run: projected cost ${total.cost:.4f}, wall time {format_duration(seconds)} (bounded by {bound}).")
+    if not args.dry_run_plan:
+        return
+    for model_tag, score_output_root in score_output_roots.items():
+        os.makedirs(score_output_root, exist_ok=True)
+        subset_names = {job.key: job.subset_name for job in jobs if job.model_tag == model_tag}
+        model_plan = {
+            (subset_names[key], metric, lang): t
+            for (key, metric, lang), t in plan.items()
+            if key in subset_names
+        }
+        write_plan(model_plan, shard_path(os.path.join(score_output_root, "dry_run_plan.csv"), shard))
+
+
+def _make_assembler(jobs: List[SubsetJob]) -> ScoreAssembler:
+    jobs_by_subset = {job.key: job for job in jobs}
+
+    def on_row_done(subset: str, idx_str: str, scores: Dict[str, Dict[str, Optional[int]]]) -> None:
+        TELEMETRY.row_done()
+        _log_row_scores(subset, idx_str, scores["cn"], scores["en"])
+
+    def on_subset_done(subset: str, scores_by_idx: Dict[str, Dict[str, Dict[str, Optional[int]]]]) -> None:
+        new_scores_by_idx = {idx: (sc["cn"], sc["en"]) for idx, sc in scores_by_idx.items()}
+        write_subset_scores(jobs_by_subset[subset], new_scores_by_idx)
+
+    return ScoreAssembler(ALL_METRICS, on_row_done=on_row_done, on_subset_done=on_subset_done)
+
+
+def _record_result(
+    jobs_by_subset: Dict[str, SubsetJob],
+    assembler: ScoreAssembler,
+    task: JudgeTask,
+    scores: Dict[str, Optional[int]],
+) -> None:
+    # journal first: once a result is recorded, a crash can no longer lose it
+    journal = jobs_by_subset[task.subset].journal
+    if journal is not None:
+        for lang in task.langs():
+            for metric, score in scores.items():
+                journal.append(task.idx, lang, metric, score)
+    TELEMETRY.task_done()
+    assembler.record(task, scores)
+
+
+def _save_interrupted(jobs: List[SubsetJob], assembler: ScoreAssembler) -> None:
+    """After an interrupt, write what we have of every unfinished subset (journals are kept until then)."""
+    for job in jobs:
+        scores_by_idx = assembler.snapshot(job.key)
+        if scores_by_idx is None:
+            continue
+        new_scores_by_idx = {idx: (sc["cn"], sc["en"]) for idx, sc in scores_by_idx.items()}
+        write_subset_scores(job, new_scores_by_idx)
+        logging.warning(f"[{job.key}] Interrupted, partial scores saved; rerun to resume.")
+
+
+def judge_one_task(
+    task: JudgeTask,
+    inputs: dict,
+    client,
+    model_name: str,
+    api_key: str,
+    base_url: str,
+    max_retries: int,
+    budget: Optional[Budget] = None,
+) -> Dict[str, Optional[int]]:
+    """Send one judge task (one metric, or all metrics of a combined task) with the shared client; metric -> score."""
+    kwargs = dict(
+        input_image_paths=inputs["input_paths"],
+        is_multi_input=inputs["is_multi"],
+        edited_image_path=inputs["edited"][task.lang],
+        instruction=inputs["instr"],
+        hint=inputs["hint"],
+        ref_image_paths=inputs["ref_paths"] if inputs["ref_paths"] else None,
+        max_retries=max_retries,
+        model_name=model_name,
+        api_key=api_key,
+        base_url=base_url,
+        client=client,
+    )
+    if task.metrics:
+        return evaluate_metrics_combined_with_gpt(metrics=list(task.metrics), budget=budget, **kwargs)
+    return {task.metric: evaluate_metric_with_gpt(metric=task.metric, **kwargs)}
+
+
+class GracefulStop:
+    """
+    SIGINT handler for an evaluation run: the first Ctrl-C stops scheduling new judge
+    requests and lets in-flight ones finish (their results are journaled and saved);
+    a second Ctrl-C aborts immediately.
+    """
+
+    def __init__(self):
+        self.requested = False
+        self._previous = None
+
+    def _handle(self, signum, frame) -> None:
+        if self.requested:
+            raise KeyboardInterrupt
+        self.requested = True
+        logging.warning("Interrupt received: draining in-flight judge requests, press Ctrl-C again to abort.")
+
+    def __enter__(self) -> "GracefulStop":
+        if threading.current_thread() is threading.main_thread():
+            self._previous = signal.signal(signal.SIGINT, self._handle)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._previous is not None:
+            signal.signal(signal.SIGINT, self._previous)
+
+
+def run_eval_all(
+    jobs: List[SubsetJob],
+    max_workers: int = 5,
+    model_name: str = None,
+    api_key: str = None,
+    base_url: str = None,
+    result_img_root: Optional[str] = None,
+    dataset_root: str = None,
+    max_retries: int = 5,
+    combined: bool = False,
+    budget: Optional[Budget] = None,
+    prefetch_rows: int = 0,
+) -> bool:
+    """
+    Evaluate all subsets with one global thread pool fed by (subset, idx, lang, metric)
+    judge tasks. Rows are logged and score_<subset>.csv files written as soon as their
+    last task completes, so no CSV waits for another and no worker idles on a per-CSV tail.
+    Every result is journaled as it arrives. Returns False if the run was interrupted
+    or stopped by the budget.
+    """
+    # All tasks share the process-wide client and its connection pool
+    client = get_client(api_key, base_url)
+    jobs_by_subset = {job.key: job for job in jobs}
+    assembler = _make_assembler(jobs)
+    tasks, inputs_by_row = plan_judge_tasks(jobs, assembler, result_img_root, dataset_root, combined)
+    if not tasks:
+        return True
+    prefetcher = start_image_prefetch(tasks, inputs_by_row, prefetch_rows)
+
+    def run_task(task: JudgeTask, queued_at: float) -> Optional[Dict[str, Optional[int]]]:
+        if budget is not None and budget.exhausted():
+            return None
+        if prefetcher is not None:
+            prefetcher.row_started((task.subset, task.idx))
+        TELEMETRY.task_started()
+        with trace_task(task.subset, task.idx, task.lang, task.metric), usage_tags(task.subset, task.lang):
+            emit_since("queue", queued_at)
+            with span("task"):
+                return judge_task(task)
+
+    def judge_task(task: JudgeTask) -> Dict[str, Optional[int]]:
+        return judge_one_task(
+            task, inputs_by_row[(task.subset, task.idx)], client, model_name, api_key, base_url, max_retries, budget
+        )
+
+    logging.info(f"Start global ThreadPoolExecutor with max_workers={max_workers} for {len(tasks)} judge tasks")
+    with GracefulStop() as stop, (prefetcher or contextlib.nullcontext()), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_task = {executor.submit(run_task, task, time.monotonic()): task for task in tasks}
+        pending = set(future_to_task)
+        cancelled = False
+        skipped = 0
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.cancelled():
+                    skipped += 1
+                    continue
+                task = future_to_task[fut]
+                try:
+                    scores = fut.result()
+                    if scores is None:
+                        skipped += 1
+                        continue
+                except JudgeUnavailableError as e:
+                    logging.error(f"[{task.subset}] {task.lang.upper()} idx={task.idx}: {e}. Score left empty for resume.")
+                    scores = {m: None for m in task.judged_metrics()}
+                except Exception as e:
+                    logging.error(
+                        f"[{task.subset}] Error evaluating {task.lang.upper()} idx={task.idx} [{task.metric}]: {e}",
+                        exc_info=True,
+                    )
+                    scores = {m: None for m in task.judged_metrics()}
+                _record_result(jobs_by_subset, assembler, task, scores)
+            if (stop.requested or (budget is not None and budget.exhausted())) and not cancelled:
+                # queued tasks never start; running ones are drained by the loop
+                for fut in pending:
+                    fut.cancel()
+                cancelled = True
+
+    if skipped:
+        _save_interrupted(jobs, assembler)
+        return False
+    return True
+
+
+def run_eval_for_one_csv(
+    csv_path: str,
+    max_workers: int = 5,
+    model_name: str = None,
+    api_key: str = None,
+    base_url: str = None,
+    model_tag: str = None,
+    result_img_root: Optional[str] = None,
+    score_output_root: Optional[str] = None,
+    dataset_root: str = None,
+) -> None:
+    """
+    Multi-thread evaluate one CSV file and save results to score_<subset_name>.csv.
+    """
+    job = load_subset_job(csv_path, model_tag, result_img_root, score_output_root)
+    if job is None:
+        return
+    run_eval_all(
+        [job],
+        max_workers=max_workers,
+        model_name=model_name,
+        api_key=api_key,
+        base_url=base_url,
+        result_img_root=result_img_root,
+        dataset_root=dataset_root,
+    )
+
+
+# =====================================================
+# Shared work queue (--worker)
+
+def run_eval_worker(
+    jobs: List[SubsetJob],
+    queue_path: str,
+    max_workers: int = 5,
+    model_name: str = None,
+    api_key: str = None,
+    base_url: str = None,
+    dataset_root: str = None,
+    max_retries: int = 5,
+    combined: bool = False,
+    budget: Optional[Budget] = None,
+    lease_seconds: float = 300.0,
+    claim_size: int = 0,
+    poll_interval: float = 5.0,
+) -> bool:
+    """
+    Judge `jobs` as one of any number of worker processes sharing the SQLite work queue at
+    `queue_path` (see WorkQueue). Every worker plans the same tasks and adds those not
+    queued yet, then claims batches of `claim_size` tasks (default: max_workers) whenever
+    a thread of its pool is free; a heartbeat renews their leases while they run and every
+    result is committed to the queue, which replaces the per-subset journals. Tasks of a
+    dead worker are claimed again once their lease expires. When all tasks of a subset are
+    done, exactly one worker writes its score CSV from the committed results. Returns once
+    every subset of `jobs` is written, or False if this worker was interrupted or stopped
+    by the budget (its unfinished leases are handed back).
+    """
+    client = get_client(api_key, base_url)
+    for job in jobs:
+        # several processes work on the same subsets, results are made durable by the queue
+        job.journal = None
+    assembler = _make_assembler(jobs)
+    tasks, inputs_by_row = plan_judge_tasks(jobs, assembler, None, dataset_root, combined)
+    if not tasks:
+        return True
+
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+    jobs_by_key = {job.key: job for job in jobs}
+
+    def queue_subset(task: JudgeTask) -> str:
+        # workers of different models may share one queue, so queue ids always carry the model tag
+        job = jobs_by_key[task.subset]
+        return f"{job.model_tag}/{job.subset_name}"
+
+    tasks_by_id = {f"{queue_subset(task)}|{task.idx}|{task.lang}|{task.metric}": task for task in tasks}
+    tasks_by_subset: Dict[str, List[Tuple[str, JudgeTask]]] = {}
+    for task_id, task in tasks_by_id.items():
+        tasks_by_subset.setdefault(queue_subset(task), []).append((task_id, task))
+    added = queue.add((task_id, queue_subset(task)) for task_id, task in tasks_by_id.items())
+    logging.info(f"Worker {queue.worker_id}: {len(tasks)} judge tasks planned, {added} of them new in the work queue {queue_path}")
+    unwritten = set(tasks_by_subset)
+    claim_size = claim_size or max_workers
+
+    def write_finished(subsets) -> None:
+        for subset in sorted(subsets):
+            open_tasks, total = queue.subset_progress(subset)
+            if total == 0:
+                # another worker wrote its score CSV
+                unwritten.discard(subset)
+                continue
+            if open_tasks or not queue.claim_subset(subset):
+                continue
+            results = queue.results(subset)
+            for task_id, task in tasks_by_subset[subset]:
+                assembler.record(task, results.get(task_id) or {m: None for m in task.judged_metrics()})
+            queue.finish_subset(subset)
+            unwritten.discard(subset)
+
+    def run_task(task: JudgeTask, queued_at: float) -> Optional[Dict[str, Optional[int]]]:
+        if budget is not None and budget.exhausted():
+            return None
+        TELEMETRY.task_started()
+        with trace_task(task.subset, task.idx, task.lang, task.metric), usage_tags(task.subset, task.lang):
+            emit_since("queue", queued_at)
+            with span("task"):
+                return judge_one_task(
+                    task, inputs_by_row[(task.subset, task.idx)], client, model_name, api_key, base_url, max_retries, budget
+                )
+
+    logging.info(f"Start worker with max_workers={max_workers}, claim_size={claim_size}, lease={lease_seconds:g}s")
+    halted = False
+    running: Dict[Future, Tuple[str, JudgeTask]] = {}
+    last_counts = None
+    with GracefulStop() as stop, queue.heartbeat(), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            if not halted and (stop.requested or (budget is not None and budget.exhausted())):
+                halted = True
+                cancelled = [running.pop(fut)[0] for fut in list(running) if fut.cancel()]
+                queue.release(cancelled)
+            if not halted and len(running) < max_workers:
+                claimed, expired = queue.claim(claim_size)
+                if expired:
+                    logging.warning(f"Worker {queue.worker_id}: re-claimed {expired} judge tasks whose lease expired")
+                for task_id in claimed:
+                    running[executor.submit(run_task, tasks_by_id[task_id], time.monotonic())] = (task_id, tasks_by_id[task_id])
+            if running:
+                done, _ = wait(list(running), timeout=0.5, return_when=FIRST_COMPLETED)
+                finished = set()
+                for fut in done:
+                    task_id, task = running.pop(fut)
+                    try:
+                        scores = fut.result()
+                    except JudgeUnavailableError as e:
+                        logging.error(f"[{task.subset}] {task.lang.upper()} idx={task.idx}: {e}. Score left empty for resume.")
+                        scores = {m: None for m in task.judged_metrics()}
+                    except Exception as e:
+                        logging.error(
+                            f"[{task.subset}] Error evaluating {task.lang.upper()} idx={task.idx} [{task.metric}]: {e}",
+                            exc_info=True,
+                        )
+                        scores = {m: None for m in task.judged_metrics()}
+                    if scores is None:
+                        # the budget was reached before it started
+                        queue.release([task_id])
+                        continue
+                    queue.complete(task_id, scores)
+                    TELEMETRY.task_done()
+                    finished.add(queue_subset(task))
+                write_finished(finished)
+                continue
+            if halted:
+                break
+            write_finished(set(unwritten))
+            if not unwritten:
+                break
+            counts = queue.counts()
+            if counts != last_counts:
+                logging.info(
+                    f"Worker {queue.worker_id}: waiting for {counts['leased_by_others']} judge tasks leased by other workers "
+                    f"({counts['done']} done, {counts['pending']} pending)"
+                )
+                last_counts = counts
+            time.sleep(poll_interval)
+
+    if halted:
+        queue.release()
+    queue.close()
+    return not halted
+
+
+# =====================================================
+# asyncio engine (--engine async)
+
+async def run_eval_all_async(
+    jobs: List[SubsetJob],
+    max_in_flight: int = 100,
+    model_name: str = None,
+    api_key: str = None,
+    base_url: str = None,
+    result_img_root: Optional[str] = None,
+    dataset_root: str = None,
+    max_retries: int = 5,
+    combined: bool = False,
+    budget: Optional[Budget] = None,
+    prefetch_rows: int = 0,
+) -> bool:
+    """
+    Same global task scheduling as run_eval_all(), on one event loop with at most
+    `max_in_flight` judge tasks in progress. Returns False if the run was interrupted
+    or stopped by the budget.
+    """
+    jobs_by_subset = {job.key: job for job in jobs}
+    assembler = _make_assembler(jobs)
+    # find_edited_image touches the filesystem, keep planning off the event loop
+    tasks, inputs_by_row = await asyncio.to_thread(
+        plan_judge_tasks, jobs, assembler, result_img_root, dataset_root, combined
+    )
+    if not tasks:
+        return True
+    prefetcher = start_image_prefetch(tasks, inputs_by_row, prefetch_rows)
+
+    slots = asyncio.Semaphore(max_in_flight)
+
+    async def run_task(task: JudgeTask, stop: GracefulStop) -> Tuple[JudgeTask, Dict[str, Optional[int]], bool]:
+        queued_at = time.monotonic()
+        async with slots:
+            if stop.requested or (budget is not None and budget.exhausted()):
+                return task, {}, False
+            if prefetcher is not None:
+                prefetcher.row_started((task.subset, task.idx))
+            TELEMETRY.task_started()
+            inputs = inputs_by_row[(task.subset, task.idx)]
+            kwargs = dict(
+                input_image_paths=inputs["input_paths"],
+                is_multi_input=inputs["is_multi"],
+                edited_image_path=inputs["edited"][task.lang],
+                instruction=inputs["instr"],
+                hint=inputs["hint"],
+                ref_image_paths=inputs["ref_paths"] if inputs["ref_paths"] else None,
+                max_retries=max_retries,
+                model_name=model_name,
+                api_key=api_key,
+                base_url=base_url,
+            )
+            try:
+                with trace_task(task.subset, task.idx, task.lang, task.metric), usage_tags(task.subset, task.lang):
+                    emit_since("queue", queued_at)
+                    with span("task"):
+                        if task.metrics:
+                            scores = await evaluate_metrics_combined_with_gpt_async(
+                                metrics=list(task.metrics), budget=budget, **kwargs
+                            )
+                        else:
+                            scores = {task.metric: await evaluate_metric_with_gpt_async(metric=task.metric, **kwargs)}
+            except JudgeUnavailableError as e:
+                logging.error(f"[{task.subset}] {task.lang.upper()} idx={task.idx}: {e}. Score left empty for resume.")
+                scores = {m: None for m in task.judged_metrics()}
+            except Exception as e:
+                logging.error(
+                    f"[{task.subset}] Error evaluating {task.lang.upper()} idx={task.idx} [{task.metric}]: {e}",
+                    exc_info=True,
+                )
+                scores = {m: None for m in task.judged_metrics()}
+            return task, scores, True
+
+    logging.info(f"Start async evaluation with max_in_flight={max_in_flight} for {len(tasks)} judge tasks")
+    skipped = 0
+    with GracefulStop() as stop, (prefetcher or contextlib.nullcontext()):
+        for coro in asyncio.as_completed([run_task(task, stop) for task in tasks]):
+            task, scores, ran = await coro
+            if not ran:
+                skipped += 1
+                continue
+            # journaling and writing a finished CSV is blocking file IO
+            await asyncio.to_thread(_record_result, jobs_by_subset, assembler, task, scores)
+
+    if skipped:
+        await asyncio.to_thread(_save_interrupted, jobs, assembler)
+        return False
+    return True
+
+
+# =====================================================
+# Batch API mode (--mode batch)
+
+def batch_custom_id(task: JudgeTask) -> str:
+    return f"{task.subset}|{task.idx}|{task.lang}|{task.metric}"
+
+
+def write_batch_inputs(
+    tasks: List[JudgeTask],
+    inputs_by_row: Dict[Tuple[str, str], dict],
+    batch_dir: str,
+    model_name: str,
+    on_cached,
+    on_unusable,
+    prefetch_rows: int = 0,
+    repairs: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+    endpoint: str = "",
+) -> List[str]:
+    """
+    Build the judge message of every task and write them into Batch API input files.
+    Tasks answered by the response cache are passed to on_cached(task, score) and tasks
+    whose edited image cannot be encoded to on_unusable(task) instead of being written.
+    Tasks in `repairs` (custom id -> (unparsable answer, cache key)) get a text-only
+    repair request for their previous answer instead of the full message. Cached answers
+    are looked up for `endpoint`, the base URL of the Batch API client.
+    """
+    writer = BatchInputWriter(batch_dir)
+    response_format = requested_response_format()
+    repairs = repairs or {}
+    prefetcher = start_image_prefetch(
+        [task for task in tasks if batch_custom_id(task) not in repairs], inputs_by_row, prefetch_rows
+    )
+    with (prefetcher or contextlib.nullcontext()):
+        for task in tasks:
+            custom_id = batch_custom_id(task)
+            if custom_id in repairs:
+                answer, cache_key = repairs[custom_id]
+                writer.add(custom_id, judge_request_body(build_repair_message(answer), model_name, response_format), cache_key)
+                continue
+            if prefetcher is not None:
+                prefetcher.row_started((task.subset, task.idx))
+            inputs = inputs_by_row[(task.subset, task.idx)]
+            message = build_metric_message(
+                task.metric,
+                inputs["input_paths"],
+                inputs["is_multi"],
+                inputs["edited"][task.lang],
+                inputs["instr"],
+                inputs["hint"],
+                inputs["ref_paths"] if inputs["ref_paths"] else None,
+            )
+            if message is None:
+                on_unusable(task)
+                continue
+            cache_key, cached = lookup_cached_answer(message, model_name, response_format, endpoint)
+            if cached is not None:
+                on_cached(task, cached[0])
+                continue
+            writer.add(custom_id, judge_request_body(message, model_name, response_format), cache_key)
+    paths = writer.close()
+    logging.info(
+        f"Wrote {writer.total} judge requests ({len(repairs)} text-only repairs) into {len(paths)} batch input file(s) under {batch_dir}"
+    )
+    return paths
+
+
+def run_eval_batch(
+    jobs: List[SubsetJob],
+    model_name: str = None,
+    api_key: str = None,
+    base_url: str = None,
+    result_img_root: Optional[str] = None,
+    dataset_root: str = None,
+    batch_dir: str = None,
+    output_files: Optional[List[str]] = None,
+    poll_interval: float = 60.0,
+    max_retries: int = 5,
+    budget: Optional[Budget] = None,
+    prefetch_rows: int = 0,
+    repair: bool = True,
+) -> bool:
+    """
+    Judge all pending tasks through the Batch API instead of online requests.
+
+    Pending messages are written to JSONL input files in `batch_dir`, submitted and
+    polled; results are journaled and written to the score CSVs exactly like online
+    results. Unparsable or failed requests are resubmitted in up to `max_retries`
+    rounds; parse failures then score 0 and endpoint failures stay empty for resume.
+    With `repair`, an unparsable answer is first resubmitted as a text-only repair
+    request (its own text, no images); only if that fails too is the full message resent.
+    Submitted batch ids are kept in batch_dir/batch_state.json, so an interrupted run
+    picks up its batches again. With `output_files`, no request is sent: the given
+    Batch API output files are ingested and tasks without a usable answer stay empty.
+    Returns False if the run was interrupted or no new round could be submitted because
+    the budget was reached.
+    """
+    jobs_by_subset = {job.key: job for job in jobs}
+    assembler = _make_assembler(jobs)
+    tasks, inputs_by_row = plan_judge_tasks(jobs, assembler, result_img_root, dataset_root)
+    if not tasks:
+        return True
+
+    pending: Dict[str, JudgeTask] = {batch_custom_id(task): task for task in tasks}
+    # batch files cannot fall back per endpoint: answers are parsed as the configured format
+    structured = requested_response_format() is not None
+    answer_format = "json_schema" if structured else "text"
+    repairs: Dict[str, Tuple[str, Optional[str]]] = {}  # custom_id -> (unparsable answer, cache key), for the next round
+    in_repair: set = set()  # custom_ids whose request of the current round is a repair
+    failures: Dict[str, str] = {}  # custom_id -> kind of the last failure
+    cache_keys = load_cache_keys(batch_dir)
+
+    started: set = set()  # custom_ids counted as started in the telemetry
+
+    def mark_started(custom_ids) -> None:
+        new = [custom_id for custom_id in custom_ids if custom_id not in started]
+        started.update(new)
+        TELEMETRY.task_started(len(new))
+
+    def finish(task: JudgeTask, score: Optional[int]) -> None:
+        custom_id = batch_custom_id(task)
+        pending.pop(custom_id, None)
+        # cached, unusable or ingested-from-file tasks never wait in a batch
+        mark_started([custom_id])
+        _record_result(jobs_by_subset, assembler, task, {task.metric: score})
+
+    def ingest(path: str) -> None:
+        parsed = failed = 0
+        for custom_id, body, error_kind in iter_batch_output(path):
+            task = pending.get(custom_id)
+            if task is None:
+                continue
+            if error_kind is not None:
+                failures[custom_id] = error_kind
+                failed += 1
+                continue
+            USAGE.record(
+                task.metric, body.get("usage"), model=model_name,
+                subset=task.subset, lang=task.lang, discount=BATCH_DISCOUNT,
+            )
+            text = completion_text(body)
+            score, reason = (extract_structured_score if structured else extract_score_and_reason_generic)(text)
+            if custom_id in in_repair:
+                in_repair.discard(custom_id)
+                TELEMETRY.count_repair(score is not None)
+            else:
+                TELEMETRY.count_parse_result(answer_format, score is not None)
+                if score is None and repair and text.strip():
+                    repairs[custom_id] = (text, cache_keys.get(custom_id))
+            if score is None:
+                failures[custom_id] = PARSE
+                failed += 1
+                continue
+            store_cached_answer(cache_keys.get(custom_id), score, reason, text)
+            failures.pop(custom_id, None)
+            finish(task, score)
+            parsed += 1
+        logging.info(f"Ingested {path}: {parsed} scores, {failed} failed or unparsable")
+
+    if output_files:
+        for path in output_files:
+            ingest(path)
+        if pending:
+            logging.warning(f"{len(pending)} judge tasks have no usable answer in the given batch output; scores left empty for resume.")
+        for custom_id, task in list(pending.items()):
+            finish(task, None)
+        return True
+
+    client = get_client(api_key, base_url)
+    state = BatchState(os.path.join(batch_dir, "batch_state.json"))
+    budget_stopped = False
+    with GracefulStop() as stop:
+        for round_no in range(1, max_retries + 1):
+            if not state.outstanding():
+                todo = [task for task in pending.values() if failures.get(batch_custom_id(task)) not in (CLIENT, AUTH)]
+                if not todo:
+                    break
+                if budget is not None and budget.exhausted():
+                    budget_stopped = True
+                    break
+                logging.info(f"Batch round {round_no}: preparing {len(todo)} judge requests")
+                round_repairs = {custom_id: entry for custom_id, entry in repairs.items() if custom_id in pending}
+                for task in todo:
+                    custom_id = batch_custom_id(task)
+                    if failures.get(custom_id) == PARSE and custom_id not in round_repairs:
+                        TELEMETRY.count_parse_resend()
+                input_paths = write_batch_inputs(
+                    todo,
+                    inputs_by_row,
+                    batch_dir,
+                    model_name,
+                    on_cached=finish,
+                    on_unusable=lambda task: finish(task, 0),
+                    prefetch_rows=prefetch_rows,
+                    repairs=round_repairs,
+                    endpoint=endpoint_url(client),
+                )
+                in_repair = set(round_repairs)
+                repairs.clear()
+                cache_keys = load_cache_keys(batch_dir)
+                for path in input_paths:
+                    state.add(submit_batch(client, path), path)
+
+            # every pending task now sits in a submitted (or resumed) batch
+            mark_started(list(pending))
+            for entry in state.outstanding():
+                batch = wait_for_batch(client, entry["id"], poll_interval, should_stop=lambda: stop.requested)
+                if batch is None:
+                    logging.warning(f"Stopped while waiting for batch {entry['id']}; it keeps running, rerun to ingest it.")
+                    _save_interrupted(jobs, assembler)
+                    return False
+                for path in download_batch_files(client, batch, batch_dir):
+                    ingest(path)
+                state.update(entry["id"], status=batch.status, ingested=True)
+
+            if not pending:
+                break
+
+    for custom_id, task in list(pending.items()):
+        kind = failures.get(custom_id)
+        if kind == PARSE:
+            logging.error(f"important error {model_name}: [{task.metric}] no parsable batch answer after {max_retries} rounds, using score=0.")
+            finish(task, 0)
+        elif kind == CLIENT:
+            logging.error(f"important error {model_name}: [{task.metric}] batch request rejected, using score=0.")
+            finish(task, 0)
+        else:
+            logging.error(
+                f"[{task.subset}] {task.lang.upper()} idx={task.idx} [{task.metric}]: no batch result ({kind or 'missing'}). "
+                f"Score left empty for resume."
+            )
+            finish(task, None)
+    return not budget_stopped
 
 
 def build_arg_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--name", type=str, required=True, help="Model tag used to name result directories.")
+    parser.add_argument("--name", type=str, nargs="+", required=True,
+                        help="Model tag(s) used to name result directories, or glob patterns over the model folders of "
+                             "--result_img_root (quote them, e.g. \"model_*\"). Several models are judged in one run "
+                             "through one shared worker pool, image cache and client.")
     parser.add_argument("--dataset_dir",     type=str,  required=True,  help="Path to WiseEdit-Benchmark.")
     parser.add_argument("--result_img_root", type=str,  required=True,  help="Root directory of result images (without model name).")
     parser.add_argument("--score_output_root", type=str,  required=True,  help="Root directory of output score CSVs (without model name).")
-    parser.add_argument("--num_workers", type=int,  required=False, default=5, help="Number of threads per CSV.")
+    parser.add_argument("--num_workers", type=int,  required=False, default=5, help="Number of judge worker threads shared by all CSVs.")
+    parser.add_argument("--shard", type=str, required=False, default=None,
+                        help="Evaluate only shard i/N (e.g. 1/4) of the rows, partitioned by a stable hash of (subset, idx); "
+                             "scores go to per-shard files, combine them with merge_shards.py.")
+    parser.add_argument("--worker", action="store_true",
+                        help="Pull judge tasks from a SQLite work queue shared with any number of other --worker processes "
+                             "(same command, on this machine or on others with the same shared filesystem); tasks of a dead "
+                             "worker are re-queued when their lease expires.")
+    parser.add_argument("--queue_path", type=str, required=False, default=None,
+                        help="SQLite file of the --worker queue (default: <score_output_root>/work_queue.sqlite).")
+    parser.add_argument("--lease_seconds", type=float, required=False, default=300.0,
+                        help="Lease of claimed --worker tasks, renewed by a heartbeat; a task is re-queued this long after its worker died.")
+    parser.add_argument("--claim_size", type=int, required=False, default=0,
+                        help="Judge tasks a --worker claims at once (default: --num_workers).")
+    parser.add_argument("--mode", type=str, required=False, default="online", choices=["online", "batch"],
+                        help="online: judge requests are sent as they are scheduled; batch: submit them through the Batch API.")
+    parser.add_argument("--batch_dir", type=str, required=False, default=None,
+                        help="Directory of Batch API input / output files and state (default: <score_output_root>/<name>/batch, "
+                             "or <score_output_root>/batch_<hash of the model tags> for several models).")
+    parser.add_argument("--batch_output_file", type=str, nargs="*", required=False, default=None,
+                        help="Ingest these local Batch API output files instead of submitting (implies --mode batch).")
+    parser.add_argument("--batch_poll_interval", type=float, required=False, default=60.0,
+                        help="Seconds between status checks of submitted batches.")
+    parser.add_argument("--combined_metrics", action="store_true",
+                        help="Ask for all metrics of an image in one judge request (combined rubric); missing metrics fall back to per-metric requests.")
+    parser.add_argument("--response_format", type=str, required=False, default="text", choices=list(RESPONSE_FORMATS),
+                        help="json_schema: constrain judge answers to {\"reason\", \"score\"} with the endpoint's structured output "
+                             "(endpoints without support fall back to text); text: free-text answers parsed with regexes.")
+    parser.add_argument("--no_repair", action="store_true",
+                        help="On an unparsable judge answer, re-send the full request with its images right away "
+                             "instead of first asking for the score with a cheap text-only repair request.")
+    parser.add_argument("--message_layout", type=str, required=False, default="default", choices=list(MESSAGE_LAYOUTS),
+                        help="cache: put rubric, input / reference images and instruction before the edited image, "
+                             "so requests share a long prefix for provider-side prompt caching.")
+    parser.add_argument("--max_cost", type=float, required=False, default=None,
+                        help="Stop scheduling new judge requests once this run has cost this many USD (rerun to resume).")
+    parser.add_argument("--max_tokens_total", type=int, required=False, default=None,
+                        help="Stop scheduling new judge requests once this run has used this many tokens (rerun to resume).")
+    parser.add_argument("--price_input", type=float, required=False, default=None,
+                        help="USD per 1M prompt tokens of the judge model (default: built-in price list).")
+    parser.add_argument("--price_cached_input", type=float, required=False, default=None,
+                        help="USD per 1M cached prompt tokens (default: --price_input).")
+    parser.add_argument("--price_output", type=float, required=False, default=None,
+                        help="USD per 1M completion tokens of the judge model (default: built-in price list).")
+    parser.add_argument("--metrics_port", type=int, required=False, default=None,
+                        help="Serve live run metrics in OpenMetrics format at http://127.0.0.1:<port>/metrics.")
+    parser.add_argument("--progress_interval", type=float, required=False, default=30.0,
+                        help="Seconds between one-line progress summaries with ETA (0 disables).")
+    parser.add_argument("--trace_file", type=str, required=False, default=None,
+                        help="Append per-stage timing spans (JSONL) of every judge task to this file; see analyze_trace.py.")
+    parser.add_argument("--engine", type=str, required=False, default="thread", choices=["thread", "async"],
+                        help="Concurrency engine: a global thread pool of --num_workers, or asyncio with up to --max_in_flight requests.")
+    parser.add_argument("--max_in_flight", type=int, required=False, default=200,
+                        help="Maximum number of concurrent judge requests with --engine async.")
     parser.add_argument("--eval_model", type=str, required=False, default="gpt-4o", help="Model name used for scoring.")
     parser.add_argument("--target_csv", type=str, nargs="*", required=False, default=None,
-                        help="Optional list of CSV file names to evaluate; if omitted, all CSVs in csv_dir are used.")
+                        help="Optional list of CSV file names to evaluate; if omitted, the default benchmark CSVs are used.")
+    parser.add_argument("--image_cache_mb", type=int, required=False, default=512,
+                        help="Memory budget (MB) of the shared encoded-image cache.")
+    parser.add_argument("--image_cache_dir", type=str, required=False, default=None,
+                        help="Optional directory to spill encoded images evicted from the in-memory cache.")
+    parser.add_argument("--image_profile", type=str, action="append", default=None,
+                        help="Image preprocessing profile rule, repeatable: NAME, ROLE=NAME, METRIC=NAME or METRIC.ROLE=NAME "
+                             "with ROLE in input / edited / ref (built-in: default, fast, low, webp, high).")
+    parser.add_argument("--image_profile_file", type=str, required=False, default=None,
+                        help="JSON file defining extra image profiles: {\"name\": {\"max_size\": 768, \"format\": \"WEBP\", \"quality\": 85, \"detail\": \"low\", \"draft\": true, \"passthrough\": false}}.")
+    parser.add_argument("--image_store", type=str, required=False, default=None,
+                        help="Packed store of preprocessed benchmark images written by prepare_images.py "
+                             "(default: <dataset_dir>/judge_image_store if it exists).")
+    parser.add_argument("--image_workers", type=int, required=False, default=0,
+                        help="Decode / resize / encode judge images in this many worker processes, prefetched ahead of the judge requests (0: in the request threads).")
+    parser.add_argument("--prefetch_rows", type=int, required=False, default=64,
+                        help="With --image_workers, encode the images of at most this many upcoming rows ahead of the judge workers.")
+    parser.add_argument("--max_connections", type=int, required=False, default=None,
+                        help="Connection-pool size of the shared judge client; defaults to max(num_workers, 64).")
+    parser.add_argument("--preflight", action="store_true",
+                        help="Before any judge request, verify the result image of every row and abort (exit code 3) "
+                             "if images of rows still to be judged are missing or corrupt.")
+    parser.add_argument("--preflight_only", action="store_true",
+                        help="Only run the preflight check and write preflight_report.csv, then exit.")
+    parser.add_argument("--allow_missing", action="store_true",
+                        help="With --preflight, report problems but evaluate anyway (missing images score 0 as before).")
+    parser.add_argument("--preflight_workers", type=int, required=False, default=16,
+                        help="Threads reading image headers during the preflight check and --dry_run.")
+    parser.add_argument("--dry_run", action="store_true",
+                        help="Plan the run (same CSVs and resume state), log the projected judge calls, tokens, cost and wall time "
+                             "per subset / metric / language and exit without sending any request or writing any file.")
+    parser.add_argument("--dry_run_plan", action="store_true",
+                        help="With --dry_run, also write the breakdown to dry_run_plan.csv in each model's score folder.")
+    parser.add_argument("--assumed_latency", type=float, required=False, default=6.0,
+                        help="Seconds per judge request used by --dry_run to project the wall time.")
+    parser.add_argument("--no_http2", action="store_true",
+                        help="Disable HTTP/2 even if the optional `h2` package is installed.")
+    parser.add_argument("--rpm", type=float, required=False, default=None,
+                        help="Requests-per-minute budget of the judge endpoint (enables the rate limiter).")
+    parser.add_argument("--tpm", type=float, required=False, default=None,
+                        help="Tokens-per-minute budget of the judge endpoint (enables the rate limiter).")
+    parser.add_argument("--max_retries", type=int, required=False, default=5,
+                        help="Attempts per judge request before giving up (parse failures -> 0, endpoint failures -> left empty).")
+    parser.add_argument("--breaker_threshold", type=int, required=False, default=10,
+                        help="Consecutive 5xx / timeout / connection failures that open the circuit breaker and pause all workers (0 disables).")
+    parser.add_argument("--breaker_cooldown", type=float, required=False, default=30.0,
+                        help="Seconds the circuit breaker stays open before probing the endpoint again.")
+    parser.add_argument("--breaker_give_up_after", type=float, required=False, default=1800.0,
+                        help="Seconds of continuous outage after which remaining judge requests fail fast (scores left empty).")
+    parser.add_argument("--rate_limit_file", type=str, required=False, default=None,
+                        help="State file shared by cooperating processes; defaults to a temp file derived from API_KEY and BASE_URL.")
+    parser.add_argument("--cache_path", type=str, required=False, default=None,
+                        help="SQLite file of cached judge answers (default: <score_output_root>/judge_cache.sqlite, shared by all models).")
+    parser.add_argument("--cache_mb", type=int, required=False, default=1024,
+                        help="Size cap of the judge response cache in MB (least recently used answers are evicted).")
+    parser.add_argument("--no_cache", "--no-cache", action="store_true",
+                        help="Neither read nor write the judge response cache.")
+    parser.add_argument("--refresh_cache", "--refresh-cache", action="store_true",
+                        help="Ignore cached judge answers, re-judge and overwrite them.")
     return parser
 
 
@@ -450,73 +1545,276 @@ if __name__ == "__main__":
     base_url = os.environ.get("BASE_URL")
     if not base_url:
         base_url = "https://api.openai.com/v1"
-    if not api_key:
+    if not api_key and not args.dry_run:
         logging.error("Environment variables API_KEY are not set; please run 'export API_KEY=your_key' in the terminal first.")
         sys.exit(1)
 
     # print(api_key)
     # print(base_url)
 
-    model_tag = args.name
+    shard: Optional[Shard] = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.worker and (args.mode == "batch" or args.batch_output_file or shard is not None):
+        parser.error("--worker cannot be combined with --mode batch, --batch_output_file or --shard")
+    if args.combined_metrics and (args.mode == "batch" or args.batch_output_file):
+        parser.error("--combined_metrics is not supported with --mode batch or --batch_output_file")
+
+    model_tags = resolve_model_tags(args.name, args.result_img_root)
+    if not model_tags:
+        logging.error(f"No model to evaluate: --name {' '.join(args.name)} matches nothing in {args.result_img_root}")
+        sys.exit(1)
+    multi_model = len(model_tags) > 1
     eval_model = args.eval_model
+    if (
+        args.max_cost is not None
+        and (args.price_input is None or args.price_output is None)
+        and lookup_prices(eval_model) is None
+    ):
+        # an unpriced judge model costs 0, so the budget would never be reached
+        parser.error(
+            f"--max_cost needs the price of judge model '{eval_model}', which is not in the built-in list; "
+            f"set --price_input and --price_output (USD per 1M tokens)"
+        )
     dataset_dir = args.dataset_dir
 
-    result_img_root = os.path.join(args.result_img_root, model_tag)
-    score_output_root = os.path.join(args.score_output_root, model_tag)
-    os.makedirs(score_output_root, exist_ok=True)
+    score_output_roots = {tag: os.path.join(args.score_output_root, tag) for tag in model_tags}
+    # a dry run leaves no trace: no score folders, log file, response cache or journals
+    if not args.dry_run:
+        for score_output_root in score_output_roots.values():
+            os.makedirs(score_output_root, exist_ok=True)
 
-    # add file logger
-    log_file = os.path.join(score_output_root, f"{model_tag}_eval.log")
-    file_handler = logging.FileHandler(log_file, encoding="utf-8")
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
-    logging.getLogger().addHandler(file_handler)
+        # add file logger; a multi-model run logs into one file next to the model folders
+        if multi_model:
+            log_file = os.path.join(args.score_output_root, "multi_model_eval.log")
+        else:
+            log_file = os.path.join(score_output_roots[model_tags[0]], f"{model_tags[0]}_eval.log")
+        log_file = shard_path(log_file, shard)
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setLevel(logging.INFO)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+        logging.getLogger().addHandler(file_handler)
 
     logging.info("=" * 120)
-    logging.info(f"   Start evaluating model: {model_tag}")
+    logging.info(f"   Start evaluating model: {', '.join(model_tags)}")
     logging.info(f"   eval_model         = {eval_model}")
     logging.info(f"   dataset_dir        = {dataset_dir}")
-    logging.info(f"   result_img_root    = {result_img_root}")
-    logging.info(f"   score_output_root  = {score_output_root}")
+    logging.info(f"   result_img_root    = {args.result_img_root if multi_model else os.path.join(args.result_img_root, model_tags[0])}")
+    logging.info(f"   score_output_root  = {args.score_output_root if multi_model else score_output_roots[model_tags[0]]}")
     logging.info(f"   num_workers        = {args.num_workers}")
+    logging.info(f"   mode               = {args.mode}")
+    logging.info(f"   engine             = {args.engine}")
+    if shard is not None:
+        logging.info(f"   shard              = {shard[0]}/{shard[1]}")
+    if args.worker:
+        logging.info(f"   work queue         = {args.queue_path or os.path.join(args.score_output_root, 'work_queue.sqlite')}")
     logging.info("=" * 120)
 
-    csv_files = []
-
-    def _walk_csv_under(root_dir: str):
-        for root, dirs, files in os.walk(root_dir):
-            # Do NOT descend into 'imgs' or 'img_ref'
-            dirs[:] = [d for d in dirs if d not in ("imgs", "img_ref")]
-            for fn in files:
-                if fn.lower().endswith(".csv"):
-                    yield root, fn
-
+    configure_image_cache(max_mb=args.image_cache_mb, spill_dir=args.image_cache_dir)
+    configure_image_workers(args.image_workers)
+    configure_image_profiles(args.image_profile, args.image_profile_file)
+    image_store = configure_image_store(args.image_store or os.path.join(dataset_dir, "judge_image_store"), dataset_dir)
+    if args.image_store and image_store is None:
+        logging.warning(f"No image store found in {args.image_store}; run prepare_images.py first. Reading images from the dataset.")
+    prefetch_rows = args.prefetch_rows if args.image_workers > 0 else 0
+    configure_message_layout(args.message_layout)
+    configure_response_format(args.response_format)
+    configure_parse_repair(not args.no_repair)
+    configure_tracing(args.trace_file)
+    configure_client_pool(
+        max_connections=args.max_connections or max(args.num_workers, args.max_in_flight if args.engine == "async" else 0, 64),
+        http2=not args.no_http2,
+    )
+    configure_retry_policy(
+        breaker_threshold=args.breaker_threshold,
+        breaker_cooldown=args.breaker_cooldown,
+        breaker_give_up_after=args.breaker_give_up_after,
+    )
+    rate_limiter = configure_rate_limiter(
+        rpm=args.rpm,
+        tpm=args.tpm,
+        state_file=args.rate_limit_file,
+        api_key=api_key,
+        base_url=base_url,
+    )
 
-    if args.target_csv:
-        target_names = set(args.target_csv)
-    else:
-        target_names = set(default_CSV_files)
+    response_cache = None
+    if not args.no_cache and not args.dry_run:
+        response_cache = configure_response_cache(
+            path=args.cache_path or os.path.join(args.score_output_root, "judge_cache.sqlite"),
+            max_mb=args.cache_mb,
+            refresh=args.refresh_cache,
+        )
 
-    for root, fn in _walk_csv_under(dataset_dir):
-        if fn in target_names:
-            csv_files.append(os.path.join(root, fn))
+    if args.price_input is not None and args.price_output is not None:
+        cached_price = args.price_cached_input if args.price_cached_input is not None else args.price_input
+        USAGE.configure(prices=(args.price_input, cached_price, args.price_output))
+    budget = Budget(USAGE, max_cost=args.max_cost, max_tokens=args.max_tokens_total)
 
+    csv_files = walk_benchmark_csvs(dataset_dir, args.target_csv)
     if not csv_files:
         logging.error(f"There is no matching csv in: {dataset_dir}")
         sys.exit(1)
 
-    for csv_path in csv_files:
-        run_eval_for_one_csv(
-            csv_path=csv_path,
+    jobs: List[SubsetJob] = []
+    for model_tag in model_tags:
+        result_img_root = os.path.join(args.result_img_root, model_tag)
+        RESULT_MANIFESTS[result_img_root] = ResultManifest(result_img_root)
+        for csv_path in csv_files:
+            job = load_subset_job(
+                csv_path, model_tag, result_img_root, score_output_roots[model_tag], key_by_model=multi_model, shard=shard,
+                read_only=args.dry_run,
+            )
+            if job is not None:
+                RESULT_MANIFESTS[result_img_root].scan_subset(job.subset_name)
+                jobs.append(job)
+
+    if args.preflight or args.preflight_only:
+        preflight_ok = True
+        for model_tag in model_tags:
+            preflight_ok &= preflight_jobs(
+                [job for job in jobs if job.model_tag == model_tag],
+                RESULT_MANIFESTS[os.path.join(args.result_img_root, model_tag)],
+                args.preflight_workers,
+                None if args.dry_run else shard_path(os.path.join(score_output_roots[model_tag], "preflight_report.csv"), shard),
+                label=model_tag if multi_model else "",
+            )
+        if args.preflight_only:
+            sys.exit(0 if preflight_ok else 3)
+        if not preflight_ok:
+            if not args.allow_missing:
+                logging.error("Aborting before any judge request; fix the result images or pass --allow_missing.")
+                sys.exit(3)
+            logging.warning("Continuing despite preflight problems (--allow_missing).")
+    if args.dry_run:
+        dry_run_jobs(jobs, args, score_output_roots, shard)
+        sys.exit(0)
+
+    TELEMETRY.reset()
+    if args.metrics_port is not None:
+        TELEMETRY.serve(args.metrics_port)
+    progress_stop = TELEMETRY.start_progress_log(args.progress_interval) if args.progress_interval > 0 else None
+
+    if args.worker:
+        if args.engine == "async":
+            logging.warning("--worker runs judge tasks on a thread pool of --num_workers, ignoring --engine async.")
+        completed = run_eval_worker(
+            jobs,
+            args.queue_path or os.path.join(args.score_output_root, "work_queue.sqlite"),
             max_workers=args.num_workers,
             model_name=eval_model,
             api_key=api_key,
             base_url=base_url,
-            model_tag=model_tag,
-            result_img_root=result_img_root,
-            score_output_root=score_output_root,
             dataset_root=dataset_dir,
+            max_retries=args.max_retries,
+            budget=budget,
+            combined=args.combined_metrics,
+            lease_seconds=args.lease_seconds,
+            claim_size=args.claim_size,
         )
-
-    logging.info("All CSVs finished for model: %s", model_tag)
-    logging.info("Score result could be found in %s", score_output_root)
\ No newline at end of file
+    elif args.mode == "batch" or args.batch_output_file:
+        if args.batch_dir:
+            batch_dir = args.batch_dir
+        elif multi_model:
+            tags_digest = hashlib.sha1("\n".join(model_tags).encode("utf-8")).hexdigest()[:12]
+            batch_dir = os.path.join(args.score_output_root, f"batch_{tags_digest}")
+        else:
+            batch_dir = os.path.join(score_output_roots[model_tags[0]], "batch")
+        batch_dir = shard_path(batch_dir, shard)
+        completed = run_eval_batch(
+            jobs,
+            model_name=eval_model,
+            api_key=api_key,
+            base_url=base_url,
+            dataset_root=dataset_dir,
+            batch_dir=batch_dir,
+            output_files=args.batch_output_file,
+            poll_interval=args.batch_poll_interval,
+            max_retries=args.max_retries,
+            budget=budget,
+            prefetch_rows=prefetch_rows,
+            repair=not args.no_repair,
+        )
+    elif args.engine == "async":
+        completed = asyncio.run(run_eval_all_async(
+            jobs,
+            max_in_flight=args.max_in_flight,
+            model_name=eval_model,
+            api_key=api_key,
+            base_url=base_url,
+            dataset_root=dataset_dir,
+            max_retries=args.max_retries,
+            budget=budget,
+            combined=args.combined_metrics,
+            prefetch_rows=prefetch_rows,
+        ))
+    else:
+        completed = run_eval_all(
+            jobs,
+            max_workers=args.num_workers,
+            model_name=eval_model,
+            api_key=api_key,
+            base_url=base_url,
+            dataset_root=dataset_dir,
+            max_retries=args.max_retries,
+            budget=budget,
+            combined=args.combined_metrics,
+            prefetch_rows=prefetch_rows,
+        )
+    configure_image_workers(0)
+
+    if progress_stop is not None:
+        progress_stop.set()
+    logging.info(TELEMETRY.progress_line())
+    parse_lines = TELEMETRY.parse_report_lines()
+    if parse_lines:
+        logging.info("Judge answers per response format (unparsable answers get a text-only repair, then the full request again):")
+        for line in parse_lines:
+            logging.info("   %s", line)
+    if TELEMETRY.dedup_rows:
+        logging.info(
+            "CN / EN deduplication: %d judge tasks of %d rows with byte-identical edited images were sent once for both languages",
+            TELEMETRY.dedup_tasks, TELEMETRY.dedup_rows,
+        )
+    logging.info("Image cache stats: %s", IMAGE_CACHE.stats())
+    if image_store is not None:
+        logging.info("Image store stats: %s", image_store.stats())
+    profile_lines = PROFILE_STATS.report_lines()
+    if profile_lines:
+        logging.info("Images placed into judge messages per preprocessing profile (payload = base64 bytes):")
+        for line in profile_lines:
+            logging.info("   %s", line)
+    if rate_limiter is not None:
+        logging.info(
+            "Rate limiter: waited %.1fs in total, %d Retry-After pauses",
+            rate_limiter.total_wait, rate_limiter.retry_after_events,
+        )
+    if response_cache is not None:
+        logging.info("Judge response cache stats: %s", response_cache.stats())
+    if USAGE.totals().requests:
+        logging.info("Token usage per metric (cached = prompt tokens served from the provider's prompt cache):")
+        for line in USAGE.report_lines():
+            logging.info("   %s", line)
+        for model_tag in model_tags:
+            cost_report_path = shard_path(os.path.join(score_output_roots[model_tag], "cost_report.csv"), shard)
+            if multi_model:
+                USAGE.write_report(cost_report_path, {job.key: job.subset_name for job in jobs if job.model_tag == model_tag})
+            else:
+                USAGE.write_report(cost_report_path)
+            logging.info("Cost report (accumulated over runs) written to %s", cost_report_path)
+    if args.trace_file:
+        configure_tracing(None)
+        logging.info("Trace spans written to %s (summarize with: python analyze_trace.py %s)", args.trace_file, args.trace_file)
+    if not completed:
+        if budget.exhausted():
+            logging.warning("Budget reached for model: %s. Rerun with a higher budget to resume.", ", ".join(model_tags))
+            sys.exit(2)
+        logging.warning("Evaluation interrupted for model: %s. Rerun the same command to resume.", ", ".join(model_tags))
+        sys.exit(130)
+    for model_tag in model_tags:
+        logging.info("All CSVs finished for model: %s", model_tag)
+        logging.info("Score result could be found in %s", score_output_roots[model_tag])
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the scripts and the Evaluation/ folder are imported from the repository root, as run_eval.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,24 @@
+from PIL import Image
+
+from Evaluation import evaluation_utils
+from Evaluation.usage import Budget, UsageTracker
+
+
+def test_fallback_requests_stop_at_the_budget(tmp_path, monkeypatch):
+    edited_path = str(tmp_path / "edited.png")
+    Image.new("RGB", (64, 64), "blue").save(edited_path)
+    calls = []
+
+    def fake_call(message, metric, **kwargs):
+        calls.append(metric)
+        # the combined answer only scores visual_quality
+        return {"visual_quality": (8, "ok")}, None
+
+    monkeypatch.setattr(evaluation_utils, "call_gpt_with_retry", fake_call)
+    scores = evaluation_utils.evaluate_metrics_combined_with_gpt(
+        ["visual_quality", "instruction_following"], [], False, edited_path, "Make it blue.",
+        client=object(), budget=Budget(UsageTracker(), max_tokens=0),
+    )
+
+    assert calls == ["visual_quality+instruction_following"]
+    assert scores == {"visual_quality": 8, "instruction_following": None}
@@ -0,0 +1,18 @@
+from Evaluation import image_cache
+from Evaluation.image_cache import ImageCache
+
+
+def test_digests_are_bounded_with_the_payload_lru(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "MIN_DIGESTS", 3)
+    cache = ImageCache(max_bytes=20)
+    for i in range(10):
+        p = tmp_path / f"{i}.png"
+        p.write_bytes(f"image {i}".encode())
+        assert cache.get_or_encode(str(p), (512,), lambda data: data.decode() * 2) == f"image {i}" * 2
+
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["digests"] == 3
+    # a recently used path keeps its digest, the file is not read again
+    assert cache.file_digest(str(tmp_path / "9.png"))[1] is None
+    assert cache.file_digest(str(tmp_path / "0.png"))[1] is not None
@@ -0,0 +1,35 @@
+import asyncio
+
+from PIL import Image
+
+from Evaluation import evaluation_utils
+from Evaluation.image_profiles import ProfileTable
+
+
+def _images(message: dict):
+    return [part["image_url"] for part in message["content"] if part["type"] == "image_url"]
+
+
+def test_async_messages_use_the_image_profile_of_their_metric(tmp_path, monkeypatch):
+    input_path, edited_path = str(tmp_path / "input.png"), str(tmp_path / "edited.png")
+    Image.effect_noise((800, 600), 64).convert("RGB").save(input_path)
+    Image.effect_noise((800, 600), 32).convert("RGB").save(edited_path)
+    monkeypatch.setattr(evaluation_utils, "IMAGE_PROFILES", ProfileTable(rules=["visual_quality=high"]))
+
+    sent = {}
+
+    async def fake_call(message, metric, **kwargs):
+        sent[metric] = message
+        return 7, None
+
+    monkeypatch.setattr(evaluation_utils, "call_gpt_with_retry_async", fake_call)
+    metrics = ["visual_quality", "instruction_following"]
+    scores = asyncio.run(evaluation_utils.evaluate_example_with_gpt_async(
+        [input_path], False, edited_path, "Make it blue.", metrics, client=object(),
+    ))
+
+    assert all(scores[m] == 7 for m in metrics)
+    for metric in metrics:
+        expected = evaluation_utils.build_metric_message(metric, [input_path], False, edited_path, "Make it blue.")
+        assert _images(sent[metric]) == _images(expected)
+    assert _images(sent["visual_quality"]) != _images(sent["instruction_following"])
@@ -0,0 +1,44 @@
+import os
+
+from PIL import Image
+
+from Evaluation.image_profiles import ImageProfile
+from Evaluation.image_store import PackedImageStore, PackedImageStoreWriter, encode_file
+
+
+def _prepare(dataset, rel_paths, profile):
+    writer = PackedImageStoreWriter(str(dataset / "store"))
+    for rel_path in rel_paths:
+        payload, size, stamp = encode_file(str(dataset / rel_path), profile)
+        writer.add(rel_path, profile.cache_params(), payload, size, stamp)
+    writer.close()
+    return PackedImageStore(str(dataset / "store"), str(dataset))
+
+
+def test_serves_payloads_with_their_size(tmp_path):
+    Image.new("RGB", (1024, 256), "red").save(tmp_path / "a.png")
+    profile = ImageProfile()
+    store = _prepare(tmp_path, ["a.png"], profile)
+
+    payload, size = store.get(str(tmp_path / "a.png"), profile.cache_params())
+    assert size == (512, 128)
+    assert payload == encode_file(str(tmp_path / "a.png"), profile)[0]
+    assert store.get(str(tmp_path / "a.png"), ImageProfile(max_size=256).cache_params()) is None
+    assert store.stats() == {"entries": 1, "hits": 1, "misses": 1, "stale": 0}
+    store.close()
+
+
+def test_regenerated_source_image_is_not_served(tmp_path):
+    Image.new("RGB", (64, 64), "red").save(tmp_path / "a.png")
+    Image.new("RGB", (64, 64), "blue").save(tmp_path / "b.png")
+    profile = ImageProfile()
+    store = _prepare(tmp_path, ["a.png", "b.png"], profile)
+
+    Image.new("RGB", (80, 80), "green").save(tmp_path / "a.png")
+    st = os.stat(tmp_path / "b.png")
+    os.utime(tmp_path / "b.png", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    assert store.get(str(tmp_path / "a.png"), profile.cache_params()) is None
+    assert store.get(str(tmp_path / "b.png"), profile.cache_params()) is None
+    assert store.stats()["stale"] == 2
+    store.close()
@@ -0,0 +1,75 @@
+import csv
+
+import run_eval
+from Evaluation.journal import ScoreJournal
+
+
+def test_replay_round_trip(tmp_path):
+    path = str(tmp_path / "score_X.journal.jsonl")
+    journal = ScoreJournal(path, fsync_every=1)
+    journal.append("1", "cn", "a", 7)
+    journal.append("1", "en", "a", 5)
+    journal.append("2", "cn", "a", None)  # endpoint unavailable: nothing to resume from
+    journal.append("1", "cn", "a", 8)  # a later result of the same task wins
+    journal.close()
+
+    assert ScoreJournal.replay(path) == {"1": {"cn": {"a": 8}, "en": {"a": 5}}}
+
+
+def test_replay_ignores_a_torn_last_line(tmp_path):
+    path = tmp_path / "score_X.journal.jsonl"
+    path.write_text('{"idx": "1", "lang": "cn", "metric": "a", "score": 3}\n{"idx": "2", "lang": "cn", "met', encoding="utf-8")
+    assert ScoreJournal.replay(str(path)) == {"1": {"cn": {"a": 3}}}
+    assert ScoreJournal.replay(str(tmp_path / "missing.journal")) == {}
+
+
+def test_remove_deletes_the_journal(tmp_path):
+    path = tmp_path / "score_X.journal.jsonl"
+    journal = ScoreJournal(str(path))
+    journal.append("1", "cn", "a", 3)
+    journal.remove()
+    assert not path.exists()
+
+
+def test_resume_skips_rows_completed_in_the_journal(tmp_path):
+    dataset = tmp_path / "ds"
+    dataset.mkdir()
+    csv_path = dataset / "Toy.csv"
+    with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["idx", "prompt"])
+        writer.writeheader()
+        writer.writerow({"idx": "1", "prompt": "edit 1"})
+        writer.writerow({"idx": "2", "prompt": "edit 2"})
+    (tmp_path / "res" / "Toy").mkdir(parents=True)
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+
+    journal = ScoreJournal(run_eval.score_journal_path(str(out_dir / "score_Toy.csv")))
+    for lang in ("cn", "en"):
+        for metric in run_eval.DEFAULT_METRICS:
+            journal.append("1", lang, metric, 6)
+    journal.append("2", "cn", run_eval.DEFAULT_METRICS[0], 4)
+    journal.close()
+
+    job = run_eval.load_subset_job(str(csv_path), "m", str(tmp_path / "res"), str(out_dir))
+    assert [idx for idx, _row in job.to_eval_rows] == ["2"]
+    key = run_eval.METRIC_SCORE_KEYS[run_eval.DEFAULT_METRICS[0]]
+    assert job.existing_rows_by_idx["2"][f"{key}_cn"] == 4
+    assert run_eval._known_scores(job.existing_rows_by_idx["2"], "cn") == {run_eval.DEFAULT_METRICS[0]: 4}
+
+
+def test_read_only_load_creates_nothing(tmp_path):
+    dataset = tmp_path / "ds"
+    dataset.mkdir()
+    csv_path = dataset / "Toy.csv"
+    with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["idx", "prompt"])
+        writer.writeheader()
+        writer.writerow({"idx": "1", "prompt": "edit 1"})
+    (tmp_path / "res" / "Toy").mkdir(parents=True)
+    out_dir = tmp_path / "out" / "m"
+
+    job = run_eval.load_subset_job(str(csv_path), "m", str(tmp_path / "res"), str(out_dir), read_only=True)
+    assert [idx for idx, _row in job.to_eval_rows] == ["1"]
+    assert job.journal is None
+    assert not (tmp_path / "out").exists()
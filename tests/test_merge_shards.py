@@ -0,0 +1,127 @@
+import csv
+import os
+
+import pytest
+
+import merge_shards
+from Evaluation.sharding import find_shard_files, in_shard, merge_shard_scores, parse_shard, shard_of, shard_path
+from Evaluation.usage import UsageTracker, read_report
+
+IDX = [str(i) for i in range(1, 21)]
+
+
+def _write_csv(path, rows, fieldnames):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _read_idx(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return [row["idx"] for row in csv.DictReader(f)]
+
+
+def _write_shards(score_csv, num_shards, idx=IDX, subset="Toy"):
+    for i in range(1, num_shards + 1):
+        rows = [{"idx": x, "score_cn": "5"} for x in idx if in_shard(subset, x, (i, num_shards))]
+        _write_csv(shard_path(str(score_csv), (i, num_shards)), rows, ["idx", "score_cn"])
+
+
+@pytest.fixture
+def base_csv(tmp_path):
+    path = tmp_path / "Toy.csv"
+    _write_csv(path, [{"idx": x, "prompt": f"p{x}"} for x in IDX], ["idx", "prompt"])
+    return str(path)
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for spec in ("0/4", "5/4", "1", "a/b", "1/0"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_every_row_lands_in_exactly_one_shard():
+    for x in IDX:
+        owners = [i for i in range(1, 5) if in_shard("Toy", x, (i, 4))]
+        assert owners == [shard_of("Toy", x, 4)]
+    assert in_shard("Toy", "1", None)
+
+
+def test_shard_paths_round_trip(tmp_path):
+    score_csv = str(tmp_path / "score_Toy.csv")
+    assert shard_path(score_csv, None) == score_csv
+    assert shard_path(score_csv, (1, 4)) == str(tmp_path / "score_Toy.shard-1-of-4.csv")
+    _write_shards(score_csv, 3)
+    assert sorted(find_shard_files(score_csv)) == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_merge_restores_base_order(tmp_path, base_csv):
+    score_csv = tmp_path / "score_Toy.csv"
+    _write_shards(score_csv, 3)
+    n = merge_shard_scores(base_csv, str(score_csv), find_shard_files(str(score_csv)), set(IDX))
+    assert n == len(IDX)
+    assert _read_idx(score_csv) == IDX
+
+
+def test_missing_shard_is_refused(tmp_path, base_csv):
+    score_csv = tmp_path / "score_Toy.csv"
+    _write_shards(score_csv, 3)
+    os.remove(shard_path(str(score_csv), (2, 3)))
+    with pytest.raises(RuntimeError, match=r"missing shard\(s\) \[2\]"):
+        merge_shard_scores(base_csv, str(score_csv), find_shard_files(str(score_csv)), set(IDX))
+    assert not score_csv.exists()
+
+
+def test_mixed_shard_counts_are_refused(tmp_path, base_csv):
+    score_csv = tmp_path / "score_Toy.csv"
+    _write_shards(score_csv, 2)
+    _write_shards(score_csv, 3)
+    with pytest.raises(RuntimeError, match="different shard counts"):
+        merge_shard_scores(base_csv, str(score_csv), find_shard_files(str(score_csv)), set(IDX))
+
+
+def test_idx_scored_twice_is_refused(tmp_path, base_csv):
+    score_csv = tmp_path / "score_Toy.csv"
+    _write_shards(score_csv, 2)
+    first = shard_path(str(score_csv), (1, 2))
+    with open(first, "a", encoding="utf-8", newline="") as f:
+        f.write(f"{next(x for x in IDX if shard_of('Toy', x, 2) == 2)},5\r\n")
+    with pytest.raises(RuntimeError, match="more than one shard"):
+        merge_shard_scores(base_csv, str(score_csv), find_shard_files(str(score_csv)), set(IDX))
+
+
+def test_idx_mismatch_with_base_is_refused(tmp_path, base_csv):
+    score_csv = tmp_path / "score_Toy.csv"
+    _write_shards(score_csv, 2, idx=IDX[:-1])
+    with pytest.raises(RuntimeError, match="idx mismatch"):
+        merge_shard_scores(base_csv, str(score_csv), find_shard_files(str(score_csv)), set(IDX))
+    assert not score_csv.exists()
+
+
+def test_merge_model_skips_unfinished_shards_and_folds_cost_reports(tmp_path, base_csv):
+    score_dir = tmp_path / "out" / "m"
+    score_dir.mkdir(parents=True)
+    score_csv = score_dir / "score_Toy.csv"
+    _write_shards(score_csv, 2)
+    # a journal next to a shard file: that shard is still running
+    journal = tmp_path / merge_shards.score_journal_path(shard_path(str(score_csv), (2, 2)))
+    journal.write_text("", encoding="utf-8")
+    for i in (1, 2):
+        usage = UsageTracker()
+        usage.record("m1", {"prompt_tokens": 100, "completion_tokens": 10}, model="gpt-4o", subset="Toy", lang="cn")
+        usage.write_report(shard_path(str(score_dir / "cost_report.csv"), (i, 2)))
+
+    assert not merge_shards.merge_model("m", [base_csv], str(tmp_path / "out"), keep_shards=False)
+    assert not score_csv.exists()
+    assert len(find_shard_files(str(score_csv))) == 2
+    # shard usage is folded in once and the shard reports are removed
+    report = read_report(str(score_dir / "cost_report.csv"))
+    assert sum(t.requests for t in report.values()) == 2
+    assert not find_shard_files(str(score_dir / "cost_report.csv"))
+
+    journal.unlink()
+    assert merge_shards.merge_model("m", [base_csv], str(tmp_path / "out"), keep_shards=False)
+    assert _read_idx(score_csv) == IDX
+    assert not find_shard_files(str(score_csv))
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import httpx
+import openai
+import pytest
+
+from Evaluation import evaluation_utils
+from Evaluation.rate_limiter import RateLimiter
+from Evaluation.retry_policy import JudgeUnavailableError
+
+MESSAGE = {"role": "user", "content": [{"type": "text", "text": "Rate the edit."}]}
+
+# holds the limiter's flock for a while, like another run_eval.py process reserving budget
+HOLD_LOCK = """
+import fcntl, sys, time
+with open(sys.argv[1], "a+") as f:
+    fcntl.flock(f, fcntl.LOCK_EX)
+    print("locked", flush=True)
+    time.sleep(float(sys.argv[2]))
+"""
+
+
+class _LockedOut429:
+    """Async client whose request fails with a 429 while another process holds the limiter's state file."""
+
+    def __init__(self, state_file: str, hold: float):
+        self.chat = self
+        self.completions = self
+        self.state_file = state_file
+        self.hold = hold
+        self.holder = None
+
+    async def create(self, **kwargs):
+        self.holder = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", HOLD_LOCK, self.state_file, str(self.hold), stdout=subprocess.PIPE,
+        )
+        assert (await self.holder.stdout.readline()).strip() == b"locked"
+        response = httpx.Response(
+            429, headers={"retry-after": "1"}, request=httpx.Request("POST", "http://judge/v1/chat/completions"),
+        )
+        raise openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_penalize_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    state_file = str(tmp_path / "limiter.json")
+    monkeypatch.setattr(evaluation_utils, "RATE_LIMITER", RateLimiter(rpm=6000, state_file=state_file))
+    monkeypatch.setattr(evaluation_utils, "RESPONSE_CACHE", None)
+    client = _LockedOut429(state_file, hold=0.5)
+
+    async def run():
+        gaps = []
+
+        async def ticker():
+            last = time.monotonic()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+
+        tick = asyncio.create_task(ticker())
+        started = time.monotonic()
+        with pytest.raises(JudgeUnavailableError):
+            await evaluation_utils.call_gpt_with_retry_async(MESSAGE, "visual_quality", max_retries=1, client=client)
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(0.05)  # let the ticker record the gap it was woken up after
+        tick.cancel()
+        await client.holder.wait()
+        return gaps, elapsed
+
+    gaps, elapsed = asyncio.run(run())
+    # the penalty had to wait for the other process, but the loop kept running meanwhile
+    assert elapsed >= 0.4
+    assert max(gaps) < 0.2
+    with open(state_file, encoding="utf-8") as f:
+        assert json.load(f)["blocked_until"] > time.time()
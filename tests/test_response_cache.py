@@ -0,0 +1,17 @@
+from Evaluation.response_cache import request_fingerprint
+
+MESSAGE = {
+    "role": "user",
+    "content": [
+        {"type": "text", "text": "Rate the edit."},
+        {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AAAA"}},
+    ],
+}
+
+
+def test_fingerprint_depends_on_endpoint_model_and_params():
+    key = request_fingerprint("gpt-4o", MESSAGE, {"max_tokens": 1000}, "https://api.openai.com/v1/")
+    assert key == request_fingerprint("gpt-4o", MESSAGE, {"max_tokens": 1000}, "https://api.openai.com/v1/")
+    assert key != request_fingerprint("gpt-4o", MESSAGE, {"max_tokens": 1000}, "http://localhost:8000/v1/")
+    assert key != request_fingerprint("gpt-4.1", MESSAGE, {"max_tokens": 1000}, "https://api.openai.com/v1/")
+    assert key != request_fingerprint("gpt-4o", MESSAGE, {"max_tokens": 500}, "https://api.openai.com/v1/")
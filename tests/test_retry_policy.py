@@ -0,0 +1,106 @@
+import time
+
+import httpx
+import openai
+import pytest
+
+from Evaluation.retry_policy import (
+    CircuitBreaker,
+    JudgeUnavailableError,
+    classify_error,
+    AUTH,
+    CLIENT,
+    PARSE,
+    RATE_LIMIT,
+    SERVER,
+    TIMEOUT,
+)
+from Evaluation.evaluation_utils import _give_up
+
+
+def _trip(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure(SERVER)
+
+
+def test_opens_after_consecutive_transport_failures():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    breaker.record_failure(SERVER)
+    breaker.record_failure(TIMEOUT)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure(SERVER)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 1
+    assert breaker._check() > 0
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure(SERVER)
+    breaker.record_failure(SERVER)
+    breaker.record_success()
+    breaker.record_failure(SERVER)
+    breaker.record_failure(SERVER)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_single_probe_after_cooldown():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.01)
+    _trip(breaker)
+    time.sleep(0.02)
+    assert breaker._check() == 0.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # only one probe is in flight, everybody else waits
+    assert breaker._check() > 0
+
+
+def test_failed_probe_reopens_with_doubled_cooldown():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.01, max_cooldown=1)
+    _trip(breaker)
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure(SERVER)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker._cooldown == pytest.approx(0.02)
+    assert breaker.trips == 2
+
+
+@pytest.mark.parametrize("kind", [CLIENT, RATE_LIMIT, PARSE])
+def test_probe_answered_by_a_reachable_endpoint_closes(kind):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.01)
+    _trip(breaker)
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure(kind)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker._check() == 0.0
+
+
+def test_gives_up_after_being_open_too_long():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60, give_up_after=0.01)
+    _trip(breaker)
+    time.sleep(0.02)
+    with pytest.raises(JudgeUnavailableError):
+        breaker.before_call()
+
+
+def _status_error(status: int) -> Exception:
+    response = httpx.Response(status, request=httpx.Request("POST", "http://judge/v1/chat/completions"))
+    return openai.APIStatusError(f"status {status}", response=response, body=None)
+
+
+@pytest.mark.parametrize(
+    "status, kind",
+    [(400, CLIENT), (413, CLIENT), (422, CLIENT), (401, AUTH), (403, AUTH), (404, AUTH), (429, RATE_LIMIT), (503, SERVER)],
+)
+def test_classify_status_errors(status, kind):
+    assert classify_error(_status_error(status)) == kind
+
+
+def test_rejected_request_scores_zero_and_auth_errors_stay_empty():
+    assert _give_up("m", "judge", 5, CLIENT, _status_error(400)) == (0, None)
+    assert _give_up("m", "judge", 5, CLIENT, _status_error(400), parse_fallback=None) == (None, None)
+    with pytest.raises(JudgeUnavailableError):
+        _give_up("m", "judge", 5, AUTH, _status_error(401))
+    with pytest.raises(JudgeUnavailableError):
+        _give_up("m", "judge", 5, SERVER, _status_error(503))
@@ -0,0 +1,133 @@
+import csv
+import os
+import threading
+import time
+
+import run_eval
+from Evaluation.work_queue import WorkQueue
+
+
+def test_workers_never_claim_the_same_task(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    a, b = WorkQueue(path), WorkQueue(path)
+    pairs = [(f"s|{i}|cn|m", "s") for i in range(10)]
+    assert a.add(pairs) == 10
+    assert b.add(pairs) == 0
+
+    claimed_a, _ = a.claim(4)
+    claimed_b, _ = b.claim(100)
+    assert len(claimed_a) == 4 and len(claimed_b) == 6
+    assert not set(claimed_a) & set(claimed_b)
+    assert a.counts()["leased_by_others"] == 6
+    a.close()
+    b.close()
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    dead = WorkQueue(path, lease_seconds=0.05)
+    alive = WorkQueue(path, lease_seconds=0.05)
+    dead.add([("s|1|cn|m", "s")])
+    alive.add([("s|1|cn|m", "s")])
+    assert dead.claim(1) == (["s|1|cn|m"], 0)
+    assert alive.claim(1) == ([], 0)
+
+    time.sleep(0.1)
+    assert alive.claim(1) == (["s|1|cn|m"], 1)
+    assert alive.complete("s|1|cn|m", {"m": 7})
+    # the late result of the dead worker does not overwrite the committed one
+    assert not dead.complete("s|1|cn|m", {"m": 1})
+    assert alive.results("s") == {"s|1|cn|m": {"m": 7}}
+    dead.close()
+    alive.close()
+
+
+def test_release_and_subset_lifecycle(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    a, b = WorkQueue(path), WorkQueue(path)
+    pairs = [("s|1|cn|m", "s"), ("s|2|cn|m", "s")]
+    a.add(pairs)
+    b.add(pairs)
+
+    claimed, _ = a.claim(2)
+    a.release(claimed[:1])
+    assert b.claim(2) == (claimed[:1], 0)
+    a.complete(claimed[1], {"m": 3})
+    assert a.subset_progress("s") == (1, 2)
+    b.complete(claimed[0], {"m": 4})
+    assert a.subset_progress("s") == (0, 2)
+
+    assert a.claim_subset("s")
+    assert not b.claim_subset("s")
+    a.finish_subset("s")
+    assert b.subset_progress("s") == (0, 0)
+    a.close()
+    b.close()
+
+
+def test_tasks_of_other_workers_do_not_block(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    per_metric, combined = WorkQueue(path), WorkQueue(path)
+    per_metric.add([("s|1|cn|a", "s"), ("s|1|cn|b", "s")])
+    combined.add([("s|1|cn|a+b", "s")])
+    claimed, _ = combined.claim(10)
+    assert claimed == ["s|1|cn|a+b"]
+    combined.complete(claimed[0], {"a": 5, "b": 6})
+    assert combined.subset_progress("s") == (0, 1)
+    per_metric.close()
+    combined.close()
+
+
+def _write_benchmark(root, models):
+    dataset = root / "ds"
+    dataset.mkdir()
+    csv_path = dataset / "Toy.csv"
+    with open(csv_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["idx", "prompt", "input_1"])
+        writer.writeheader()
+        for idx in ("1", "2", "3"):
+            writer.writerow({"idx": idx, "prompt": f"edit {idx}", "input_1": f"in_{idx}.png"})
+    for model in models:
+        for lang in ("cn", "en"):
+            folder = root / "res" / model / "Toy" / lang
+            folder.mkdir(parents=True)
+            for idx in ("1", "2", "3"):
+                (folder / f"{idx}.png").write_bytes(f"{model}-{lang}-{idx}".encode())
+    return str(csv_path)
+
+
+def test_two_models_share_one_queue(tmp_path, monkeypatch):
+    models = {"modelA": 3, "modelB": 8}
+    csv_path = _write_benchmark(tmp_path, models)
+    queue_path = str(tmp_path / "out" / "work_queue.sqlite")
+
+    def fake_judge(task, inputs, client, model_name, api_key, base_url, max_retries, budget=None):
+        # the score tells which model's edited image was judged
+        model = os.path.basename(os.path.dirname(os.path.dirname(os.path.dirname(inputs["edited"][task.lang]))))
+        time.sleep(0.01)
+        return {m: models[model] for m in task.judged_metrics()}
+
+    monkeypatch.setattr(run_eval, "judge_one_task", fake_judge)
+    monkeypatch.setattr(run_eval, "get_client", lambda api_key, base_url: None)
+
+    def worker(model):
+        # each model in its own worker process, i.e. jobs keyed by the bare subset name
+        job = run_eval.load_subset_job(
+            csv_path, model, str(tmp_path / "res" / model), str(tmp_path / "out" / model)
+        )
+        assert run_eval.run_eval_worker([job], queue_path, max_workers=2, dataset_root=str(tmp_path / "ds"), poll_interval=0.05)
+
+    threads = [threading.Thread(target=worker, args=(model,)) for model in models for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=60)
+
+    for model, score in models.items():
+        with open(tmp_path / "out" / model / "score_Toy.csv", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [row["idx"] for row in rows] == ["1", "2", "3"]
+        for row in rows:
+            for m in run_eval.ALL_METRICS:
+                for lang in ("cn", "en"):
+                    assert row[f"{run_eval.METRIC_SCORE_KEYS[m]}_{lang}"] == str(score)